@@ -15,9 +15,25 @@ Modules
 ::
 
  albeck_modules   --- components for albeck_* models
+ batch            --- vectorized simulation of many parameter sets
+ benchmark        --- timing of network generation and simulation of the models
+ conservation     --- conservation laws and the reduced system of ODEs
+ data             --- binary cache of the experimental data in xpdata
+ ensemble         --- populations of cells with variable protein levels
+ features         --- MOMP timing (Td, Ts) of many trajectories at once
+ instrument       --- counters and timers of stages for profiling long runs
+ integrate        --- fast ODE solver using compiled RHS and sparse Jacobian
  lopez_modules    --- components for lopez_* models
+ models           --- registry of all models, built on first access
+ netcache         --- on-disk cache of generated reaction networks
+ network          --- numeric network structure and compiled ODE functions
+ optimize         --- interchangeable optimization strategies for fitting
+ qssa             --- quasi-steady-state reduction of fast reversible reactions
+ sensitivity      --- Morris screening and Sobol indices of the rate parameters
  shen_modules     --- components for chen_*, cui_* and howells models
  shared           --- shared constants and macros for all models
+ steady_state     --- steady states, continuation and dose sweeps
+ stochastic       --- exact and hybrid stochastic simulation
 
  everything else (including mito.*)
                   --- the models
@@ -27,7 +43,7 @@ Scripts
 ::
 
  estimate.py      --- simple parameter estimation using simulated annealing
- model_specs.py   --- display number of rules/odes/params for all models
+ model_specs.py   --- size and build cost of all models (table, JSON or CSV)
  test_models.py   --- minimal test to ensure models contain no blatant errors
 
 """
@@ -0,0 +1,500 @@
+"""
+Simulation of many parameter sets of one model in a single vectorized call.
+
+Dose-response curves, sampling of parameter or initial condition
+distributions, and sensitivity analyses all integrate the same model many
+times with different parameter values. Looping over
+:py:func:`pysb.integrate.odesolve` for these costs one integrator setup per
+system and one Python-level evaluation of the right-hand side per system and
+per step. :py:class:`BatchSolver` instead advances all N systems together:
+every step evaluates the right-hand side and the Jacobian of all systems at
+once with the array-valued functions compiled by
+:py:class:`earm.network.Network`, and solves the N linear systems of the step
+with batched LAPACK calls, so the Python overhead is paid once per step for
+the whole batch rather than once per system.
+
+The integrator is the variable-order (1 to 5) BDF method, in the form of
+the numerical differentiation formulas of [Shampine1997]_ used by
+:py:func:`scipy.integrate.solve_ivp`, which suits the stiff EARM models. Each
+system has its own step size, order and error control (the systems do not
+share steps), so a system whose dynamics are fast does not slow down the
+others, and each system is integrated to the requested tolerances. Outputs at
+the times in `tspan` are evaluated from the interpolating polynomial of the
+step that covers them.
+
+Batching pays off when there are tens of systems or more: every step costs a
+fixed Python overhead, which a single system does not amortize. Large
+numbers of parameter sets are processed in batches of at most
+`batch_size` systems to bound memory use (the batch holds one dense
+``n_species`` x ``n_species`` matrix per system). :py:func:`run_parallel`
+further splits them among several processes.
+"""
+
+import multiprocessing
+
+import numpy as np
+
+from earm.network import Network
+
+# The solver being run by run_parallel, inherited by the worker processes
+# when they are forked
+_solver = None
+
+class BatchSolver(object):
+    """Integrate a model for many parameter sets or initial conditions.
+
+    Parameters
+    ----------
+    model : pysb.core.Model or earm.network.Network
+        The model to integrate.
+    tspan : vector-like
+        Time values at which the observables are returned. The first value is
+        the initial time.
+    rtol, atol : float, optional
+        Relative and absolute integration tolerances for each system.
+    batch_size : int, optional
+        Maximum number of systems integrated together.
+    max_steps : int, optional
+        Maximum number of steps for each system.
+    save_species : bool, optional
+        If True, also keep the species trajectories in the ``y`` attribute.
+
+    Attributes
+    ----------
+    network : earm.network.Network
+        The network of the model.
+    yobs : numpy.ndarray
+        Observable trajectories of the last run, with shape
+        ``(N, len(tspan), n_observables)``. Systems whose integration failed
+        are filled with NaN from the point of failure.
+    y : numpy.ndarray or None
+        Species trajectories of the last run, with shape
+        ``(N, len(tspan), n_species)``, if `save_species` is True.
+    """
+
+    def __init__(self, model, tspan, rtol=1e-6, atol=1e-6, batch_size=500,
+                 max_steps=100000, save_species=False):
+        self.network = Network.of(model)
+        self.model = self.network.model
+        self.tspan = np.asarray(tspan, dtype=float)
+        self.rtol = rtol
+        self.atol = atol
+        self.batch_size = batch_size
+        self.max_steps = max_steps
+        self.save_species = save_species
+        self.yobs = None
+        self.y = None
+
+    def param_matrix(self, param_values=None, n=None):
+        """Return a parameter array with shape ``(N, n_parameters)``.
+
+        Parameters
+        ----------
+        param_values : array-like or dict, optional
+            Either an array with shape ``(N, n_parameters)``, or a dict
+            mapping parameter names to arrays of N values (or scalars); the
+            parameters missing from the dict take their value from the model.
+            If None, all N systems use the values in the model.
+        n : int, optional
+            Number of systems, required if it cannot be inferred from
+            `param_values`.
+        """
+        network = self.network
+        if param_values is not None and not isinstance(param_values, dict):
+            param_values = np.array(param_values, dtype=float, ndmin=2)
+            if param_values.shape[1] != network.n_parameters:
+                raise ValueError("param_values must have one column per "
+                                 "model parameter")
+            return param_values
+        overrides = param_values or {}
+        if n is None:
+            lengths = [np.size(v) for v in overrides.values()
+                       if np.ndim(v) > 0]
+            n = max(lengths) if lengths else 1
+        matrix = np.tile(network.param_vector(), (n, 1))
+        for name, values in overrides.items():
+            try:
+                index = network.parameter_names.index(name)
+            except ValueError:
+                raise IndexError("param_values dictionary has unknown "
+                                 "parameter name (%s)" % name)
+            matrix[:, index] = values
+        return matrix
+
+    def run(self, param_values=None, y0=None):
+        """Integrate all systems and return the observable trajectories.
+
+        Parameters
+        ----------
+        param_values : array-like or dict, optional
+            Parameter values for each system, as accepted by
+            :py:meth:`param_matrix`.
+        y0 : array-like, optional
+            Initial species amounts for each system, with shape
+            ``(N, n_species)``. If not given, they are computed from the
+            initial conditions of the model and the parameter values.
+
+        Returns
+        -------
+        numpy.ndarray
+            The ``yobs`` attribute.
+        """
+        network = self.network
+        n = None if y0 is None else np.shape(y0)[0]
+        params = self.param_matrix(param_values, n)
+        if y0 is None:
+            y0 = network.initial_values(params.T).T
+        else:
+            y0 = np.array(y0, dtype=float, ndmin=2)
+            if params.shape[0] == 1 and y0.shape[0] > 1:
+                params = np.repeat(params, y0.shape[0], axis=0)
+        if y0.shape != (params.shape[0], network.n_species):
+            raise ValueError("y0 must have shape (N, n_species) with the "
+                             "same N as param_values")
+
+        n_systems = params.shape[0]
+        n_times = len(self.tspan)
+        self.yobs = np.empty((n_systems, n_times, network.n_observables))
+        if self.save_species:
+            self.y = np.empty((n_systems, n_times, network.n_species))
+        for start in range(0, n_systems, self.batch_size):
+            stop = min(start + self.batch_size, n_systems)
+            y = self._integrate(params[start:stop], y0[start:stop])
+            self.yobs[start:stop] = np.dot(y, network.observables_matrix.T)
+            if self.save_species:
+                self.y[start:stop] = y
+        return self.yobs
+
+    def _integrate(self, params, y0):
+        """Integrate one batch; returns species with shape (N, T, n)."""
+        network = self.network
+        k = network.rate_constants(params.T)
+        y = _bdf(network, k, y0.T, self.tspan, self.rtol, self.atol,
+                self.max_steps)
+        return y.transpose(2, 0, 1)
+
+# Constants of the variable-order numerical differentiation formulas, as in
+# scipy.integrate.solve_ivp's BDF method [Shampine1997]_.
+_MAX_ORDER = 5
+_NEWTON_MAXITER = 4
+_MIN_FACTOR = 0.2
+# Relative change of h / alpha beyond which the Newton iteration matrix is
+# recomputed (scipy recomputes it on every change, like VODE we tolerate 30%)
+_MAX_C_CHANGE = 0.3
+_MAX_FACTOR = 10
+_KAPPA = np.array([0, -0.1850, -1 / 9., -0.0823, -0.0415, 0])
+_GAMMA = np.hstack((0, np.cumsum(1 / np.arange(1., _MAX_ORDER + 1))))
+_ALPHA = (1 - _KAPPA) * _GAMMA
+_ERROR_CONST = _KAPPA * _GAMMA + 1 / np.arange(1., _MAX_ORDER + 2)
+
+def _rms(x):
+    """Root mean square over the species axis (axis 0)."""
+    return np.sqrt(np.mean(x ** 2, axis=0))
+
+def _change_d(D, systems, order, factor):
+    """Rescale the backward differences of `systems` to a new step size.
+
+    `order` and `factor` hold the order and the step size ratio of each
+    system. The systems are grouped by order, since the transformation
+    matrix of a system depends on both.
+    """
+    for o in np.unique(order):
+        sel = order == o
+        idx = systems[sel]
+        I = np.arange(1., o + 1)[:, None]
+        J = np.arange(1, o + 1)
+        U = np.zeros((o + 1, o + 1))
+        U[1:, 1:] = (I - 1 - J) / I
+        U[0] = 1
+        U = np.cumprod(U, axis=0)
+        R = np.zeros((len(idx), o + 1, o + 1))
+        R[:, 1:, 1:] = (I - 1 - factor[sel, None, None] * J) / I
+        R[:, 0] = 1
+        R = np.cumprod(R, axis=1)
+        RU = np.matmul(R, U)
+        D[:o + 1, :, idx] = np.einsum('mji,jsm->ism', RU, D[:o + 1, :, idx])
+
+def _bdf(network, k, y0, tspan, rtol, atol, max_steps):
+    """Integrate a batch of systems with independent steps and orders.
+
+    `k` has shape ``(n_reactions, N)`` and `y0` shape ``(n_species, N)``.
+    Returns the species amounts at `tspan`, with shape
+    ``(len(tspan), n_species, N)``; the amounts of a system are NaN after the
+    point where its integration fails.
+
+    This follows the step logic of scipy's BDF solver (Newton iterations,
+    Jacobian and LU reuse, error-based step and order selection) separately
+    for each system, but every stage is evaluated for all the systems that
+    are at that stage in one vectorized operation. The LU decompositions are
+    replaced by explicit inverses, which numpy computes in batches.
+    """
+    n_species, n_systems = y0.shape
+    n_out = len(tspan)
+    t0, t_end = tspan[0], tspan[-1]
+    out = np.full((n_out, n_species, n_systems), np.nan)
+    out[0] = y0
+    next_out = np.ones(n_systems, dtype=int)
+    rows, cols = network._jac_rows, network._jac_cols
+    eye = np.eye(n_species)
+    rtol = max(rtol, 100 * np.finfo(float).eps)
+    newton_tol = max(10 * np.finfo(float).eps / rtol, min(0.03, rtol ** 0.5))
+
+    def solve(inverse, v):
+        # Batched matrix-vector product, v has shape (n_species, m)
+        return np.matmul(inverse, v.T[:, :, None])[:, :, 0].T
+
+    # Initial step size as selected by solve_ivp for a first order method
+    y = np.array(y0, dtype=float)
+    f = network.rhs(t0, y, k)
+    scale = atol + rtol * np.abs(y)
+    d0, d1 = _rms(y / scale), _rms(f / scale)
+    h0 = np.where((d0 < 1e-5) | (d1 < 1e-5), 1e-6,
+                  0.01 * d0 / np.maximum(d1, 1e-300))
+    f1 = network.rhs(t0 + h0, y + h0 * f, k)
+    d2 = _rms((f1 - f) / scale) / h0
+    with np.errstate(divide='ignore'):
+        h1 = np.where((d1 <= 1e-15) & (d2 <= 1e-15),
+                      np.maximum(1e-6, h0 * 1e-3),
+                      (0.01 / np.maximum(d1, d2)) ** 0.5)
+    h = np.minimum(np.minimum(100 * h0, h1), t_end - t0)
+
+    t = np.full(n_systems, t0)
+    D = np.zeros((_MAX_ORDER + 3, n_species, n_systems))
+    D[0] = y
+    D[1] = f * h
+    order = np.ones(n_systems, dtype=int)
+    n_equal_steps = np.zeros(n_systems, dtype=int)
+    n_steps = np.zeros(n_systems, dtype=int)
+    jac = np.zeros((n_systems, n_species, n_species))
+    inverse = np.zeros((n_systems, n_species, n_species))
+    need_jac = np.ones(n_systems, dtype=bool)
+    need_lu = np.ones(n_systems, dtype=bool)
+    c_lu = np.ones(n_systems)
+    jac_current = np.zeros(n_systems, dtype=bool)
+    failed = np.zeros(n_systems, dtype=bool)
+    active = np.flatnonzero(t < t_end)
+
+    while len(active):
+        # Do not step past the end of the time span
+        a = active
+        past = t[a] + h[a] > t_end
+        if past.any():
+            p = a[past]
+            _change_d(D, p, order[p], (t_end - t[p]) / h[p])
+            h[p] = t_end - t[p]
+            n_equal_steps[p] = 0
+        min_step = 10 * np.abs(np.spacing(t[a]))
+        too_small = h[a] < min_step
+        if too_small.any():
+            failed[a[too_small]] = True
+            a = a[~too_small]
+            if not len(a):
+                break
+
+        oa, ha = order[a], h[a]
+        t_new = t[a] + ha
+        j = np.arange(_MAX_ORDER + 1)[:, None]
+        Da = D[:_MAX_ORDER + 1, :, a]
+        y_predict = np.einsum('jm,jsm->sm', j <= oa, Da)
+        psi = np.einsum('jm,jsm->sm', np.where((j >= 1) & (j <= oa),
+                                               _GAMMA[:, None], 0),
+                        Da) / _ALPHA[oa]
+        c = ha / _ALPHA[oa]
+        scale = atol + rtol * np.abs(y_predict)
+
+        # Update the Jacobians and the Newton iteration matrices as required
+        sel = need_jac[a]
+        if sel.any():
+            b = a[sel]
+            data = network.jacobian_data(0, y_predict[:, sel], k[:, b])
+            jac[b] = 0
+            jac[b[:, None], rows, cols] = data.T
+            need_jac[b] = False
+            jac_current[b] = True
+            need_lu[b] = True
+        sel = need_lu[a] | (np.abs(c / c_lu[a] - 1) > _MAX_C_CHANGE)
+        if sel.any():
+            b = a[sel]
+            inverse[b] = np.linalg.inv(eye - c[sel, None, None] * jac[b])
+            c_lu[b] = c[sel]
+            need_lu[b] = False
+        inverse_a = inverse[a]
+
+        # Simplified Newton iterations, for all systems in lockstep
+        y_new = y_predict.copy()
+        d = np.zeros_like(y_new)
+        converged = np.zeros(len(a), dtype=bool)
+        n_iter = np.zeros(len(a), dtype=int)
+        running = np.arange(len(a))
+        dy_norm_old = np.full(len(a), np.nan)
+        for it in range(_NEWTON_MAXITER):
+            r = running
+            fr = network.rhs(0, y_new[:, r], k[:, a[r]])
+            finite = np.all(np.isfinite(fr), axis=0)
+            ia = inverse_a if len(r) == len(a) else inverse_a[r]
+            dy = solve(ia, c[r] * fr - psi[:, r] - d[:, r])
+            dy_norm = _rms(dy / scale[:, r])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rate = dy_norm / dy_norm_old[r]
+                diverging = (it > 0) & (
+                    (rate >= 1) |
+                    (rate ** (_NEWTON_MAXITER - it) / (1 - rate) * dy_norm >
+                     newton_tol))
+                keep = finite & ~diverging
+                r, dy, dy_norm, rate = (r[keep], dy[:, keep], dy_norm[keep],
+                                        rate[keep])
+                y_new[:, r] += dy
+                d[:, r] += dy
+                n_iter[r] = it + 1
+                done = (dy_norm == 0) | ((it > 0) &
+                                         (rate / (1 - rate) * dy_norm <
+                                          newton_tol))
+            converged[r[done]] = True
+            dy_norm_old[r] = dy_norm
+            running = r[~done]
+            if not len(running):
+                break
+
+        # Systems that did not converge retry with a fresh Jacobian, or with
+        # half the step size if the Jacobian was already fresh
+        b = a[~converged & ~jac_current[a]]
+        need_jac[b] = True
+        b = a[~converged & jac_current[a]]
+        if len(b):
+            h[b] *= 0.5
+            _change_d(D, b, order[b], np.full(len(b), 0.5))
+            n_equal_steps[b] = 0
+
+        # Error test
+        safety = 0.9 * (2 * _NEWTON_MAXITER + 1) / (2 * _NEWTON_MAXITER +
+                                                     n_iter)
+        scale = atol + rtol * np.abs(y_new)
+        error_norm = _rms(_ERROR_CONST[oa] * d / scale)
+        rejected = converged & (error_norm > 1)
+        if rejected.any():
+            b = a[rejected]
+            factor = np.maximum(_MIN_FACTOR, safety[rejected] *
+                                error_norm[rejected] ** (-1. / (oa[rejected] +
+                                                               1)))
+            h[b] *= factor
+            _change_d(D, b, order[b], factor)
+            n_equal_steps[b] = 0
+
+        accepted = converged & (error_norm <= 1)
+        if accepted.any():
+            acc = a[accepted]
+            oc = oa[accepted]
+            dc = d[:, accepted]
+            t[acc] = t_new[accepted]
+            n_equal_steps[acc] += 1
+            n_steps[acc] += 1
+            jac_current[acc] = False
+            # Update the backward differences
+            D[oc + 2, :, acc] = dc.T - D[oc + 1, :, acc]
+            D[oc + 1, :, acc] = dc.T
+            for i in reversed(range(_MAX_ORDER + 1)):
+                s = acc[i <= oc]
+                D[i, :, s] += D[i + 1, :, s]
+
+            # Order and step size selection, once the last order + 1 steps
+            # have been taken with the same step size
+            sel = n_equal_steps[acc] >= oc + 1
+            if sel.any():
+                b, ob = acc[sel], oc[sel]
+                sc = scale[:, accepted][:, sel]
+                with np.errstate(divide='ignore'):
+                    error_m = np.where(
+                        ob > 1, _rms(_ERROR_CONST[ob - 1] *
+                                     D[ob, :, b].T / sc), np.inf)
+                    error_p = np.where(
+                        ob < _MAX_ORDER,
+                        _rms(_ERROR_CONST[np.minimum(ob + 1, _MAX_ORDER)] *
+                             D[np.minimum(ob + 2, _MAX_ORDER + 2), :, b].T /
+                             sc), np.inf)
+                    norms = np.vstack((error_m, error_norm[accepted][sel],
+                                       error_p))
+                    factors = norms ** (-1. / (ob + np.arange(3)[:, None]))
+                delta = np.argmax(factors, axis=0) - 1
+                order[b] = ob + delta
+                factor = np.minimum(_MAX_FACTOR, safety[accepted][sel] *
+                                    np.max(factors, axis=0))
+                h[b] *= factor
+                _change_d(D, b, order[b], factor)
+                n_equal_steps[b] = 0
+
+            # Evaluate the interpolating polynomial of the step at the
+            # output times it covers
+            last = np.searchsorted(tspan, t[acc] * (1 + 1e-12), 'right')
+            count = last - next_out[acc]
+            if count.any():
+                b = np.repeat(acc, count)
+                i = np.arange(count.sum()) - np.repeat(np.cumsum(count) -
+                                                        count, count)
+                i += next_out[b]
+                jj = np.arange(_MAX_ORDER)[:, None]
+                x = (tspan[i] - (t[b] - h[b] * jj)) / (h[b] * (1 + jj))
+                x[jj >= order[b]] = 0
+                p = np.cumprod(x, axis=0)
+                dd = D[1:_MAX_ORDER + 1, :, b].transpose(0, 2, 1)
+                out[i, :, b] = D[0, :, b] + np.einsum('jm,jms->ms', p, dd)
+                next_out[acc] = last
+
+        # Give up on systems which take too many steps (their remaining
+        # outputs stay NaN)
+        failed[a[n_steps[a] >= max_steps]] = True
+        active = active[(t[active] < t_end) & ~failed[active]]
+
+    return out
+
+def simulate(model, tspan, param_values=None, y0=None, **kwargs):
+    """Integrate a model for many parameter sets in one call.
+
+    Convenience function that builds a :py:class:`BatchSolver` (keyword
+    arguments are passed to its constructor), runs it and returns the
+    observable array with shape ``(N, len(tspan), n_observables)``.
+    """
+    return BatchSolver(model, tspan, **kwargs).run(param_values, y0)
+
+def _run_chunk(params):
+    return _solver.run(params)
+
+def run_parallel(solver, params, processes=None):
+    """Integrate the systems of a parameter matrix in a pool of processes.
+
+    The systems are split into chunks of at most ``solver.batch_size``, which
+    the worker processes integrate with their copy of `solver`.
+
+    Parameters
+    ----------
+    solver : BatchSolver
+        The solver.
+    params : numpy.ndarray
+        Parameter values of each system, with shape ``(N, n_parameters)``
+        (see :py:meth:`BatchSolver.param_matrix`).
+    processes : int, optional
+        Number of processes. None for the number of CPUs. With 1, the systems
+        are integrated by ``solver.run`` in this process.
+
+    Returns
+    -------
+    numpy.ndarray
+        The observable trajectories, with shape
+        ``(N, len(tspan), n_observables)``. Unless `processes` is 1, the
+        ``yobs`` attribute of `solver` is left unchanged.
+    """
+    global _solver
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if processes == 1:
+        return solver.run(params)
+    n = len(params)
+    size = min(solver.batch_size, -(-n // processes))
+    _solver = solver
+    pool = multiprocessing.Pool(processes)
+    try:
+        return np.concatenate(pool.map(
+            _run_chunk, [params[i:i + size] for i in range(0, n, size)]))
+    finally:
+        pool.close()
+        pool.join()
+        _solver = None
@@ -0,0 +1,279 @@
+"""
+Benchmarks of the costly operations on the models.
+
+Times, for each model, the operations that dominate the cost of working with
+EARM:
+
+- ``generate``: generating the reaction network with BioNetGen, bypassing the
+  network cache (:py:mod:`earm.netcache`).
+- ``simulate``: one integration of the ODEs with
+  :py:class:`earm.integrate.Solver` over :py:data:`tspan`.
+- ``ssa``: one exact stochastic simulation with
+  :py:class:`earm.stochastic.StochasticSolver` over :py:data:`ssa_tspan`
+  (which is shorter, as the full models fire millions of reactions per
+  hour of simulated time).
+- ``dose_sweep``: the seven caspase 8 doses of the MOMP-only albeck models,
+  with caspase 8 added by :py:func:`earm.mito.albeck_figures.add_caspase8`,
+  as in the tests of these models.
+- ``objective``: one evaluation of the objective function of the fit of M1a
+  in ``estimate_m1a.py``, which is only available when that script can be
+  imported (e.g. when running from the root of the source tree).
+
+Each operation is timed `repeat` times and the shortest time is kept. The
+models are built as for :py:mod:`earm.model_specs`, with a tBid seed in the
+MOMP-only models. A report holds the results together with a description of
+the machine and of the versions of the software, and :py:func:`save` stores
+it as JSON in the ``benchmarks`` subdirectory of the EARM cache (see
+:py:func:`earm.util.cache_dir`), so that :py:func:`compare` can show the
+changes between two versions or machines::
+
+    python -m earm.benchmark lopez_embedded mito.albeck_11b
+    python -m earm.benchmark --compare old.json --output new.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import platform
+import datetime
+import tempfile
+import subprocess
+import multiprocessing
+
+import numpy as np
+import scipy
+import sympy
+import pysb
+
+from earm import models, model_specs
+from earm.integrate import Solver
+from earm.mito.albeck_figures import add_caspase8
+from earm.netcache import generate_equations
+from earm.stochastic import StochasticSolver
+from earm.util import cache_dir
+
+names = ['generate', 'simulate', 'ssa', 'dose_sweep', 'objective']
+"""Names of the benchmarks, in the order in which they are run."""
+
+tspan = np.linspace(0, 20000, 101)
+"""Time points of the ``simulate`` benchmark."""
+
+ssa_tspan = np.linspace(0, 100, 11)
+"""Time points of the ``ssa`` benchmark."""
+
+c8_doses = [0.01e2, 0.05e2, 0.1e2, 0.5e2, 1e2, 5e2, 10e2]
+"""Caspase 8 doses of the ``dose_sweep`` benchmark, in molecules per cell."""
+
+def _best_time(func, repeat, setup=None):
+    """Return the shortest of `repeat` timings of func(setup())."""
+    best = np.inf
+    for i in range(repeat):
+        arg = setup() if setup is not None else None
+        start = time.time()
+        func(arg)
+        best = min(best, time.time() - start)
+    return best
+
+def bench_generate(name, repeat):
+    directory = tempfile.mkdtemp()
+    try:
+        # The network is stored in an empty cache, so BioNetGen always runs
+        def generate(model):
+            generate_equations(model, directory=directory)
+            os.remove(os.path.join(directory, os.listdir(directory)[0]))
+        return {'time': _best_time(generate, repeat,
+                                   lambda: model_specs.build(name))}
+    finally:
+        shutil.rmtree(directory)
+
+def bench_simulate(name, repeat):
+    solver = Solver(model_specs.build(name), tspan)
+    return {'time': _best_time(lambda _: solver.run(), repeat)}
+
+def bench_ssa(name, repeat):
+    solver = StochasticSolver(model_specs.build(name), ssa_tspan, seed=0)
+    events = []
+    def run(_):
+        solver.run()
+        events.append(solver.n_events)
+    t = _best_time(run, repeat)
+    return {'time': t, 'n_events': int(np.mean(events)),
+            'events_per_second': np.mean(events) / t}
+
+def bench_dose_sweep(name, repeat):
+    if not name.startswith('mito.albeck_'):
+        return None
+    model = models.build(name)
+    add_caspase8(model)
+    t = np.linspace(0, 15 * 3600, 15 * 60 + 1)
+    solver = Solver(model, t)
+    def sweep(_):
+        for dose in c8_doses:
+            solver.run({'C8_0': dose})
+    return {'time': _best_time(sweep, repeat)}
+
+def bench_objective(name, repeat):
+    if name != 'lopez_embedded':
+        return None
+    try:
+        import estimate_m1a
+    except ImportError:
+        return None
+    x = np.log10(estimate_m1a.nominal_values[estimate_m1a.rate_mask])
+    lb, ub = estimate_m1a.log_bounds()
+    func = lambda _: estimate_m1a.objective_func(x, estimate_m1a.rate_mask,
+                                                 lb, ub)
+    return {'time': _best_time(func, repeat)}
+
+_benchmarks = {'generate': bench_generate, 'simulate': bench_simulate,
+               'ssa': bench_ssa, 'dose_sweep': bench_dose_sweep,
+               'objective': bench_objective}
+
+def _revision():
+    """Return the git revision of the source tree, if it is one."""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    try:
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.check_output(
+                ['git', 'describe', '--always', '--dirty'], cwd=directory,
+                stderr=devnull).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def machine_info():
+    """Return a dict describing the machine and the versions of the
+    software."""
+    return {'date': datetime.datetime.utcnow().isoformat() + 'Z',
+            'hostname': socket.gethostname(),
+            'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(),
+            'cpu_count': multiprocessing.cpu_count(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'scipy': scipy.__version__,
+            'sympy': sympy.__version__,
+            'pysb': getattr(pysb, '__version__', None),
+            'earm': _revision()}
+
+def run(model_names=None, benchmarks=None, repeat=3, verbose=False):
+    """Run benchmarks and return a report.
+
+    Parameters
+    ----------
+    model_names : list of strings, optional
+        Names of the models; by default, all of :py:data:`earm.models.names`.
+    benchmarks : list of strings, optional
+        Names of the benchmarks; by default, all of :py:data:`names`.
+    repeat : int, optional
+        Number of timings of each operation, of which the shortest is kept.
+    verbose : bool, optional
+        If True, print each result as it is obtained.
+
+    Returns
+    -------
+    dict
+        With the keys ``machine`` (see :py:func:`machine_info`), ``repeat``,
+        and ``results``, a list of dicts with the keys ``model``,
+        ``benchmark`` and ``time`` (in seconds), and for ``ssa`` also
+        ``n_events`` and ``events_per_second``. Benchmarks that do not apply
+        to a model are left out.
+    """
+    if model_names is None:
+        model_names = models.names
+    if benchmarks is None:
+        benchmarks = names
+    for name in benchmarks:
+        if name not in _benchmarks:
+            raise ValueError("Unknown benchmark '%s'; must be one of %s" %
+                             (name, ', '.join(names)))
+    results = []
+    for model_name in model_names:
+        for name in benchmarks:
+            result = _benchmarks[name](model_name, repeat)
+            if result is None:
+                continue
+            result.update(model=model_name, benchmark=name)
+            results.append(result)
+            if verbose:
+                print('%-24s %-12s %10.4f s' % (model_name, name,
+                                               result['time']))
+                sys.stdout.flush()
+    return {'machine': machine_info(), 'repeat': repeat, 'results': results}
+
+def save(report, path=None):
+    """Save a report as JSON and return the path of the file.
+
+    By default, the file is created in the ``benchmarks`` subdirectory of the
+    EARM cache, named after the date and the revision of the report.
+    """
+    if path is None:
+        machine = report['machine']
+        stamp = machine['date'][:19].replace('-', '').replace(':', '')
+        filename = '%s-%s.json' % (stamp, machine['earm'] or 'unknown')
+        path = os.path.join(cache_dir('benchmarks'), filename)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True,
+                  separators=(',', ': '))
+        f.write('\n')
+    return path
+
+def load(path):
+    """Load a report saved by :py:func:`save`."""
+    with open(path) as f:
+        return json.load(f)
+
+def compare(old, new):
+    """Compare the times of two reports.
+
+    Returns
+    -------
+    list of tuples
+        ``(model, benchmark, old time, new time, ratio)`` for each benchmark
+        of each model found in both reports, sorted by decreasing ratio of the
+        new time to the old one (the largest slowdowns first).
+    """
+    old_times = dict(((r['model'], r['benchmark']), r['time'])
+                     for r in old['results'])
+    rows = []
+    for r in new['results']:
+        key = (r['model'], r['benchmark'])
+        if key in old_times:
+            rows.append(key + (old_times[key], r['time'],
+                               r['time'] / old_times[key]))
+    rows.sort(key=lambda row: -row[4])
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time the costly operations on the EARM models.")
+    parser.add_argument('models', nargs='*', metavar='model',
+                        help="names of the models (default: all)")
+    parser.add_argument('-b', '--benchmark', action='append',
+                        choices=names, help="benchmark to run (repeatable; "
+                        "default: all)")
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help="timings of each operation (default: 3)")
+    parser.add_argument('-o', '--output', help="report file (default: in "
+                        "the EARM cache)")
+    parser.add_argument('-c', '--compare', metavar='REPORT',
+                        help="earlier report to compare the times with")
+    args = parser.parse_args(argv)
+    for name in args.models:
+        if name not in models.names:
+            parser.error("unknown model '%s'" % name)
+
+    report = run(args.models or None, args.benchmark, args.repeat,
+                 verbose=True)
+    print('Report saved to %s' % save(report, args.output))
+    if args.compare:
+        print('\n%-24s %-12s %10s %10s %7s' % ('Model', 'Benchmark', 'Old (s)',
+                                               'New (s)', 'Ratio'))
+        for row in compare(load(args.compare), report):
+            print('%-24s %-12s %10.4f %10.4f %7.2f' % row)
+
+if __name__ == '__main__':
+    main()
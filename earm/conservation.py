@@ -0,0 +1,262 @@
+"""
+Conservation laws of a reaction network and the reduced system of ODEs.
+
+Every EARM network carries exact mass conservation relations (total Bax,
+total Bcl2, total Smac, ...), one for each protein that is only ever bound,
+modified or moved by the reactions and never made or degraded.
+:py:class:`ConservationLaws` finds them from the stoichiometry matrix, in
+exact rational arithmetic, and expresses one *dependent* species of each
+relation in terms of the others and of the conserved total.
+
+:py:class:`ReducedSystem` gives the ODEs of the remaining *independent*
+species only, for the totals of a given initial state: the dependent amounts
+are reconstructed from the independent ones before the compiled right-hand
+side and Jacobian of :py:class:`earm.network.Network` are evaluated, and the
+Jacobian is reduced by the chain rule. The reduced system is smaller by the
+number of laws, and its Jacobian is regular, so steady states are isolated
+solutions of it (see :py:mod:`earm.steady_state`) and the linear systems of
+the stiff integrators are smaller and better conditioned.
+:py:class:`earm.integrate.Solver` integrates it with ``reduce=True`` and
+reconstructs the full trajectories.
+"""
+
+from __future__ import division
+
+from fractions import Fraction
+
+import numpy as np
+import scipy.sparse
+
+from earm.network import _compile_function, _format_term, _format_sum
+
+def _rref(rows, n_cols):
+    """Reduce a matrix of Fractions (a list of rows) to reduced row echelon
+    form in place, and return the indices of its pivot columns."""
+    pivots = []
+    r = 0
+    for c in range(n_cols):
+        if r == len(rows):
+            break
+        p = next((i for i in range(r, len(rows)) if rows[i][c] != 0), None)
+        if p is None:
+            continue
+        rows[r], rows[p] = rows[p], rows[r]
+        pivot = rows[r][c]
+        rows[r] = [v / pivot for v in rows[r]]
+        for i in range(len(rows)):
+            factor = rows[i][c]
+            if i != r and factor != 0:
+                rows[i] = [a - factor * b for a, b in zip(rows[i], rows[r])]
+        pivots.append(c)
+        r += 1
+    return pivots
+
+class ConservationLaws(object):
+    """The conservation laws of a reaction network.
+
+    The conservation laws are the rows of a basis of the left null space of
+    the stoichiometry matrix ``N``: each row ``l`` gives a linear combination
+    of the species amounts, ``l . y``, which no reaction changes. The basis is
+    in reduced row echelon form, so every law has a *dependent* species with
+    a coefficient of one that does not appear in the other laws, and
+
+        ``y[dependent] = totals - matrix[:, independent] . y[independent]``
+
+    Parameters
+    ----------
+    network : earm.network.Network
+        The network.
+    rate_constants : vector-like, optional
+        Rate constants of the reactions. If given, the reactions whose rate
+        constant is zero are left out, so that the laws also include the
+        relations that only those reactions break (for example, with the
+        formation of a complex turned off, the complex is conserved on its
+        own).
+
+    Attributes
+    ----------
+    matrix : numpy.ndarray
+        The coefficients of the laws, with shape ``(n_laws, n_species)``.
+    dependent, independent : numpy.ndarray of int
+        Indices of the dependent species (one per law, in the order of the
+        laws) and of the other species.
+    n_laws : int
+        Number of independent conservation laws.
+    """
+
+    def __init__(self, network, rate_constants=None):
+        n_species = network.n_species
+        stoichiometry = np.rint(network.stoichiometry).astype(int)
+        if rate_constants is not None:
+            stoichiometry = stoichiometry[:, np.asarray(rate_constants) != 0]
+        # Null space of N^T, from its reduced row echelon form
+        rows = [[Fraction(int(v)) for v in column]
+                for column in stoichiometry.T]
+        pivots = _rref(rows, n_species)
+        basis = []
+        for free in sorted(set(range(n_species)) - set(pivots)):
+            law = [Fraction(0)] * n_species
+            law[free] = Fraction(1)
+            for r, c in enumerate(pivots):
+                law[c] = -rows[r][free]
+            basis.append(law)
+        self.dependent = np.array(_rref(basis, n_species), dtype=int)
+        self.independent = np.array(sorted(set(range(n_species)) -
+                                           set(self.dependent)), dtype=int)
+        self.matrix = np.array([[float(v) for v in law] for law in basis])
+        self.matrix = self.matrix.reshape(len(basis), n_species)
+        self.n_laws = len(basis)
+
+    def totals(self, y):
+        """Return the conserved totals of the species amounts `y`."""
+        return np.dot(self.matrix, y)
+
+    def full(self, x, totals):
+        """Return the species amounts with independent amounts `x` and
+        conserved `totals`.
+
+        `x` may also hold the independent amounts at several times, one time
+        per row, in which case the result has one row per time.
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.empty(x.shape[:-1] + (self.matrix.shape[1],))
+        y[..., self.independent] = x
+        y[..., self.dependent] = totals - np.dot(
+            x, self.matrix[:, self.independent].T)
+        return y
+
+    def reduce_jacobian(self, jac):
+        """Return the Jacobian of the reduced system from the (dense)
+        Jacobian `jac` of the full system."""
+        ind, dep = self.independent, self.dependent
+        return (jac[np.ix_(ind, ind)] -
+                np.dot(jac[np.ix_(ind, dep)], self.matrix[:, ind]))
+
+class ReducedSystem(object):
+    """The ODEs of the independent species of a network.
+
+    The functions have the signature of those of
+    :py:class:`earm.network.Network`, with the conserved totals as an
+    additional argument (see :py:meth:`ConservationLaws.totals`).
+
+    Parameters
+    ----------
+    network : earm.network.Network
+        The network.
+    laws : ConservationLaws, optional
+        The conservation laws of the network, if already known.
+
+    Attributes
+    ----------
+    network : earm.network.Network
+        The network.
+    laws : ConservationLaws
+        The conservation laws.
+    n_species : int
+        The number of independent species, the size of the reduced system.
+    tangent : numpy.ndarray
+        The derivatives of the amounts of all the species with respect to the
+        amounts of the independent ones, with shape
+        ``(network.n_species, n_species)``.
+    jac_indices, jac_indptr : numpy.ndarray
+        Sparsity pattern of the reduced Jacobian, in CSC format.
+    """
+
+    def __init__(self, network, laws=None):
+        self.network = network
+        self.laws = laws if laws is not None else ConservationLaws(network)
+        self.n_species = len(self.laws.independent)
+        # The identity for the independent species, and minus the
+        # coefficients of the laws for the dependent ones
+        ind, dep = self.laws.independent, self.laws.dependent
+        tangent = np.zeros((network.n_species, self.n_species))
+        tangent[ind] = np.eye(self.n_species)
+        tangent[dep] = -self.laws.matrix[:, ind]
+        self.tangent = tangent
+
+        # The reduced Jacobian is the rows of the independent species of the
+        # full one times the tangent, a fixed linear map of the non-zero
+        # entries of the full Jacobian to those of the reduced one
+        position = dict((i, a) for a, i in enumerate(ind))
+        entries = {}
+        full_cols = np.repeat(np.arange(network.n_species),
+                              np.diff(network.jac_indptr))
+        for m, (i, l) in enumerate(zip(network.jac_indices, full_cols)):
+            if i not in position:
+                continue
+            for b in np.flatnonzero(tangent[l]):
+                entries.setdefault((b, position[i]), []).append(
+                    (m, tangent[l, b]))
+        pattern = sorted(entries)
+        self.jac_indices = np.array([a for b, a in pattern], dtype=int)
+        self.jac_indptr = np.searchsorted([b for b, a in pattern],
+                                          np.arange(self.n_species + 1))
+        rows, cols, values = [], [], []
+        for n, key in enumerate(pattern):
+            for m, value in entries[key]:
+                rows.append(n)
+                cols.append(m)
+                values.append(value)
+        self._jac_map = scipy.sparse.csr_matrix(
+            (values, (rows, cols)), shape=(len(pattern), network.jac_nnz))
+        self._jac_rows = self.jac_indices
+        self._jac_cols = np.repeat(np.arange(self.n_species),
+                                   np.diff(self.jac_indptr))
+        self._generate_code()
+
+    def _generate_code(self):
+        # The right-hand side of the ODEs of the independent species, with
+        # the amounts of the dependent species computed first from the totals
+        network = self.network
+        laws = self.laws
+        names = {}
+        for a, i in enumerate(laws.independent):
+            names[i] = 'x[%d]' % a
+        lines = ['def rhs(t, x, k, totals):',
+                 '    xdot = np.zeros(np.shape(x))']
+        for l, i in enumerate(laws.dependent):
+            names[i] = 'y%d' % i
+            terms = [_format_term(1, ['totals[%d]' % l])]
+            terms += [_format_term(-laws.matrix[l, j], [names[j]])
+                      for j in laws.independent if laws.matrix[l, j] != 0]
+            lines.append('    y%d = %s' % (i, _format_sum(terms)))
+        for j, reactants in enumerate(network.reactants):
+            lines.append('    r%d = %s' % (j, '*'.join(
+                ['k[%d]' % j] + [names[i] for i in reactants])))
+        for a, i in enumerate(laws.independent):
+            terms = [_format_term(network.stoichiometry[i, j], ['r%d' % j])
+                     for j in np.flatnonzero(network.stoichiometry[i])]
+            if terms:
+                lines.append('    xdot[%d] = %s' % (a, _format_sum(terms)))
+        lines.append('    return xdot')
+        self._rhs = _compile_function('\n'.join(lines), 'rhs',
+                                      '<%s reduced network>' %
+                                      network.model.name)
+
+    def rhs(self, t, x, k, totals):
+        """Return the time derivatives of the independent species."""
+        return self._rhs(t, x, k, totals)
+
+    def jacobian_data(self, t, x, k, totals):
+        """Return the non-zero entries of the reduced Jacobian, in CSC
+        order."""
+        y = self.laws.full(x, totals)
+        return self._jac_map.dot(self.network.jacobian_data(t, y, k))
+
+    def jacobian(self, t, x, k, totals):
+        """Return the Jacobian of the reduced system as a sparse matrix."""
+        return scipy.sparse.csc_matrix(
+            (self.jacobian_data(t, x, k, totals), self.jac_indices,
+             self.jac_indptr), shape=(self.n_species, self.n_species))
+
+    def jacobian_dense(self, t, x, k, totals, out=None):
+        """Return the Jacobian of the reduced system as a dense array.
+
+        If `out` is given, the Jacobian is written into it (it is assumed to
+        be zero outside of the sparsity pattern).
+        """
+        if out is None:
+            out = np.zeros((self.n_species, self.n_species))
+        out[self._jac_rows, self._jac_cols] = self.jacobian_data(t, x, k,
+                                                                 totals)
+        return out
@@ -0,0 +1,243 @@
+"""
+Experimental data sets, cached in a binary format for fast loading.
+
+The experimental data in the ``xpdata`` directory come as text (CSV) and
+Excel files, which are slow to parse. :py:func:`load` returns a data set by
+name as a :py:class:`Dataset`, whose columns are rows of one float array
+stored in the ``data`` subdirectory of the EARM cache (see
+:py:func:`earm.util.cache_dir`) as a ``.npy`` file, next to a JSON file with
+the names and units of the columns and the identity of the source file. The
+source is parsed the first time a data set is loaded; afterwards, the array is
+memory-mapped read-only from the cache, which takes a fraction of a
+millisecond and lets all the processes that load it share one copy of the
+data in memory.
+
+The cached array is rebuilt when the source file changes: the size and
+modification time of the source are checked on every load, and if they
+differ from those recorded in the cache, the SHA-1 digest of its content
+decides whether it must be parsed again.
+
+The data sets are:
+
+- ``'reporters'``: the normalized IC-RP, IMS-RP and EC-RP reporter
+  trajectories used to fit the models (from
+  ``xpdata/forfits/EC-RP_IMS-RP_IC-RP_data_for_models.csv``);
+- ``'bax_gfp'``, ``'bcl2_gfp'``, ``'bclxl_gfp'`` and ``'bid_gfp'``: the
+  amount of the overexpressed GFP-tagged protein and the time of MOMP in
+  single cells treated with 50 ng/ml TRAIL plus cycloheximide (from the
+  sheets prepared for Matlab in ``xpdata/*.xls``; see
+  ``xpdata/message.txt``).
+
+Reading the Excel files requires the xlrd package, which is only needed the
+first time (or after the file changes), when the cache is built.
+"""
+
+import os
+import io
+import glob
+import json
+import hashlib
+
+import numpy as np
+
+from earm.util import cache_dir, write_atomic
+
+# Bump this whenever the format or the content of the cache entries changes,
+# so that entries written by older versions are rebuilt.
+_CACHE_VERSION = 1
+
+xpdata_dir = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'xpdata')
+
+class Dataset(object):
+    """A table of float columns, backed by a read-only memory-mapped array.
+
+    Columns are accessed by name, as for a record array: ``dataset['Time']``
+    is a vector (a view on the cached array, without a copy) and
+    ``dataset[['Time', 'VAR']]`` a 2-D array with one row per column.
+
+    Attributes
+    ----------
+    name : string
+        Name of the data set.
+    columns : list of strings
+        Names of the columns.
+    units : list of strings
+        Units of the columns (empty when dimensionless or unknown).
+    description : string
+        What the data are.
+    source : dict
+        ``path`` (relative to the xpdata directory), ``sheet`` (for Excel
+        files), and ``sha1``, the digest of the content of the source file.
+    array : numpy.ndarray
+        The data, with one row per column.
+    """
+
+    def __init__(self, name, columns, units, description, source, array):
+        self.name = name
+        self.columns = list(columns)
+        self.units = list(units)
+        self.description = description
+        self.source = source
+        self.array = array
+        self._index = dict((c, i) for i, c in enumerate(self.columns))
+
+    def __len__(self):
+        return self.array.shape[1]
+
+    def __contains__(self, column):
+        return column in self._index
+
+    def __getitem__(self, key):
+        if isinstance(key, (list, tuple)):
+            return self.array[[self._index[k] for k in key]]
+        return self.array[self._index[key]]
+
+    def __repr__(self):
+        return '<Dataset %r: %d rows of %s>' % (self.name, len(self),
+                                                ', '.join(self.columns))
+
+    def to_records(self):
+        """Return a copy of the data as a record array, with one field per
+        column (as returned by :py:func:`numpy.genfromtxt` with names)."""
+        records = np.empty(len(self), dtype=[(str(c), float)
+                                             for c in self.columns])
+        for c in self.columns:
+            records[c] = self[c]
+        return records
+
+def _read_csv(path, sheet, columns):
+    # genfromtxt makes the names in the header into valid identifiers
+    # (e.g. 'norm_IC-RP' into 'norm_ICRP')
+    records = np.genfromtxt(path, delimiter=',', names=True)
+    names = list(records.dtype.names)
+    return names, np.array([records[n] for n in names], dtype=float)
+
+def _read_sheet(path, sheet, columns):
+    try:
+        import xlrd
+    except ImportError:
+        raise ImportError("The xlrd package is required to read %s" % path)
+    workbook = xlrd.open_workbook(path)
+    sheet = workbook.sheet_by_name(sheet)
+    # A row of headers followed by numbers, ending at the first empty row
+    rows = []
+    for r in range(1, sheet.nrows):
+        values = sheet.row_values(r, 0, len(columns))
+        if all(v == '' for v in values):
+            break
+        rows.append([v if isinstance(v, float) else np.nan for v in values])
+    return list(columns), np.array(rows, dtype=float).reshape(-1,
+                                                              len(columns)).T
+
+# name: (path in xpdata, reader, sheet, column names, units, description)
+_sources = {
+    'reporters': (
+        os.path.join('forfits', 'EC-RP_IMS-RP_IC-RP_data_for_models.csv'),
+        _read_csv, None, None, None,
+        "Normalized IC-RP, IMS-RP and EC-RP reporter trajectories, with "
+        "their variances, used to fit the models"),
+    'bax_gfp': (
+        '10-3-07_SR17_Bax-GFP_sorted_1and4_20x_apoptopower.xls',
+        _read_sheet, 'forMatlab_realUnits', ['Bax_GFP', 'death_time'],
+        ['molecules/cell', 'h'],
+        "Overexpressed Bax-GFP and time of death in single cells"),
+    'bcl2_gfp': (
+        '5-14-08_NIC_Bcl2_Bclxl_sorted.xls',
+        _read_sheet, 'Bcl2GFPforMatlab', ['Bcl2_GFP', 'momp_time'],
+        ['molecules/cell', 'h'],
+        "Overexpressed Bcl-2-GFP and time of MOMP in single cells"),
+    'bclxl_gfp': (
+        '5-14-08_NIC_BclxL_realnumbers_sorted.xls',
+        _read_sheet, 'bclxl-gfp 50+ matlab (real #s)',
+        ['BclxL_GFP', 'momp_time'], ['molecules/cell', 'h'],
+        "Overexpressed Bcl-xL-GFP and time of MOMP in single cells"),
+    'bid_gfp': (
+        '7-25-08_bid_bax_transienttransfect_realnums.xls',
+        _read_sheet, 'bid50+formatlab', ['Bid_GFP', 'momp_time'],
+        ['molecules/cell', 'h'],
+        "Transiently transfected Bid-GFP and time of MOMP in single cells"),
+    }
+
+def names():
+    """Return the names of the data sets."""
+    return sorted(_sources)
+
+def _sha1(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _paths(name, directory):
+    if directory is None:
+        directory = cache_dir('data')
+    base = os.path.join(directory, name)
+    return base + '.npy', base + '.json'
+
+def load(name, directory=None):
+    """Return a data set, parsing its source only if the cache is stale.
+
+    Parameters
+    ----------
+    name : string
+        Name of the data set (see :py:func:`names`).
+    directory : string, optional
+        Directory of the cached data sets. Defaults to the ``data``
+        subdirectory of the EARM cache.
+
+    Returns
+    -------
+    Dataset
+    """
+    if name not in _sources:
+        raise ValueError("Unknown data set '%s'; must be one of %s" %
+                         (name, ', '.join(names())))
+    path, reader, sheet, columns, units, description = _sources[name]
+    source_path = os.path.join(xpdata_dir, path)
+    array_path, meta_path = _paths(name, directory)
+    stat = os.stat(source_path)
+    signature = [stat.st_size, stat.st_mtime]
+    meta = None
+    if os.path.exists(meta_path) and os.path.exists(array_path):
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        if (meta.get('version') != _CACHE_VERSION or
+                meta['source']['sheet'] != sheet):
+            meta = None
+        elif meta['signature'] != signature:
+            # Touched, but possibly not changed
+            if meta['source']['sha1'] == _sha1(source_path):
+                meta['signature'] = signature
+                write_atomic(meta_path, json.dumps(meta), 'w')
+            else:
+                meta = None
+    if meta is None:
+        sha1 = _sha1(source_path)
+        columns, array = reader(source_path, sheet, columns)
+        buf = io.BytesIO()
+        np.save(buf, np.ascontiguousarray(array, dtype=float))
+        write_atomic(array_path, buf.getvalue())
+        meta = {
+            'version': _CACHE_VERSION,
+            'columns': columns,
+            'units': units or [''] * len(columns),
+            'description': description,
+            'signature': signature,
+            'source': {'path': path, 'sheet': sheet, 'sha1': sha1},
+            }
+        write_atomic(meta_path, json.dumps(meta), 'w')
+    array = np.load(array_path, mmap_mode='r')
+    return Dataset(name, meta['columns'], meta['units'], meta['description'],
+                   meta['source'], array)
+
+def clear(directory=None):
+    """Delete all cached data sets. Returns the number of files removed."""
+    if directory is None:
+        directory = cache_dir('data')
+    paths = (glob.glob(os.path.join(directory, '*.npy')) +
+             glob.glob(os.path.join(directory, '*.json')))
+    for path in paths:
+        os.remove(path)
+    return len(paths)
@@ -0,0 +1,192 @@
+"""
+Simulation of populations of cells that differ in their protein levels.
+
+Cells of a clonal population treated with the same dose of TRAIL undergo
+MOMP at widely different times, and the variability comes mainly from
+differences in the levels of the apoptotic proteins from cell to cell
+[Spencer2009]_, which are approximately lognormally distributed. The models
+describe one nominal cell; :py:func:`sample_initial_conditions` draws the
+initial amounts of the proteins of N cells from lognormal distributions with
+the nominal amounts as their means, and :py:func:`simulate_population`
+integrates all the cells with :py:class:`earm.batch.BatchSolver` (optionally
+in several processes) and returns the timing of MOMP of each cell, as
+computed by :py:func:`earm.features.timing`, next to its protein levels. The
+distribution of the delay times Td can then be compared with the times of
+MOMP measured in single cells (see :py:func:`momp_times` and
+:py:func:`ks_distance`), leaving out the cells that had not undergone MOMP
+when the recording ended (see :py:func:`end_time`).
+"""
+
+import numpy as np
+import scipy.stats
+
+from earm import data
+from earm.batch import BatchSolver, run_parallel
+from earm.features import timing
+from earm.network import Network
+
+# The ligand is the dose, which all the cells of a population receive alike
+_dose_parameters = ['L_0']
+
+# Time at which the recording of the single-cell data sets ended, in hours,
+# for those in which some cells had not undergone MOMP by then
+_end_times = {'bcl2_gfp': 16.0, 'bclxl_gfp': 16.0}
+
+def lognormal(mean, cv, size=None, random=np.random):
+    """Draw from the lognormal distribution with a given mean and coefficient
+    of variation (standard deviation over mean)."""
+    sigma2 = np.log1p(np.square(cv))
+    return mean * random.lognormal(-sigma2 / 2, np.sqrt(sigma2), size)
+
+def sample_initial_conditions(model, n, cv=0.25, parameters=None,
+                              param_values=None, seed=None):
+    """Draw the initial protein amounts of a population of cells.
+
+    Parameters
+    ----------
+    model : pysb.core.Model or earm.network.Network
+        The model of one cell.
+    n : int
+        Number of cells.
+    cv : float or dict, optional
+        Coefficient of variation of the amounts, either the same for all the
+        parameters or a dict mapping parameter names to values.
+    parameters : list of strings, optional
+        Names of the parameters to vary. By default, all the parameters of
+        the initial conditions with a nonzero value, except the ligand.
+    param_values : dict, optional
+        Nominal values of some parameters, in place of those of the model.
+    seed : int, optional
+        Seed of the random number generator.
+
+    Returns
+    -------
+    dict
+        Mapping of the parameter names to arrays of n amounts, as accepted by
+        :py:meth:`earm.batch.BatchSolver.run`.
+    """
+    network = Network.of(model)
+    nominal = network.param_vector(param_values)
+    names = network.parameter_names
+    if parameters is None:
+        parameters = [names[p] for s, p in network.initial_conditions
+                      if nominal[p] != 0 and
+                      names[p] not in _dose_parameters]
+    random = np.random.RandomState(seed)
+    samples = {}
+    for name in parameters:
+        try:
+            index = names.index(name)
+        except ValueError:
+            raise IndexError("Unknown parameter name (%s)" % name)
+        c = cv.get(name, 0) if isinstance(cv, dict) else cv
+        samples[name] = lognormal(nominal[index], c, n, random)
+    return samples
+
+def simulate_population(model, tspan, n=10000, cv=0.25, parameters=None,
+                        param_values=None, observable='aSmac', seed=None,
+                        processes=1, **solver_options):
+    """Simulate a population of cells and return the timing of their MOMP.
+
+    Parameters
+    ----------
+    model : pysb.core.Model or earm.network.Network
+        The model of one cell.
+    tspan : vector-like
+        Time points of the integration, which must cover the MOMP of all the
+        cells.
+    n : int, optional
+        Number of cells.
+    cv, parameters, seed : optional
+        The variability of the proteins (see
+        :py:func:`sample_initial_conditions`).
+    param_values : dict, optional
+        Values of parameters common to all the cells (such as the dose
+        ``L_0``), in place of those of the model.
+    observable : string, optional
+        Name of the observable whose rise marks MOMP; the default, released
+        Smac, corresponds to the IMS-RP reporter.
+    processes : int, optional
+        Number of processes that integrate the cells, each a share of the
+        batches. None for the number of CPUs.
+    **solver_options
+        Passed to :py:class:`earm.batch.BatchSolver` (``rtol``, ``atol``,
+        ``batch_size``, ...).
+
+    Returns
+    -------
+    numpy.ndarray with record-style data-type
+        One record per cell, with the amounts of the varied parameters and
+        the fields of :py:func:`earm.features.timing` (``td``, ``ts``,
+        ``yfinal``, ``tlow`` and ``thigh``). The times of the cells that do
+        not undergo MOMP within `tspan` are NaN.
+    """
+    network = Network.of(model)
+    samples = sample_initial_conditions(network, n, cv, parameters,
+                                        param_values, seed)
+    solver = BatchSolver(network, tspan, **solver_options)
+    params = solver.param_matrix(param_values, n=n)
+    for name, values in samples.items():
+        params[:, network.parameter_names.index(name)] = values
+    obs = network.observable_names.index(observable)
+
+    yobs = run_parallel(solver, params, processes)
+
+    momp = timing(solver.tspan, yobs[:, :, obs])
+    names = sorted(samples)
+    result = np.empty(n, [(name, float) for name in names] +
+                      momp.dtype.descr)
+    for name in names:
+        result[name] = samples[name]
+    for field in momp.dtype.names:
+        result[field] = momp[field]
+    return result
+
+def end_time(name):
+    """Return the time at which the recording of the cells of a single-cell
+    data set ended, in seconds, or None if every cell underwent MOMP before.
+
+    The cells that had not undergone MOMP by then are given that time in the
+    data set.
+    """
+    hours = _end_times.get(name)
+    return None if hours is None else hours * 3600
+
+def momp_times(name):
+    """Return the times of MOMP (or death) measured in single cells that
+    overexpress a GFP-tagged protein, in seconds.
+
+    The cells that did not undergo MOMP before the end of the recording (see
+    :py:func:`end_time`) are left out.
+
+    Parameters
+    ----------
+    name : string
+        One of the single-cell data sets of :py:mod:`earm.data`:
+        ``'bax_gfp'``, ``'bcl2_gfp'``, ``'bclxl_gfp'`` or ``'bid_gfp'``.
+    """
+    dataset = data.load(name)
+    column = dataset.columns[-1]
+    times = np.asarray(dataset[column], dtype=float) * 3600
+    times = times[np.isfinite(times)]
+    end = end_time(name)
+    if end is not None:
+        times = times[times < end]
+    return times
+
+def ks_distance(td, observed, end=None):
+    """Return the Kolmogorov-Smirnov distance between simulated and observed
+    MOMP times, and its p-value.
+
+    The cells that do not undergo MOMP (with a NaN time) are ignored. If the
+    observed times were censored at `end` (see :py:func:`end_time`), the
+    simulated cells that undergo MOMP at or after that time are ignored too,
+    so that both samples are of the cells that undergo MOMP during the
+    recording.
+    """
+    td = np.asarray(td, dtype=float)
+    observed = np.asarray(observed, dtype=float)
+    td = td[np.isfinite(td)]
+    if end is not None:
+        td = td[td < end]
+    return scipy.stats.ks_2samp(td, observed[np.isfinite(observed)])
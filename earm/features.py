@@ -0,0 +1,149 @@
+"""
+Features of simulated trajectories, computed for many trajectories at once.
+
+The phenotype of a cell in EARM experiments is summarized by the timing of
+MOMP, as measured by the IMS-RP reporter [Albeck2008]_: the delay time Td,
+when the normalized trajectory is halfway between its 10% and 90% levels,
+the switching time Ts between those two levels, and the final amount
+yfinal. :py:func:`timing` computes them for an array of trajectories with
+shape ``(N, len(t))`` (such as one observable of the results of
+:py:class:`earm.batch.BatchSolver`) without a Python loop over the
+trajectories: the first sample at or above each level is found for all the
+trajectories together, and the crossing time is then interpolated on the
+interval before it only. :py:func:`crossing_times` gives the crossing times
+of any levels.
+
+With ``interpolation='cubic'`` (the default), the trajectory is interpolated
+on that interval by the cubic Hermite polynomial with the slopes of
+:py:func:`numpy.gradient`, which agrees closely with the interpolating
+spline used before (``scipy.interpolate.splrep`` and ``sproot`` on the
+whole trajectory); ``'linear'`` interpolation is also available. When the
+exact slopes are known, as for the :py:class:`earm.integrate.DenseSolution`
+of a dense output simulation, they can be passed as `dydt` to find the
+crossings on that interpolant itself, at the steps of the integrator.
+"""
+
+import numpy as np
+
+def crossing_times(t, y, levels, normalize=True, interpolation='cubic',
+                   dydt=None):
+    """Return the times at which trajectories first rise through levels.
+
+    Parameters
+    ----------
+    t : vector-like
+        Increasing time points of the trajectories.
+    y : array-like
+        One trajectory with shape ``(len(t),)``, or N trajectories with shape
+        ``(N, len(t))``.
+    levels : float or vector-like
+        The levels to find the crossings of.
+    normalize : bool, optional
+        If True (default), the levels are fractions of the maximum of each
+        trajectory.
+    interpolation : 'cubic' or 'linear', optional
+        Interpolation of the trajectories between time points.
+    dydt : array-like, optional
+        Slopes of the trajectories at the time points (same shape as y), for
+        the cubic interpolation. By default, they are estimated with
+        :py:func:`numpy.gradient`.
+
+    Returns
+    -------
+    numpy.ndarray
+        The crossing times, with shape ``(N, len(levels))`` (or
+        ``(len(levels),)`` for a single trajectory, or a scalar for a single
+        trajectory and level). A trajectory that never rises through a level
+        (for example, one that starts above it) has a crossing time of NaN.
+    """
+    if interpolation not in ('cubic', 'linear'):
+        raise ValueError("Unknown interpolation '%s'; must be 'cubic' or "
+                         "'linear'" % interpolation)
+    t = np.asarray(t, dtype=float)
+    y = np.asarray(y, dtype=float)
+    levels = np.asarray(levels, dtype=float)
+    shape = y.shape[:-1] + levels.shape
+    y = y.reshape(-1, len(t))
+    levels = levels.reshape(-1)
+    if dydt is None:
+        slope = np.gradient(y, t, axis=1)
+    else:
+        slope = np.asarray(dydt, dtype=float).reshape(y.shape)
+    if normalize:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ymax = np.max(y, axis=1)[:, None]
+            y = y / ymax
+            slope = slope / ymax
+    n, n_levels = len(y), len(levels)
+
+    # First sample at or above each level, for each trajectory and level
+    with np.errstate(invalid='ignore'):
+        above = y[:, None, :] >= levels[None, :, None]
+    j = np.argmax(above, axis=2)
+    found = np.any(above, axis=2) & (j > 0)
+    rows = np.repeat(np.arange(n)[:, None], n_levels, axis=1)[found]
+    level = np.broadcast_to(levels, (n, n_levels))[found]
+    j = j[found]
+    t0, t1 = t[j - 1], t[j]
+    y0, y1 = y[rows, j - 1], y[rows, j]
+    times = np.full((n, n_levels), np.nan)
+    if interpolation == 'linear':
+        times[found] = t0 + (level - y0) / (y1 - y0) * (t1 - t0)
+    else:
+        # Bisection on the Hermite cubic over each interval, which is below
+        # the level at its start and not below it at its end
+        h = t1 - t0
+        m0, m1 = slope[rows, j - 1] * h, slope[rows, j] * h
+        lo, hi = np.zeros(len(j)), np.ones(len(j))
+        for _ in range(40):
+            s = (lo + hi) / 2
+            p = ((2 * s ** 3 - 3 * s ** 2 + 1) * y0 +
+                 (s ** 3 - 2 * s ** 2 + s) * m0 +
+                 (-2 * s ** 3 + 3 * s ** 2) * y1 + (s ** 3 - s ** 2) * m1)
+            below = p < level
+            lo = np.where(below, s, lo)
+            hi = np.where(below, hi, s)
+        times[found] = t0 + (lo + hi) / 2 * h
+    return times.reshape(shape)
+
+def timing(t, y, low=0.1, high=0.9, interpolation='cubic', dydt=None):
+    """Return the delay time, switching time and final value of trajectories.
+
+    Parameters
+    ----------
+    t : vector-like
+        Increasing time points of the trajectories.
+    y : array-like
+        One trajectory with shape ``(len(t),)``, or N trajectories with shape
+        ``(N, len(t))``.
+    low, high : float, optional
+        The levels between which the switch is measured, as fractions of the
+        maximum of each trajectory.
+    interpolation : 'cubic' or 'linear', optional
+        Interpolation of the trajectories between time points.
+    dydt : array-like, optional
+        Slopes of the trajectories at the time points (see
+        :py:func:`crossing_times`).
+
+    Returns
+    -------
+    numpy.ndarray with record-style data-type
+        With fields ``td`` (the mean of the times of crossing the low and high
+        levels), ``ts`` (their difference), ``yfinal`` (the last value of the
+        trajectory, not normalized), and ``tlow`` and ``thigh`` (the crossing
+        times), and with shape ``(N,)``, or no dimensions for a single
+        trajectory. The times of a trajectory that does not switch are NaN.
+    """
+    y = np.asarray(y, dtype=float)
+    crossings = crossing_times(t, y, [low, high], interpolation=interpolation,
+                               dydt=dydt)
+    result = np.empty(y.shape[:-1], dtype=[('td', float), ('ts', float),
+                                           ('yfinal', float), ('tlow', float),
+                                           ('thigh', float)])
+    tlow, thigh = crossings[..., 0], crossings[..., 1]
+    result['td'] = (tlow + thigh) / 2
+    result['ts'] = thigh - tlow
+    result['yfinal'] = y[..., -1]
+    result['tlow'] = tlow
+    result['thigh'] = thigh
+    return result
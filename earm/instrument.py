@@ -0,0 +1,161 @@
+"""
+Counters and timers for profiling long runs without an external profiler.
+
+A :py:class:`Stats` object accumulates the time spent in named stages of a
+computation and counts of named events. A stage is timed by a ``with``
+block::
+
+    stats = Stats()
+    with stats.timer('simulate'):
+        solver.run(params)
+    stats.count('evaluations')
+
+:py:class:`earm.integrate.Solver` keeps the counts of its integrations in
+such an object (its ``stats`` attribute, which can be shared with the
+caller): the number of runs, steps, evaluations of the right-hand side and
+of the Jacobian, runs stopped by the `stop` function and failed runs, and the
+time spent integrating. :py:meth:`Stats.summary` formats everything as a
+table and :py:meth:`Stats.line` as a single line, which
+:py:class:`PeriodicLog` prints at regular intervals from the progress
+callback of an optimization (see :py:mod:`earm.optimize`).
+
+Stages may be nested, in which case the time of the inner stage is also part
+of the time of the outer one; the shares of the total are given relative to
+the time elapsed since the object was created or reset. The counts of a
+worker process stay in that process; merge them with
+:py:meth:`Stats.update` if they are sent back.
+"""
+
+import sys
+import contextlib
+from timeit import default_timer
+
+class Stats(object):
+    """Cumulative times of stages and counts of events.
+
+    Attributes
+    ----------
+    times : dict
+        Total time spent in each stage, in seconds.
+    calls : dict
+        Number of times each stage was entered.
+    counts : dict
+        Value of each counter.
+    start : float
+        Time at which the statistics started to be collected.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Clear all the times and counts."""
+        self.times = {}
+        self.calls = {}
+        self.counts = {}
+        # Names in the order in which they first appear, for the reports
+        self._stages = []
+        self._counters = []
+        self.start = default_timer()
+
+    @contextlib.contextmanager
+    def timer(self, stage):
+        """Time the body of a ``with`` block as part of a stage."""
+        start = default_timer()
+        try:
+            yield
+        finally:
+            self.add_time(stage, default_timer() - start)
+
+    def add_time(self, stage, seconds, calls=1):
+        """Add time spent in a stage."""
+        if stage not in self.times:
+            self._stages.append(stage)
+            self.times[stage] = 0.0
+            self.calls[stage] = 0
+        self.times[stage] += seconds
+        self.calls[stage] += calls
+
+    def count(self, name, n=1):
+        """Add `n` to a counter."""
+        if name not in self.counts:
+            self._counters.append(name)
+            self.counts[name] = 0
+        self.counts[name] += n
+
+    def update(self, other):
+        """Add the times and counts of another Stats object to this one."""
+        for stage in other._stages:
+            self.add_time(stage, other.times[stage], other.calls[stage])
+        for name in other._counters:
+            self.count(name, other.counts[name])
+
+    @property
+    def elapsed(self):
+        """Time elapsed since the statistics started to be collected."""
+        return default_timer() - self.start
+
+    def summary(self):
+        """Return a table of the stages and counters."""
+        elapsed = self.elapsed
+        lines = ['%-24s %10s %12s %10s %7s' % ('Stage', 'Calls', 'Total (s)',
+                                               'Mean (ms)', 'Share')]
+        for stage in self._stages:
+            t, n = self.times[stage], self.calls[stage]
+            lines.append('%-24s %10d %12.3f %10.3f %6.1f%%' %
+                         (stage, n, t, 1e3 * t / n, 100 * t / elapsed))
+        lines.append('%-24s %10s %12.3f' % ('(elapsed)', '', elapsed))
+        if self._counters:
+            lines.append('')
+            lines.append('%-24s %10s' % ('Counter', 'Value'))
+            for name in self._counters:
+                lines.append('%-24s %10d' % (name, self.counts[name]))
+        return '\n'.join(lines)
+
+    def line(self):
+        """Return the stages and counters on one line."""
+        elapsed = self.elapsed
+        items = ['elapsed %.1f s' % elapsed]
+        items.extend('%s %.1f s (%.0f%%)' % (stage, self.times[stage],
+                                             100 * self.times[stage] /
+                                             elapsed)
+                     for stage in self._stages)
+        items.extend('%s %d' % (name, self.counts[name])
+                     for name in self._counters)
+        return ', '.join(items)
+
+class PeriodicLog(object):
+    """Progress callback that writes :py:meth:`Stats.line` at most once per
+    `interval` seconds.
+
+    Parameters
+    ----------
+    stats : Stats
+        The statistics to report.
+    interval : float, optional
+        Minimum time between two lines, in seconds.
+    callback : callable, optional
+        Another callback, called first with the same arguments; its return
+        value (which may ask an optimizer to stop) is returned.
+    stream : file-like, optional
+        Where the lines are written (by default, standard output).
+    """
+
+    def __init__(self, stats, interval=60.0, callback=None, stream=None):
+        self.stats = stats
+        self.interval = interval
+        self.callback = callback
+        self.stream = stream
+        self.last = default_timer()
+
+    def __call__(self, *args):
+        result = None
+        if self.callback is not None:
+            result = self.callback(*args)
+        now = default_timer()
+        if now - self.last >= self.interval:
+            self.last = now
+            stream = self.stream or sys.stdout
+            stream.write('stats: %s\n' % self.stats.line())
+            stream.flush()
+        return result
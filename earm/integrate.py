@@ -0,0 +1,631 @@
+"""
+Fast deterministic simulation of EARM models.
+
+:py:class:`Solver` has the same interface as :py:class:`pysb.integrate.Solver`
+(``run(param_values, y0)`` followed by access to the ``y``, ``yobs`` and
+``yobs_view`` attributes), but it integrates the ODEs using the functions
+compiled by :py:class:`earm.network.Network`: a mass-action right-hand side
+that computes each reaction rate only once, and an analytical Jacobian that
+only evaluates the entries in its sparsity pattern. Stiff (BDF) integrators
+therefore no longer need to approximate the Jacobian by finite differences,
+which takes one evaluation of the right-hand side per species.
+
+The integrators that can be selected are:
+
+- ``'vode'`` (the default) and ``'lsoda'``, the ODEPACK integrators from
+  :py:class:`scipy.integrate.ode`, which are given the Jacobian as a dense
+  matrix (fast for networks of up to a few hundred species);
+- ``'bdf'``, the BDF method of :py:func:`scipy.integrate.solve_ivp`, which is
+  given the Jacobian as a sparse matrix and is preferable for very large
+  networks.
+
+In dense output mode, the integrator takes its own steps without regard to
+``tspan``, which then only lists the times at which results are stored, and
+the trajectories can be evaluated at any other time within the integration
+interval by a :py:class:`DenseSolution`, the piecewise cubic Hermite
+interpolant of the amounts at the steps of the integrator.
+
+:py:class:`SensitivitySolver` also integrates the forward sensitivity
+equations of the model, giving the derivatives of the trajectories with
+respect to a set of parameters, as needed for gradient-based fitting.
+"""
+
+import itertools
+import warnings
+from timeit import default_timer
+
+import numpy as np
+import scipy.integrate
+import scipy.sparse
+import scipy.sparse.linalg
+
+from earm.network import Network
+from earm.conservation import ReducedSystem
+from earm.instrument import Stats
+
+default_integrator_options = {
+    'vode': {
+        'method': 'bdf',
+        'with_jacobian': True,
+        'nsteps': 2**31 - 1,
+        },
+    'lsoda': {
+        'nsteps': 2**31 - 1,
+        },
+    'bdf': {},
+    }
+
+class Solver(object):
+    """An ODE solver for a model using a compiled RHS and analytic Jacobian.
+
+    Parameters
+    ----------
+    model : pysb.core.Model or earm.network.Network
+        The model to integrate. Passing a Network that has already been built
+        avoids generating the code for the model again.
+    tspan : vector-like
+        Time values at which the species amounts are returned. The first
+        value is the initial time.
+    rtol, atol : float, optional
+        Relative and absolute integration tolerances.
+    integrator : string, optional
+        One of ``'vode'`` (default), ``'lsoda'`` or ``'bdf'``.
+    use_jacobian : bool, optional
+        If True (default), give the analytic Jacobian to the integrator.
+    dense_output : bool, optional
+        If True (not available with ``'lsoda'``), the integrator runs freely
+        over the steps it chooses, the results at the time points of tspan
+        are interpolated between them, and ``solution`` is set after each
+        run. The time points are then only needed where the results are used,
+        not to help the integrator.
+    reduce : bool, optional
+        If True, integrate the reduced system of the independent species of
+        the conservation laws of the network (see
+        :py:mod:`earm.conservation`), and reconstruct the amounts of the
+        dependent species from the conserved totals of the initial amounts.
+    stats : earm.instrument.Stats, optional
+        Statistics to which the counts of the integrations are added; by
+        default, a new object.
+    integrator_options
+        Additional options for the integrator.
+
+    Attributes
+    ----------
+    network : earm.network.Network
+        The network of the model, with its compiled functions.
+    y : numpy.ndarray
+        Species trajectories, with shape ``(len(tspan), n_species)``.
+    yobs : numpy.ndarray with record-style data-type
+        Observable trajectories, with fields named after the observables.
+    yobs_view : numpy.ndarray
+        An array view on ``yobs`` with shape ``(len(tspan), n_observables)``.
+    solution : DenseSolution
+        With `dense_output`, the interpolant of the species trajectories over
+        the interval integrated by the last run.
+    system : earm.conservation.ReducedSystem or None
+        With `reduce`, the reduced system that is integrated.
+    stats : earm.instrument.Stats
+        The time spent in the integrator (stage ``integrate``) and the counts
+        of ``runs``, ``steps``, evaluations of the right-hand side (``rhs``)
+        and of the Jacobian (``jacobian``), runs ended by the stop function
+        (``stopped``) and runs in which the integrator failed
+        (``failures``), over all the runs.
+    """
+
+    def __init__(self, model, tspan, rtol=1e-6, atol=1e-6, integrator='vode',
+                 use_jacobian=True, dense_output=False, reduce=False,
+                 stats=None, **integrator_options):
+        self.network = Network.of(model)
+        self.model = self.network.model
+        self.tspan = np.asarray(tspan, dtype=float)
+        self.rtol = rtol
+        self.atol = atol
+        if integrator not in default_integrator_options:
+            raise ValueError("Unknown integrator '%s'; must be one of %s" %
+                             (integrator,
+                              ', '.join(sorted(default_integrator_options))))
+        self.integrator_name = integrator
+        self.use_jacobian = use_jacobian
+        if dense_output and integrator == 'lsoda':
+            raise ValueError("dense_output requires integrator 'vode' or "
+                             "'bdf'")
+        self.dense_output = dense_output
+        self.solution = None
+        self.stats = stats if stats is not None else Stats()
+        self.opts = dict(default_integrator_options[integrator])
+        self.opts.update(integrator_options)
+
+        n_species = self.network.n_species
+        self.y = np.ndarray((len(self.tspan), n_species))
+        if self.network.n_observables:
+            self.yobs = np.ndarray(len(self.tspan), list(zip(
+                self.network.observable_names, itertools.repeat(float))))
+        else:
+            self.yobs = np.ndarray((len(self.tspan), 0))
+        self.yobs_view = self.yobs.view(float).reshape(len(self.yobs), -1)
+        # The functions of the system that is integrated, and its trajectories
+        if reduce:
+            self.system = ReducedSystem(self.network)
+            n_species = self.system.n_species
+            self._y = np.ndarray((len(self.tspan), n_species))
+        else:
+            self.system = None
+            self._y = self.y
+        self._functions = self.system or self.network
+        self._jac = np.zeros((n_species, n_species))
+
+        if integrator in ('vode', 'lsoda'):
+            jac = None
+            if use_jacobian:
+                jac = (self._reduced_dense_jacobian if reduce else
+                       self._dense_jacobian)
+            self.integrator = scipy.integrate.ode(self._functions.rhs, jac=jac)
+            with warnings.catch_warnings():
+                warnings.filterwarnings('error', 'No integrator name match')
+                self.integrator.set_integrator(integrator, rtol=rtol,
+                                               atol=atol, **self.opts)
+        else:
+            self.integrator = None
+
+    def _dense_jacobian(self, t, y, k):
+        return self.network.jacobian_dense(t, y, k, out=self._jac)
+
+    def _reduced_dense_jacobian(self, t, y, k, totals):
+        # ODEPACK passes the extra arguments by the signature of the function
+        return self.system.jacobian_dense(t, y, k, totals, out=self._jac)
+
+    def run(self, param_values=None, y0=None, stop=None):
+        """Perform an integration.
+
+        Returns nothing; access the Solver object's ``y``, ``yobs``, or
+        ``yobs_view`` attributes to retrieve the results. If the integration
+        fails or is stopped, the species amounts at the remaining time points
+        are NaN.
+
+        Parameters
+        ----------
+        param_values : vector-like or dictionary, optional
+            Values to use for every parameter in the model, in the order of
+            model.parameters, or a dict of values for some parameters by name.
+            If not specified, the values are taken from model.parameters.
+        y0 : vector-like, optional
+            Initial amounts of all species, in the order of model.species. If
+            not specified, they are taken from the initial conditions of the
+            model (using the values in `param_values`).
+        stop : callable, optional
+            Called as ``stop(i, y)`` with the index of each time point in
+            tspan after the first and the species amounts at that time (a view
+            on ``self.y[i]``), as soon as they are computed; the integration
+            stops if it returns True. This lets a caller abandon a simulation
+            whose results are already known to be of no use.
+        """
+        param_values = self.network.param_vector(param_values)
+        if y0 is None:
+            y0 = self.network.initial_values(param_values)
+        else:
+            y0 = np.array(y0, dtype=float)
+            if y0.shape != (self.network.n_species,):
+                raise ValueError("y0 must be the same length as model.species")
+        k = self.network.rate_constants(param_values)
+        stopped = []
+        if stop is not None:
+            def stop(i, y, stop=stop):
+                if stop(i, y):
+                    stopped.append(i)
+                    return True
+                return False
+        if self.system is None:
+            args = (k,)
+        else:
+            # Integrate the independent species, and pass the full amounts to
+            # the stop function
+            laws = self.system.laws
+            totals = laws.totals(y0)
+            args = (k, totals)
+            y0 = y0[laws.independent]
+            if stop is not None:
+                def stop(i, y, stop=stop):
+                    self.y[i] = laws.full(y, totals)
+                    return stop(i, self.y[i])
+
+        start = default_timer()
+        if self.dense_output:
+            self._run_dense(y0, args, stop)
+        elif self.integrator is None:
+            self._run_bdf(y0, args, stop)
+        else:
+            self.integrator.set_initial_value(y0, self.tspan[0])
+            self.integrator.set_f_params(*args)
+            self.integrator.set_jac_params(*args)
+            self._y[0] = y0
+            i = 1
+            while (self.integrator.successful() and
+                   self.integrator.t < self.tspan[-1]):
+                self._y[i] = self.integrator.integrate(self.tspan[i])
+                i += 1
+                if (stop is not None and self.integrator.successful() and
+                        stop(i - 1, self._y[i - 1])):
+                    break
+            if self.integrator.t < self.tspan[-1]:
+                self._y[i:, :] = np.nan
+        self._update_stats(default_timer() - start, bool(stopped))
+
+        if self.system is not None:
+            self.y[:] = laws.full(self._y, totals)
+            if self.solution is not None:
+                tangent = self.system.tangent
+                self.solution = DenseSolution(
+                    self.solution.t, laws.full(self.solution.y, totals),
+                    np.dot(self.solution.ydot, tangent.T))
+        self.yobs_view[:] = self.network.observables(self.y)
+
+    def _update_stats(self, seconds, stopped):
+        stats = self.stats
+        stats.add_time('integrate', seconds)
+        stats.count('runs')
+        if self.integrator is not None:
+            # Counters of ODEPACK (NST, NFE and NJE), which restart with
+            # every integration
+            iwork = self.integrator._integrator.iwork
+            steps, n_rhs, n_jacobian = iwork[10], iwork[11], iwork[12]
+        else:
+            steps = self._bdf_steps
+            n_rhs, n_jacobian = self._bdf_method.nfev, self._bdf_method.njev
+        stats.count('steps', int(steps))
+        stats.count('rhs', int(n_rhs))
+        stats.count('jacobian', int(n_jacobian))
+        if stopped:
+            stats.count('stopped')
+        elif np.isnan(self._y[-1]).any():
+            stats.count('failures')
+
+    def _bdf(self, y0, args):
+        functions = self._functions
+        jac = None
+        if self.use_jacobian:
+            jac = lambda t, y: functions.jacobian(t, y, *args)
+        self._bdf_steps = 0
+        self._bdf_method = scipy.integrate.BDF(
+            lambda t, y: functions.rhs(t, y, *args), self.tspan[0], y0,
+            self.tspan[-1], jac=jac, rtol=self.rtol, atol=self.atol,
+            **self.opts)
+        return self._bdf_method
+
+    def _run_bdf(self, y0, args, stop):
+        # Step the solve_ivp BDF method directly (as solve_ivp itself does)
+        # so that the results at each time point are available as soon as
+        # they are passed
+        bdf = self._bdf(y0, args)
+        self._y[0] = y0
+        i = 1
+        stopped = False
+        while i < len(self.tspan) and not stopped:
+            self._bdf_steps += 1
+            if bdf.step() is not None:
+                break
+            n = np.searchsorted(self.tspan, bdf.t, side='right')
+            if n > i:
+                sol = bdf.dense_output()
+                self._y[i:n] = sol(self.tspan[i:n]).T
+                for j in range(i, n):
+                    if stop is not None and stop(j, self._y[j]):
+                        i = j + 1
+                        stopped = True
+                        break
+                else:
+                    i = n
+            if bdf.status != 'running':
+                break
+        self._y[i:] = np.nan
+
+    def _run_dense(self, y0, args, stop):
+        tspan = self.tspan
+        if self.integrator is None:
+            bdf = self._bdf(y0, args)
+            def step():
+                self._bdf_steps += 1
+                return bdf.step() is None, bdf.t, bdf.y.copy()
+        else:
+            integrator = self.integrator
+            integrator.set_initial_value(y0, tspan[0])
+            integrator.set_f_params(*args)
+            integrator.set_jac_params(*args)
+            def step():
+                # One internal step, which may overshoot the final time
+                y = integrator.integrate(tspan[-1], step=True)
+                return integrator.successful(), integrator.t, y.copy()
+        ts, ys = [tspan[0]], [y0]
+        self._y[0] = y0
+        i = 1
+        stopped = False
+        while ts[-1] < tspan[-1] and not stopped:
+            success, t, y = step()
+            if not success:
+                break
+            ts.append(t)
+            ys.append(y)
+            if stop is None or len(ts) < 3:
+                continue
+            # The slopes at both ends of the interval before the previous
+            # step only depend on the steps up to the last one, so the time
+            # points in it can be passed to the stop function already
+            n = np.searchsorted(tspan, ts[-2], side='right')
+            if n > i:
+                first = max(len(ts) - 4, 0)
+                local = DenseSolution(ts[first:], ys[first:])
+                self._y[i:n] = local(tspan[i:n])
+                i, stopped = self._stop(stop, i, n)
+        if len(ts) > 1 and ts[-1] > tspan[-1]:
+            # End the interpolant at the final time
+            ys[-1] = DenseSolution(ts, ys)(tspan[-1])
+            ts[-1] = tspan[-1]
+        self.solution = DenseSolution(ts, ys) if len(ts) > 1 else None
+        if not stopped and len(ts) > 1:
+            n = np.searchsorted(tspan, ts[-1], side='right')
+            if n > i:
+                self._y[i:n] = self.solution(tspan[i:n])
+                i, stopped = self._stop(stop, i, n)
+        self._y[i:] = np.nan
+
+    def _stop(self, stop, i, n):
+        """Call the stop function on the time points i to n - 1, returning the
+        index of the first time point after the last one it saw and whether it
+        asked to stop."""
+        if stop is not None:
+            for j in range(i, n):
+                if stop(j, self._y[j]):
+                    return j + 1, True
+        return n, False
+
+    def dense(self, t):
+        """Evaluate the species amounts of the last run at any times.
+
+        Requires `dense_output`. Returns an array with shape
+        ``(len(t), n_species)``, or ``(n_species,)`` for a scalar t.
+        """
+        if self.solution is None:
+            raise ValueError("dense output is only available after a run "
+                             "with dense_output=True")
+        return self.solution(t)
+
+class DenseSolution(object):
+    """Piecewise cubic Hermite interpolant of ODE trajectories.
+
+    Parameters
+    ----------
+    t : vector-like
+        Increasing times of the steps of the integrator.
+    y : array-like
+        Species amounts at those times, with one row per time.
+    ydot : array-like, optional
+        Slopes of the interpolant at those times. By default, they are the
+        second-order finite-difference estimates of :py:func:`numpy.gradient`
+        (the right-hand side of stiff ODEs is too sensitive to the errors in
+        the amounts to give good slopes).
+
+    Calling the object with a time or a vector of times returns the
+    interpolated species amounts, with the same shapes as for
+    :py:meth:`Solver.dense`. The interpolant is continuous with a continuous
+    derivative.
+
+    Attributes
+    ----------
+    t, y, ydot : numpy.ndarray
+        The nodes of the interpolant. Passing ``(t, y[:, i], ydot[:, i])`` to
+        :py:func:`earm.features.timing` finds the crossing times of species i
+        on the interpolant itself.
+    """
+
+    def __init__(self, t, y, ydot=None):
+        self.t = np.asarray(t, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        if ydot is None:
+            edge_order = 2 if len(self.t) > 2 else 1
+            ydot = np.gradient(self.y, self.t, axis=0, edge_order=edge_order)
+        self.ydot = np.asarray(ydot, dtype=float)
+
+    def __call__(self, t):
+        scalar = np.ndim(t) == 0
+        t = np.atleast_1d(np.asarray(t, dtype=float))
+        # Index of the interval of each time, the last one including its end
+        i = np.clip(np.searchsorted(self.t, t, side='right') - 1, 0,
+                    len(self.t) - 2)
+        h = (self.t[i + 1] - self.t[i])[:, None]
+        s = (t[:, None] - self.t[i][:, None]) / h
+        y = ((2 * s ** 3 - 3 * s ** 2 + 1) * self.y[i] +
+             (s ** 3 - 2 * s ** 2 + s) * h * self.ydot[i] +
+             (-2 * s ** 3 + 3 * s ** 2) * self.y[i + 1] +
+             (s ** 3 - s ** 2) * h * self.ydot[i + 1])
+        return y[0] if scalar else y
+
+class _BlockBDF(scipy.integrate.BDF):
+    """The BDF method for a system whose Jacobian is block diagonal with
+    identical square blocks of size `block_size`.
+
+    The Newton matrix is factored through its first block only, and the
+    linear systems of all blocks are solved together as one system with
+    several right-hand sides.
+    """
+
+    def __init__(self, fun, t0, y0, t_bound, block_size, **options):
+        super(_BlockBDF, self).__init__(fun, t0, y0, t_bound, **options)
+        n = block_size
+
+        def lu(A):
+            self.nlu += 1
+            return scipy.sparse.linalg.splu(A[:n, :n].tocsc())
+
+        def solve_lu(LU, b):
+            return LU.solve(b.reshape(-1, n).T).T.ravel()
+
+        self.lu = lu
+        self.solve_lu = solve_lu
+
+class SensitivitySolver(object):
+    """An ODE solver that also computes parameter sensitivities.
+
+    The sensitivities ``S = dy/dp`` of the species amounts with respect to
+    the selected parameters obey the forward sensitivity equations
+
+        dS/dt = J(y) S + df/dp,    S(t0) = dy0/dp
+
+    where J is the Jacobian of the ODEs and ``df/dp = N diag(m(y)) dk/dp``
+    (N is the stoichiometry matrix, m the product of the reactant amounts of
+    each reaction and k the rate constants). They are integrated together
+    with the ODEs by the BDF method of :py:func:`scipy.integrate.solve_ivp`,
+    whose Newton iterations use the block diagonal matrix with one copy of J
+    per column of S (the exact Jacobian of the combined system, except for
+    the terms coupling S to y), so that only one block needs to be factored.
+
+    Parameters
+    ----------
+    model : pysb.core.Model or earm.network.Network
+        The model to integrate.
+    tspan : vector-like
+        Time values at which the results are returned. The first value is the
+        initial time.
+    parameters : list, optional
+        The parameters to compute sensitivities for, as pysb Parameter
+        objects, names or indices. By default, the rate parameters
+        (``model.parameters_rules()``).
+    log : bool, optional
+        If True, compute the sensitivities with respect to the base 10
+        logarithm of the parameters, ``dy/dlog10(p) = ln(10) * p * dy/dp``.
+    rtol, atol : float, optional
+        Relative and absolute integration tolerances (for the sensitivities
+        as well as for the species).
+
+    Attributes
+    ----------
+    network : earm.network.Network
+        The network of the model.
+    param_indices : numpy.ndarray
+        Indices of the selected parameters in model.parameters.
+    y : numpy.ndarray
+        Species trajectories, with shape ``(len(tspan), n_species)``.
+    yobs : numpy.ndarray
+        Observable trajectories, with shape ``(len(tspan), n_observables)``.
+    sens : numpy.ndarray
+        Sensitivities of the species, with shape
+        ``(len(tspan), n_species, n_selected_parameters)``.
+    obs_sens : numpy.ndarray
+        Sensitivities of the observables, with shape
+        ``(len(tspan), n_observables, n_selected_parameters)``.
+    """
+
+    def __init__(self, model, tspan, parameters=None, log=False, rtol=1e-6,
+                 atol=1e-6):
+        self.network = Network.of(model)
+        self.model = self.network.model
+        self.tspan = np.asarray(tspan, dtype=float)
+        self.rtol = rtol
+        self.atol = atol
+        self.log = log
+        if parameters is None:
+            parameters = self.model.parameters_rules()
+        indices = []
+        for p in parameters:
+            if not isinstance(p, (int, np.integer)):
+                p = self.network.parameter_names.index(getattr(p, 'name', p))
+            indices.append(p)
+        self.param_indices = np.array(indices, dtype=int)
+
+        network = self.network
+        n, n_params = network.n_species, len(self.param_indices)
+        # Reactant indices padded with an index to a constant 1, to compute
+        # the products of the reactant amounts of all reactions at once
+        order = max([len(r) for r in network.reactants] + [0])
+        self._reactants = np.full((network.n_reactions, order), n)
+        for j, reactants in enumerate(network.reactants):
+            self._reactants[j, :len(reactants)] = reactants
+        # Sparsity pattern of the block diagonal Newton matrix
+        blocks = np.arange(n_params + 1)[:, None]
+        self._jac_indices = (network.jac_indices + blocks * n).ravel()
+        self._jac_indptr = np.append(
+            (network.jac_indptr[:-1] + blocks * network.jac_nnz).ravel(),
+            (n_params + 1) * network.jac_nnz)
+        self.y = None
+        self.yobs = None
+        self.sens = None
+        self.obs_sens = None
+        self.solution = None
+
+    def run(self, param_values=None):
+        """Integrate the ODEs and the sensitivity equations.
+
+        Parameters
+        ----------
+        param_values : vector-like or dictionary, optional
+            Parameter values, as for :py:meth:`Solver.run`.
+        """
+        network = self.network
+        n, n_params = network.n_species, len(self.param_indices)
+        p = network.param_vector(param_values)
+        k = network.rate_constants(p)
+        dk = network.rate_constants_jacobian(p)[:, self.param_indices]
+        s0 = np.zeros((n_params, n))
+        for si, pi in network.initial_conditions:
+            s0[self.param_indices == pi, si] = 1
+        if self.log:
+            scale = np.log(10) * p[self.param_indices]
+            dk = dk * scale
+            s0 *= scale[:, None]
+        stoichiometry = scipy.sparse.csr_matrix(network.stoichiometry)
+        reactants = self._reactants
+        dk_rows, dk_cols = np.nonzero(dk)
+        dk_values = dk[dk_rows, dk_cols]
+
+        def rhs(t, z):
+            y = z[:n]
+            st = z[n:].reshape(n_params, n)
+            # df/dp = N diag(m) dk/dp, with the sparsity of dk/dp
+            m = np.prod(np.append(y, 1)[reactants], axis=1)
+            dfdp = np.zeros(dk.shape)
+            dfdp[dk_rows, dk_cols] = m[dk_rows] * dk_values
+            sdot = (network.jacobian(t, y, k).dot(st.T) +
+                    stoichiometry.dot(dfdp))
+            return np.concatenate((network.rhs(t, y, k), sdot.T.ravel()))
+
+        def jac(t, z):
+            data = np.tile(network.jacobian_data(t, z[:n], k), n_params + 1)
+            size = n * (n_params + 1)
+            return scipy.sparse.csc_matrix(
+                (data, self._jac_indices, self._jac_indptr),
+                shape=(size, size))
+
+        z0 = np.concatenate((network.initial_values(p), s0.ravel()))
+        result = scipy.integrate.solve_ivp(
+            rhs, (self.tspan[0], self.tspan[-1]), z0, method=_BlockBDF,
+            t_eval=self.tspan, jac=jac, rtol=self.rtol, atol=self.atol,
+            dense_output=True, block_size=n)
+        z = np.full((len(self.tspan), len(z0)), np.nan)
+        z[:result.y.shape[1]] = result.y.T
+        self.solution = result.sol
+        self.y = z[:, :n]
+        self.yobs = network.observables(self.y)
+        self.sens = z[:, n:].reshape(-1, n_params, n).transpose(0, 2, 1)
+        self.obs_sens = np.einsum('on,tnp->top', network.observables_matrix,
+                                  self.sens)
+
+    def dense(self, t):
+        """Evaluate the species amounts and sensitivities at any time.
+
+        Uses the interpolant of the last run, and returns the pair
+        ``(y, sens)`` with shapes ``(n_species,)`` and
+        ``(n_species, n_selected_parameters)``.
+        """
+        n = self.network.n_species
+        z = self.solution(t)
+        return z[:n], z[n:].reshape(-1, n).T
+
+def odesolve(model, tspan, param_values=None, y0=None, **kwargs):
+    """Integrate a model's ODEs over a given timespan.
+
+    Convenience function that builds a :py:class:`Solver`, runs it and returns
+    the ``yobs`` record array of observable trajectories, like
+    :py:func:`pysb.integrate.odesolve`. Keyword arguments are passed to the
+    Solver constructor.
+    """
+    solver = Solver(model, tspan, **kwargs)
+    solver.run(param_values, y0)
+    return solver.yobs
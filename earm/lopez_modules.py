@@ -71,6 +71,14 @@ from pysb.util import alias_model_components
 
 activation_rates = [        1e-7, 1e-3, 1] 
 
+# Default number of subunits of the largest Bax and Bak pores, the ones that
+# transport Cyto c and Smac. Each additional subunit adds one species per pore
+# to the reaction network, but the time BioNetGen takes to generate it grows
+# faster (about 35 s for pores of 20 subunits); see
+# :py:func:`earm.models.build` for models with larger pores.
+
+default_pore_max_size = 4
+
 # Shared functions
 # ================
 
@@ -241,13 +249,19 @@ def effectors_bind_anti_apoptotics():
                 [Bak(active_monomer),        None,       50e-9*N_A*V,  10e-9*N_A*V]],
                kf=1e6/(N_A*V))
 
-def lopez_pore_formation(do_pore_transport=True):
+def lopez_pore_formation(do_pore_transport=True, pore_max_size=None):
     """ Pore formation and transport process used by all modules.
+
+    Bax and Bak pores grow one subunit at a time up to `pore_max_size`
+    subunits (by default, :py:data:`default_pore_max_size`), and the pores of
+    that size transport Cyto c and Smac.
     """
     alias_model_components()
 
+    if pore_max_size is None:
+        pore_max_size = default_pore_max_size
+
     # Rates
-    pore_max_size = 4
     pore_rates = [[2.040816e-04,  # 1.0e-6/v**2
                    1e-3]] * (pore_max_size - 1)
     pore_transport_rates = [[2.857143e-5, 1e-3, 10]] # 2e-6 / v?
@@ -258,19 +272,21 @@ def lopez_pore_formation(do_pore_transport=True):
 
     # CytoC, Smac release
     if do_pore_transport:
-        pore_transport(Bax(bf=None, state='A'), 4, CytoC(state='M'),
-                       CytoC(state='C'), pore_transport_rates)
-        pore_transport(Bax(bf=None, state='A'), 4, Smac(state='M'),
-                       Smac(state='C'), pore_transport_rates)
-        pore_transport(Bak(bf=None, state='A'), 4, CytoC(state='M'),
-                       CytoC(state='C'), pore_transport_rates)
-        pore_transport(Bak(bf=None, state='A'), 4, Smac(state='M'),
-                       Smac(state='C'), pore_transport_rates)
+        pore_transport(Bax(bf=None, state='A'), pore_max_size,
+                       CytoC(state='M'), CytoC(state='C'),
+                       pore_transport_rates)
+        pore_transport(Bax(bf=None, state='A'), pore_max_size,
+                       Smac(state='M'), Smac(state='C'), pore_transport_rates)
+        pore_transport(Bak(bf=None, state='A'), pore_max_size,
+                       CytoC(state='M'), CytoC(state='C'),
+                       pore_transport_rates)
+        pore_transport(Bak(bf=None, state='A'), pore_max_size,
+                       Smac(state='M'), Smac(state='C'), pore_transport_rates)
 
 # MOMP model implementations
 # ==========================
 
-def embedded(do_pore_transport=True):
+def embedded(do_pore_transport=True, pore_max_size=None):
     """ Direct and indirect modes of action, occurring at the membrane.
     """
     alias_model_components()
@@ -299,9 +315,10 @@ def embedded(do_pore_transport=True):
     sensitizers_bind_anti_apoptotics()
 
     # Bax and Bak form pores by sequential addition and transport CytoC/Smac
-    lopez_pore_formation(do_pore_transport=do_pore_transport)
+    lopez_pore_formation(do_pore_transport=do_pore_transport,
+                         pore_max_size=pore_max_size)
 
-def indirect(do_pore_transport=True):
+def indirect(do_pore_transport=True, pore_max_size=None):
     """Bax and Bak spontaneously form pores without activation.
        The "activator" tBid binds all of the anti-apoptotics.
     """
@@ -328,9 +345,10 @@ def indirect(do_pore_transport=True):
     sensitizers_bind_anti_apoptotics()
 
     # Bax and Bak form pores by sequential addition
-    lopez_pore_formation(do_pore_transport=do_pore_transport)
+    lopez_pore_formation(do_pore_transport=do_pore_transport,
+                         pore_max_size=pore_max_size)
 
-def direct(do_pore_transport=True):
+def direct(do_pore_transport=True, pore_max_size=None):
     """Anti-apoptotics prevent BH3-onlies from activating Bax and Bak.
 
     Bax and Bak require activation to be able to form pores.
@@ -353,4 +371,5 @@ def direct(do_pore_transport=True):
     sensitizers_bind_anti_apoptotics()
 
     # Bax and Bak form pores by sequential addition
-    lopez_pore_formation(do_pore_transport=do_pore_transport)
+    lopez_pore_formation(do_pore_transport=do_pore_transport,
+                         pore_max_size=pore_max_size)
@@ -5,7 +5,8 @@ Model M9b: MOMP model from [Chen2007biophysj]_.
 from pysb import *
 from earm import shen_modules
 from pysb.integrate import odesolve
-from pylab import linspace, plot, figure, ion, legend
+from pylab import linspace, plot, figure, ion, legend, xlabel, ylabel
+import numpy as np
 from pysb.bng import generate_equations
 import re
 
@@ -39,34 +40,66 @@ def simulate(f2=0.5, tmax=3000):
     legend()
     return x
 
-def bistability_analysis():
-    f2_range = linspace(0, 0.4, 41)
-    t = linspace(0, 50000, 1000)
-    ion()
-    ss_aBax_vals_up = []
-    ss_aBax_vals_down = []
+def bistability_analysis(f2_max=0.4):
+    """Plot the steady-state active Bax against the amount of tBid.
 
-    for f2 in f2_range:
-        model.parameters['Bid_0'].value = f2 * 1e-1
-        bax_total = 2e-1
+    The steady states are followed by continuation in ``Bid_0`` (see
+    :py:func:`earm.steady_state.continuation`) from 0 to ``f2_max`` times
+    the amount of Bcl2, and plotted as the fraction of Bax that is active
+    against ``f2 = Bid_0 / Bcl2_0``: stable branches as solid lines,
+    unstable ones as dashed lines and fold points as dots. A hysteresis loop
+    would appear as two stable branches that overlap in f2, joined through
+    their fold points by an unstable branch.
 
-        # Do "up" portion of hysteresis plot
-        model.parameters['aBax_0'].value = 0
-        model.parameters['cBax_0'].value = bax_total
-        x = odesolve(model, t)
-        figure('up')
-        plot(t, x['aBax_']/bax_total)
-        ss_aBax_vals_up.append(x['aBax_'][-1]/bax_total)
+    The analysis is done on a new instance of the model (see
+    :py:func:`earm.models.build`), to which an initial condition for tBid is
+    added, as in the tests of the model. With the published parameters Bax
+    oligomerization is irreversible (``k10 = 0``): at ``Bid_0 = 0`` any
+    split of Bax between the inactive monomers and the pores is a steady
+    state, and for any amount of tBid all of the Bax ends up in pores, so
+    the steady states do not form a curve that can be followed. Pore
+    assembly is therefore turned off, which gives the variant of the model
+    without Bax oligomerization; with the published rates for Bax
+    activation and for binding to Bcl2 its curve is a single stable branch,
+    without folds.
 
-        # Do "down" portion of hysteresis plot
-        model.parameters['aBax_0'].value = bax_total
-        model.parameters['cBax_0'].value = 0
-        x = odesolve(model, t)
-        figure('down')
-        plot(t, x['aBax_']/bax_total)
-        ss_aBax_vals_down.append(x['aBax_'][-1]/bax_total)
+    Returns
+    -------
+    scipy.optimize.OptimizeResult
+        The result of the continuation.
+    """
+    from earm import models
+    from earm.network import Network
+    from earm.steady_state import ConservationLaws, continuation
 
-    figure()
-    plot(f2_range, ss_aBax_vals_up, 'r')
-    plot(f2_range, ss_aBax_vals_down, 'g')
+    model = models.build('mito.chen_biophys_j')
+    Bid_0 = Parameter('Bid_0', 0, _export=False)
+    model.add_component(Bid_0)
+    model.initial(model.monomers['Bid'](state='T', bf=None), Bid_0)
+    param_values = {'Bid_0': 0, 'spontaneous_pore_BaxA_to_Bax4_kf': 0}
+    bcl2_total = model.parameters['Bcl2_0'].value
+    bax_total = model.parameters['Bax_0'].value
+    network = Network(model)
+    # Leave out the pore formation reactions from the conservation laws (so
+    # that Bax4 is conserved on its own)
+    laws = ConservationLaws(network, network.rate_constants(
+        network.param_vector(param_values)))
+    result = continuation(network, 'Bid_0', f2_max * bcl2_total,
+                          param_values=param_values, laws=laws)
 
+    aBax = model.observables['aBax_']
+    f2 = result.p / bcl2_total
+    aBax_frac = np.dot(result.y[:, list(aBax.species)], aBax.coefficients)
+    aBax_frac /= bax_total
+    ion()
+    figure()
+    # Split the curve where the stability changes, sharing the end points
+    breaks = np.flatnonzero(np.diff(result.stable.astype(int))) + 1
+    for run in np.split(np.arange(len(f2)), breaks):
+        run = np.arange(max(run[0] - 1, 0), run[-1] + 1)
+        plot(f2[run], aBax_frac[run],
+             'r-' if result.stable[run[-1]] else 'r--')
+    plot(f2[result.folds], aBax_frac[result.folds], 'ko')
+    xlabel('f2 = Bid_0 / Bcl2_0')
+    ylabel('Active Bax (fraction of Bax_0)')
+    return result
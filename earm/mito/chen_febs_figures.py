@@ -1,15 +1,20 @@
 """Figure from [Chen2007febs]_."""
 
 from pysb import *
-from pysb.integrate import odesolve
-from pysb.bng import generate_equations
 from pylab import linspace, plot, figure, ion, legend, ylim
-import re
+from scipy.constants import N_A
 
-from earm.mito.chen_2007_febs_indirect import model as indirect
-from earm.mito.chen_2007_febs_direct import model as direct
+from earm import models
+from earm.shared import V
+from earm.steady_state import dose_response
 
-def figure_2a():
+def _add_initial(model, name, pattern):
+    """Add an initial condition with a parameter of the given name."""
+    parameter = Parameter(name, 0, _export=False)
+    model.add_component(parameter)
+    model.initial(pattern, parameter)
+
+def figure_2a(method='newton'):
     """Reproduce the dose-response in Figure 2a of [Chen2007febs]_.
 
     Despite the fact that the PySB versions of the two models exactly reproduce
@@ -25,31 +30,43 @@ def figure_2a():
     structure have been verified to be identical. There appears to be a
     discrepancy in the way that the dose-response curves are calculated,
     possibly in the timepoint used for sampling the steady-state value.
+
+    The steady states are computed by :py:func:`earm.steady_state.dose_response`
+    with the given `method` (``'newton'`` or ``'integrate'``), each stimulus
+    level starting from the steady state of the previous one. Since the
+    models have no tBid or Bad, initial conditions for them are added (as in
+    the tests of the models) to new instances of the models (see
+    :py:func:`earm.models.build`); the amounts are in nM, as in the paper.
     """
 
+    nM = 1e-9 * N_A * V
+    direct = models.build('mito.chen_febs_direct')
+    indirect = models.build('mito.chen_febs_indirect')
+    _add_initial(direct, 'Bid_0', direct.monomers['Bid'](state='T', bf=None))
+    _add_initial(direct, 'Bad_0',
+                 direct.monomers['Bad'](state='M', bf=None, serine='U'))
+    _add_initial(indirect, 'Bid_0',
+                 indirect.monomers['Bid'](state='T', bf=None))
+
     f_range = linspace(0, 20, 50)
-    t = linspace(0, 50000, 1000)
     ion()
     figure()
 
     for model in [direct, indirect]:
-        ss_Bax4_vals = []
+        if model is direct:
+            def dose_params(f):
+                return {'Bid_0': (1 + f * 1) * nM, 'Bad_0': (2 + f * 2) * nM}
+        else:
+            def dose_params(f):
+                return {'Bid_0': (3 + f * 3) * nM}
+        result = dose_response(model, f_range, dose_params, method=method)
 
-        for f in f_range:
-            if model is direct:
-                model.parameters['Bid_0'].value = 1 + (f * 1)
-                model.parameters['Bad_0'].value = 2 + (f * 2)
-            else:
-                model.parameters['Bid_0'].value = 3 + (f * 3)
-
-            # Calculate the fraction of oligomerized Bax
-            x = odesolve(model, t)
-            Bax_frac = (4*x['Bax4_'])/model.parameters['Bax_0'].value
-            ss_Bax4_val = Bax_frac[-1]
-            ss_Bax4_vals.append(ss_Bax4_val)
+        # Calculate the fraction of oligomerized Bax
+        Bax4 = model.observables['Bax4_']
+        ss_Bax4_vals = (4 * result.y[:, list(Bax4.species)].dot(
+            Bax4.coefficients) / model.parameters['Bax_0'].value)
 
         plot(f_range, ss_Bax4_vals, label='DM' if model is direct else 'IM')
         ylim([0.75, 1])
 
     legend(loc='lower right')
-
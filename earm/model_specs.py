@@ -1,42 +1,152 @@
-from pysb.bng import generate_equations
-from pysb import *
-
-models = ['lopez_embedded', 'lopez_direct', 'lopez_indirect',
-          'albeck_11b', 'albeck_11c', 'albeck_11d', 'albeck_11e', 'albeck_11f',
-          'chen_biophys_j', 'chen_febs_direct', 'chen_febs_indirect',
-          'cui_direct', 'cui_direct1', 'cui_direct2',
-          'howells']
-
-# Mito only
-print('%-24s %11s %10s %12s %11s %10s %12s' %
-        ('Model', 'Mito Rules', 'Mito ODEs', 'Mito Params',
-         'Full Rules', 'Full ODEs', 'Full Params'))
-
-for model in models:
-    exec('import earm.mito.%s' % model)
-    exec('import earm.%s' % model)
-    exec('m_mito = earm.mito.%s.model' % model)
-    exec('m_full = earm.%s.model' % model)
-
-    # Add tBid initial condition to mito only model
-    Bid = m_mito.all_components()['Bid']
+"""
+Inventory of the size and build cost of all the models.
+
+For each model, lists the number of rules, species, reactions, ODEs and
+parameters of its network, and the time taken to obtain the network. The
+networks are generated in parallel worker processes, one model at a time per
+process, and through the network cache (:py:mod:`earm.netcache`), so a model
+whose network is already cached is only parsed; the ``cached`` column tells
+which ones were, and ``time`` is then the time taken to restore the network
+rather than the time BioNetGen takes to generate it.
+
+Run as a script, it prints a table, or with ``--format json`` or ``--format
+csv`` a machine-readable report suitable for tracking the models over time::
+
+    python -m earm.model_specs --format csv --output specs.csv
+
+The MOMP-only models are given an initial amount of tBid (and of Bad for the
+models that have Bad but no initial condition for it), without which most of
+their rules could not fire and their networks would be truncated.
+"""
+
+import csv
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+
+from pysb import Parameter
+from earm import models
+from earm.netcache import generate_equations, is_cached
+
+fields = ['model', 'rules', 'species', 'reactions', 'odes', 'parameters',
+          'time', 'cached']
+"""Names of the items of the specs of a model, in the order of the report."""
+
+# MOMP-only models which have Bad but no initial condition for it
+_bad_models = ['mito.chen_febs_direct', 'mito.howells']
+
+def _seed(model, name, monomer, site_conditions):
+    """Add an initial condition of one molecule for a monomer, unless it has
+    one already."""
+    m = model.all_components()[monomer]
+    p = Parameter(name, 1, _export=False)
     try:
-        p = Parameter('tBid_0', 1, _export=False)
-        m_mito.initial(Bid(state='T', bf=None), p)
-        m_mito.add_component(p)
+        model.initial(m(**site_conditions), p)
     except Exception:
-        pass # Duplicate initial condition for tBid
+        return # Duplicate initial condition
+    model.add_component(p)
+
+def build(name):
+    """Build a private instance of the named model, ready for its network
+    to be generated."""
+    model = models.build(name)
+    if name in models.mito_names:
+        _seed(model, 'tBid_0', 'Bid', dict(state='T', bf=None))
+        if name in _bad_models:
+            _seed(model, 'mBad_0', 'Bad',
+                  dict(state='M', bf=None, serine='U'))
+    return model
+
+def model_specs(name):
+    """Return the specs of the named model, as a dict with the keys in
+    :py:data:`fields`."""
+    model = build(name)
+    cached = is_cached(model)
+    start = time.time()
+    generate_equations(model)
+    return {'model': name, 'rules': len(model.rules),
+            'species': len(model.species), 'reactions': len(model.reactions),
+            'odes': len(model.odes), 'parameters': len(model.parameters),
+            'time': time.time() - start, 'cached': cached}
+
+def all_specs(names=None, processes=None):
+    """Return the specs of several models.
+
+    Parameters
+    ----------
+    names : list of strings, optional
+        Names of the models; by default, all of :py:data:`earm.models.names`.
+    processes : int, optional
+        Number of worker processes. None for the number of CPUs.
+
+    Returns
+    -------
+    list of dicts
+        The specs of the models (see :py:func:`model_specs`), in the order of
+        `names`.
+    """
+    if names is None:
+        names = models.names
+    if processes == 1:
+        return [model_specs(name) for name in names]
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(model_specs, names, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+def write_table(specs, f):
+    """Write specs as a fixed-width table."""
+    f.write('%-24s %6s %8s %10s %6s %11s %9s %7s\n' %
+            ('Model', 'Rules', 'Species', 'Reactions', 'ODEs', 'Parameters',
+             'Time (s)', 'Cached'))
+    for s in specs:
+        f.write('%-24s %6d %8d %10d %6d %11d %9.2f %7s\n' %
+                (s['model'], s['rules'], s['species'], s['reactions'],
+                 s['odes'], s['parameters'], s['time'],
+                 'yes' if s['cached'] else 'no'))
+
+def write_json(specs, f):
+    """Write specs as a JSON list of objects."""
+    json.dump([dict((k, s[k]) for k in fields) for s in specs], f, indent=2,
+              sort_keys=True)
+    f.write('\n')
+
+def write_csv(specs, f):
+    """Write specs as CSV, with a header row of :py:data:`fields`."""
+    writer = csv.DictWriter(f, fields, lineterminator='\n')
+    writer.writeheader()
+    for s in specs:
+        writer.writerow(s)
+
+_writers = {'table': write_table, 'json': write_json, 'csv': write_csv}
 
-    if model in ['chen_2007_febs_direct', 'howells']:
-        Bad = m_mito.all_components()['Bad']
-        p = Parameter('mBad_0', 1, _export=False)
-        m_mito.initial(Bad(state='M', bf=None, serine='U'), p)
-        m_mito.add_component(p)
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Report the size and build cost of the EARM models.")
+    parser.add_argument('names', nargs='*', metavar='model',
+                        help="names of the models (default: all)")
+    parser.add_argument('-f', '--format', choices=sorted(_writers),
+                        default='table', help="output format")
+    parser.add_argument('-o', '--output', help="output file (default: "
+                        "standard output)")
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help="number of worker processes (default: number "
+                        "of CPUs)")
+    args = parser.parse_args(argv)
+    for name in args.names:
+        if name not in models.names:
+            parser.error("unknown model '%s'" % name)
 
-    generate_equations(m_mito)
-    generate_equations(m_full)
-    print("%-24s %11d %10d %12d %11d %10d %12d" %
-            (model, len(m_mito.rules), len(m_mito.odes), len(m_mito.parameters),
-             len(m_full.rules), len(m_full.odes), len(m_full.parameters)))
+    specs = all_specs(args.names or None, args.processes)
+    if args.output:
+        with open(args.output, 'w') as f:
+            _writers[args.format](specs, f)
+    else:
+        _writers[args.format](specs, sys.stdout)
 
-# Full models
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""
+Registry of the models in EARM.
+
+Each model module (e.g. :py:mod:`earm.lopez_embedded` or
+:py:mod:`earm.mito.howells`) builds its model as a side effect of being
+imported. This module gives access to all of the models by name, building
+each one only when it is first requested, so that code which only needs one
+variant does not pay for constructing the others::
+
+    from earm import models
+    model = models.get('mito.lopez_embedded')
+
+Models are named after their module, relative to the ``earm`` package: the
+full extrinsic apoptosis models are listed in :py:data:`full_names`, the
+MOMP-only models in :py:data:`mito_names`, and all 30 of them in
+:py:data:`names`.
+
+:py:func:`get` returns a single cached instance of each model per process,
+which is shared by every caller. Components and initial conditions cannot be
+added to it (``add_component`` and ``initial`` raise a TypeError); the
+values of its parameters can still be assigned, and must not be. Code that
+needs to modify a model (for example to add initial conditions, as the tests
+do) should call :py:func:`build` to obtain a private instance instead. In
+both cases the model is built independently of the module-level ``model``
+object of the corresponding model module.
+
+The Bax and Bak pores of the models in :py:data:`lopez_names` transport Cyto c
+and Smac once they have 4 subunits; :py:func:`build` can make variants with
+larger pores, e.g. ``models.build('lopez_embedded', pore_max_size=16)``.
+"""
+
+import os
+import types
+import importlib
+import threading
+import warnings
+
+from pysb.core import Model, SelfExporter, ModelExistsWarning, \
+    SymbolExistsWarning
+
+full_names = ['lopez_embedded', 'lopez_direct', 'lopez_indirect',
+              'albeck_11b', 'albeck_11c', 'albeck_11d', 'albeck_11e',
+              'albeck_11f',
+              'chen_biophys_j', 'chen_febs_direct', 'chen_febs_indirect',
+              'cui_direct', 'cui_direct1', 'cui_direct2',
+              'howells']
+"""Names of the full extrinsic apoptosis models (M1a-M15a)."""
+
+mito_names = ['mito.%s' % name for name in full_names]
+"""Names of the MOMP-only models (M1b-M15b)."""
+
+names = full_names + mito_names
+"""Names of all of the models."""
+
+lopez_names = [name for name in names
+               if name.rpartition('.')[2].startswith('lopez_')]
+"""Names of the models whose MOMP is built by :py:mod:`earm.lopez_modules`,
+the ones whose pore size can be chosen."""
+
+_models = {}
+_lock = threading.Lock()
+# Serializes the builds that change the default pore size of lopez_modules
+_pore_lock = threading.Lock()
+
+def build(name, pore_max_size=None):
+    """Build and return a new instance of the named model.
+
+    The model module is executed in a fresh namespace, so the returned model
+    shares no components with any other instance of the same model and may be
+    freely modified.
+
+    Parameters
+    ----------
+    name : string
+        Name of the model, one of :py:data:`names`.
+    pore_max_size : int, optional
+        Number of subunits of the Bax and Bak pores that transport Cyto c and
+        Smac, in place of
+        :py:data:`earm.lopez_modules.default_pore_max_size`. Only the models
+        of :py:data:`lopez_names` accept it.
+
+    Returns
+    -------
+    pysb.core.Model
+        The model, named after its module (e.g. ``earm.mito.howells``).
+    """
+    if name not in names:
+        raise ValueError("Unknown model '%s'; must be one of %s" %
+                         (name, ', '.join(names)))
+    if pore_max_size is not None:
+        if name not in lopez_names:
+            raise ValueError("The pore size of model '%s' is fixed" % name)
+        if pore_max_size < 3:
+            raise ValueError("Pores must have at least 3 subunits")
+    if name not in lopez_names:
+        return _build(name)
+    # The pore size is read from lopez_modules while the model is built, so
+    # the builds of these models must not overlap
+    from earm import lopez_modules
+    with _pore_lock:
+        default = lopez_modules.default_pore_max_size
+        if pore_max_size is not None:
+            lopez_modules.default_pore_max_size = pore_max_size
+        try:
+            return _build(name)
+        finally:
+            lopez_modules.default_pore_max_size = default
+
+def _build(name):
+    module_name = 'earm.%s' % name
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        *name.split('.')) + '.py'
+    # Import the parent package first, as it is needed to resolve the imports
+    # made by the model module
+    package_name = module_name.rpartition('.')[0]
+    importlib.import_module(package_name)
+    module = types.ModuleType(module_name)
+    module.__file__ = path
+    module.__package__ = package_name
+    with open(path) as f:
+        code = compile(f.read(), path, 'exec')
+
+    # Model() exports into the namespace of the module that calls it, and
+    # deletes the symbols it previously exported if it believes that module is
+    # being re-run. Since the module executed here may share its file with a
+    # module that has already been imported, stash the exporter's state so
+    # that the build cannot disturb that module, and restore it afterwards.
+    saved_state = (SelfExporter.default_model, SelfExporter.target_globals,
+                   SelfExporter.target_module)
+    SelfExporter.default_model = None
+    SelfExporter.target_globals = None
+    SelfExporter.target_module = None
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', ModelExistsWarning)
+            warnings.simplefilter('ignore', SymbolExistsWarning)
+            exec(code, module.__dict__)
+    finally:
+        (SelfExporter.default_model, SelfExporter.target_globals,
+         SelfExporter.target_module) = saved_state
+
+    model = module.model
+    model.name = module_name
+    return model
+
+class _SharedModel(Model):
+    """A model returned by :py:func:`get`, to which components and initial
+    conditions cannot be added."""
+
+    def _read_only(self):
+        return TypeError("The shared instance of model %s cannot be "
+                         "modified; use earm.models.build to get one that "
+                         "can" % self.name)
+
+    def add_component(self, other):
+        raise self._read_only()
+
+    def initial(self, pattern, value):
+        raise self._read_only()
+
+def get(name):
+    """Return the shared instance of the named model, building it if needed.
+
+    The model is built by :py:func:`build` the first time it is requested and
+    the same instance is returned on every later call. It must not be
+    modified, and adding components or initial conditions to it raises a
+    TypeError; use :py:func:`build` to obtain an instance that can be.
+    """
+    with _lock:
+        model = _models.get(name)
+        if model is None:
+            model = build(name)
+            # Generating the network adds these components to models with
+            # synthesis and degradation rules, so add them before freezing
+            if model.has_synth_deg():
+                model.enable_synth_deg()
+            model.__class__ = _SharedModel
+            _models[name] = model
+    return model
+
+def is_built(name):
+    """Return True if the shared instance of the named model has been built."""
+    return name in _models
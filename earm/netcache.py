@@ -0,0 +1,133 @@
+"""
+Persistent on-disk cache of the reaction networks generated by BioNetGen.
+
+Generating the reaction network of a model requires running BioNetGen in a
+separate process, which dominates the time needed to load a model and prepare
+it for simulation. This module provides drop-in replacements for
+:py:func:`pysb.bng.generate_network` and :py:func:`pysb.bng.generate_equations`
+that store the network produced by BioNetGen on disk, keyed by a hash of the
+content of the model (monomers, compartments, parameters, rules, initial
+conditions, observables and expressions). When the same model is loaded again,
+in the same process or in a later one, the network is restored from the cache
+and BioNetGen is not run at all.
+
+The cached item is the BioNetGen "net" file, which lists the species, the
+reactions and the observable groups of the network; the species, reactions
+and ODEs are rebuilt from it by the same parser used by
+:py:func:`pysb.bng.generate_equations`, so a restored model is
+indistinguishable from one whose network was just generated.
+
+Cached networks are kept in the ``networks`` subdirectory of the EARM cache
+(see :py:func:`earm.util.cache_dir`). Since the key changes whenever the
+model changes, stale entries are never used; :py:func:`clear` can be used to
+reclaim the disk space they take up.
+"""
+
+import os
+import glob
+import hashlib
+
+import pysb
+import pysb.bng
+from earm.util import cache_dir, write_atomic
+
+# Bump this whenever the format or the content of the cache entries changes,
+# so that entries written by older versions are ignored.
+_CACHE_VERSION = 2
+
+# Components added by pysb.core.Model.enable_synth_deg, which are left out of
+# the hash so that it is the same before and after they are added
+_SYNTH_DEG_COMPONENTS = ('__source', '__sink', '__source_0')
+
+def model_hash(model):
+    """Return a hex digest identifying the content of a model.
+
+    Two models with the same hash produce the same reaction network. The name
+    of the model is not part of the hash.
+    """
+    # repr() of pysb components includes everything that defines them (e.g.
+    # the rule expression and the names of the rate parameters for a Rule),
+    # and parameter values are included with full precision.
+    lines = ['earm.netcache %d' % _CACHE_VERSION,
+             'pysb %s' % getattr(pysb, '__version__', ''),
+             'synth_deg %s' % model.has_synth_deg()]
+    for component_set in (model.monomers, model.compartments,
+                          model.parameters, model.rules, model.observables,
+                          getattr(model, 'expressions', [])):
+        lines.extend(repr(c) for c in component_set
+                     if c.name not in _SYNTH_DEG_COMPONENTS)
+    if hasattr(model, 'initials'):
+        initials = [(ic.pattern, ic.value) for ic in model.initials]
+    else:
+        initials = model.initial_conditions
+    for cp, value_obj in initials:
+        if value_obj.name not in _SYNTH_DEG_COMPONENTS:
+            lines.append('%r %s' % (cp, value_obj.name))
+    return hashlib.sha1('\n'.join(lines).encode('utf-8')).hexdigest()
+
+def _cache_path(model, directory):
+    if directory is None:
+        directory = cache_dir('networks')
+    name = model.name.replace(os.sep, '_') if model.name else 'model'
+    return os.path.join(directory, '%s-%s.net' % (name, model_hash(model)))
+
+def generate_network(model, cleanup=True, verbose=False, directory=None):
+    """Return the BioNetGen net file for a model, using the cache if possible.
+
+    Same as :py:func:`pysb.bng.generate_network`, except that the output is
+    read from the cache when the model has been seen before, and stored in
+    the cache otherwise.
+
+    Parameters
+    ----------
+    model : pysb.core.Model
+        Model to generate the network for.
+    cleanup : bool, optional
+        Passed to :py:func:`pysb.bng.generate_network` on a cache miss.
+    verbose : bool, optional
+        Passed to :py:func:`pysb.bng.generate_network` on a cache miss.
+    directory : string, optional
+        Directory holding the cached networks. Defaults to the ``networks``
+        subdirectory of the EARM cache.
+    """
+    path = _cache_path(model, directory)
+    # BngGenerator adds the source and sink species for synthesis and
+    # degradation rules to the model, and the net file refers to them, so this
+    # must happen whether or not BNG is run.
+    if model.has_synth_deg():
+        model.enable_synth_deg()
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return f.read()
+    output = pysb.bng.generate_network(model, cleanup=cleanup,
+                                       verbose=verbose)
+    write_atomic(path, output, 'w')
+    return output
+
+def generate_equations(model, cleanup=True, verbose=False, directory=None):
+    """Generate the species, reactions and ODEs of a model, using the cache.
+
+    Same as :py:func:`pysb.bng.generate_equations` (fills in ``species``,
+    ``reactions``, ``reactions_bidirectional``, ``odes`` and the species and
+    coefficients of the observables), except that the network is obtained
+    through :py:func:`generate_network` from this module.
+    """
+    # As in pysb.bng, only do this once per model
+    if model.odes:
+        return
+    lines = iter(generate_network(model, cleanup=cleanup, verbose=verbose,
+                                  directory=directory).split('\n'))
+    pysb.bng._parse_netfile(model, lines)
+
+def is_cached(model, directory=None):
+    """Return True if the network for the model is in the cache."""
+    return os.path.exists(_cache_path(model, directory))
+
+def clear(directory=None):
+    """Delete all cached networks. Returns the number of files removed."""
+    if directory is None:
+        directory = cache_dir('networks')
+    paths = glob.glob(os.path.join(directory, '*.net'))
+    for path in paths:
+        os.remove(path)
+    return len(paths)
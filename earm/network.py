@@ -0,0 +1,363 @@
+"""
+Numerical representation of the reaction network of an EARM model.
+
+All of the EARM models are built from mass-action rules, so once BioNetGen has
+generated the reaction network every reaction has the form
+
+    r_j = k_j * y[a] * y[b] * ...
+
+where ``y`` holds the species amounts, ``a, b, ...`` are the reactants of the
+reaction and ``k_j`` is a product of rate parameters and numeric factors (e.g.
+the 1/2 used by BioNetGen for symmetric reactions). :py:class:`Network`
+extracts this structure from the reactions generated by
+:py:func:`earm.netcache.generate_equations` and uses it to build:
+
+- the stoichiometry matrix and the reactant lists of the network, which are
+  the basis of the deterministic and stochastic simulators in EARM;
+- Python functions, generated and compiled once per model, that evaluate the
+  rate constants from a parameter vector (and their derivatives with respect
+  to the parameters), the right-hand side of the ODEs and the non-zero entries
+  of the Jacobian of the ODEs;
+- the sparsity pattern of the Jacobian, as the index arrays of a matrix in
+  compressed sparse column (CSC) format.
+
+The generated functions only use elementwise arithmetic on the rows of their
+arguments, so they work equally well on a single state vector of shape
+``(n_species,)`` and on a batch of state vectors of shape
+``(n_species, n_batch)`` (with rate constants of shape
+``(n_reactions, n_batch)``).
+"""
+
+from __future__ import division
+
+import re
+import __future__
+
+import numpy as np
+import scipy.sparse
+import sympy
+
+from earm.netcache import generate_equations
+
+# Species appear in the reaction rates generated by pysb.bng as symbols named
+# '__s0', '__s1', ... (or 's0', 's1', ... in older versions of pysb).
+_species_symbol_re = re.compile(r'^_*s(\d+)$')
+
+def _compile_function(source, name, filename):
+    """Compile the source code of a function and return the function."""
+    code = compile(source, filename, 'exec',
+                   __future__.division.compiler_flag, True)
+    namespace = {'np': np}
+    exec(code, namespace)
+    return namespace[name]
+
+def _format_term(coefficient, factors):
+    """Format coefficient * product(factors) as a signed code fragment."""
+    if coefficient == 1:
+        sign, body = '+', factors
+    elif coefficient == -1:
+        sign, body = '-', factors
+    else:
+        sign = '-' if coefficient < 0 else '+'
+        body = [repr(float(abs(coefficient)))] + factors
+    return '%s %s' % (sign, '*'.join(body))
+
+def _format_sum(terms):
+    """Join signed terms from _format_term into an expression."""
+    code = ' '.join(terms)
+    return code[2:] if code.startswith('+ ') else '-' + code[2:]
+
+class Network(object):
+    """The reaction network of a model, with compiled ODE functions.
+
+    Generates the network of the model (through the network cache) if that
+    has not been done yet.
+
+    Parameters
+    ----------
+    model : pysb.core.Model
+        The model.
+
+    Attributes
+    ----------
+    model : pysb.core.Model
+        The model passed to the constructor.
+    n_species, n_reactions, n_parameters, n_observables : int
+        Dimensions of the network.
+    reactants, products : list of tuples of int
+        Indices of the reactant and product species of each reaction, as in
+        ``model.reactions``.
+    rate_constant_exprs : list of sympy expressions
+        Rate constant of each reaction in terms of the model parameters.
+    stoichiometry : numpy.ndarray
+        Net stoichiometry matrix of the network, with shape
+        ``(n_species, n_reactions)``.
+    observables_matrix : numpy.ndarray
+        Coefficient matrix mapping species amounts to observable values, with
+        shape ``(n_observables, n_species)``.
+    initial_conditions : list of (int, int) tuples
+        Pairs of (species index, parameter index) giving the initial amount
+        of each seed species.
+    jac_indices, jac_indptr : numpy.ndarray
+        Sparsity pattern of the Jacobian of the ODEs, in CSC format.
+    """
+
+    def __init__(self, model):
+        generate_equations(model)
+        self.model = model
+        self.n_species = len(model.species)
+        self.n_reactions = len(model.reactions)
+        self.n_parameters = len(model.parameters)
+        self.n_observables = len(model.observables)
+        self.parameter_names = [p.name for p in model.parameters]
+        self.observable_names = [o.name for o in model.observables]
+        self._param_index = dict((name, i) for i, name in
+                                 enumerate(self.parameter_names))
+
+        self.reactants = []
+        self.products = []
+        self.rate_constant_exprs = []
+        for rxn in model.reactions:
+            species_symbols = {}
+            for symbol in rxn['rate'].free_symbols:
+                m = _species_symbol_re.match(symbol.name)
+                if m and symbol.name not in self._param_index:
+                    species_symbols[int(m.group(1))] = symbol
+            k = rxn['rate'] / sympy.Mul(*[species_symbols[i]
+                                          for i in rxn['reactants']])
+            if set(species_symbols.values()) & k.free_symbols:
+                raise ValueError("Reaction rate %s does not follow mass "
+                                 "action kinetics" % rxn['rate'])
+            self.reactants.append(tuple(rxn['reactants']))
+            self.products.append(tuple(rxn['products']))
+            self.rate_constant_exprs.append(k)
+
+        self.stoichiometry = np.zeros((self.n_species, self.n_reactions))
+        for j, (reactants, products) in enumerate(zip(self.reactants,
+                                                      self.products)):
+            for i in reactants:
+                self.stoichiometry[i, j] -= 1
+            for i in products:
+                self.stoichiometry[i, j] += 1
+
+        self.observables_matrix = np.zeros((self.n_observables,
+                                            self.n_species))
+        for i, obs in enumerate(model.observables):
+            self.observables_matrix[i, list(obs.species)] = obs.coefficients
+
+        self.initial_conditions = []
+        for cp, value_obj in model.initial_conditions:
+            si = model.get_species_index(cp)
+            if si is None:
+                raise IndexError("Species not found in model: %r" % cp)
+            self.initial_conditions.append(
+                (si, self._param_index[value_obj.name]))
+
+        self._generate_code()
+
+    @classmethod
+    def of(cls, model):
+        """Return the network of a model, or `model` itself if it is already
+        a Network."""
+        if isinstance(model, Network):
+            return model
+        return cls(model)
+
+    # Code generation
+    # ---------------
+
+    def _generate_code(self):
+        filename = '<%s network>' % self.model.name
+        param_symbols = dict((sympy.Symbol(name), sympy.Symbol('p[%d]' % i))
+                             for i, name in enumerate(self.parameter_names))
+
+        # Rate constants, k = f(p)
+        lines = ['def rate_constants(p):',
+                 '    k = np.empty((%d,) + np.shape(p)[1:])' %
+                 self.n_reactions]
+        for j, k in enumerate(self.rate_constant_exprs):
+            lines.append('    k[%d] = %s' % (j, k.xreplace(param_symbols)))
+        lines.append('    return k')
+        self._rate_constants = _compile_function('\n'.join(lines),
+                                                 'rate_constants', filename)
+
+        # Derivatives of the rate constants with respect to the parameters
+        lines = ['def rate_constants_jacobian(p):',
+                 '    dk = np.zeros((%d, %d))' % (self.n_reactions,
+                                                 self.n_parameters)]
+        for j, k in enumerate(self.rate_constant_exprs):
+            for symbol in sorted(k.free_symbols, key=str):
+                m = self._param_index[symbol.name]
+                lines.append('    dk[%d, %d] = %s' % (
+                    j, m, sympy.diff(k, symbol).xreplace(param_symbols)))
+        lines.append('    return dk')
+        self._rate_constants_jacobian = _compile_function(
+            '\n'.join(lines), 'rate_constants_jacobian', filename)
+
+        # Right-hand side of the ODEs. Each reaction rate is computed once and
+        # then added to or subtracted from the species it changes.
+        lines = ['def rhs(t, y, k):',
+                 '    ydot = np.zeros(np.shape(y))']
+        for j, reactants in enumerate(self.reactants):
+            lines.append('    r%d = %s' % (j, '*'.join(
+                ['k[%d]' % j] + ['y[%d]' % i for i in reactants])))
+        for i in range(self.n_species):
+            terms = [_format_term(self.stoichiometry[i, j], ['r%d' % j])
+                     for j in np.flatnonzero(self.stoichiometry[i])]
+            if terms:
+                lines.append('    ydot[%d] = %s' % (i, _format_sum(terms)))
+        lines.append('    return ydot')
+        self._rhs = _compile_function('\n'.join(lines), 'rhs', filename)
+
+        # Jacobian of the ODEs. The derivative of reaction j with respect to
+        # one of its reactants l is c * k_j * (product of the other reactants),
+        # where c is the number of times l appears in the reactants.
+        entries = {}
+        for j, reactants in enumerate(self.reactants):
+            column_species = np.flatnonzero(self.stoichiometry[:, j])
+            for l in sorted(set(reactants)):
+                others = list(reactants)
+                others.remove(l)
+                count = reactants.count(l)
+                factors = ['k[%d]' % j] + ['y[%d]' % i for i in others]
+                for i in column_species:
+                    coefficient = count * self.stoichiometry[i, j]
+                    entries.setdefault((l, i), []).append(
+                        _format_term(coefficient, factors))
+        # CSC order: by column (the species differentiated against), then row
+        pattern = sorted(entries)
+        self.jac_indices = np.array([i for l, i in pattern], dtype=int)
+        self.jac_indptr = np.searchsorted(
+            [l for l, i in pattern], np.arange(self.n_species + 1))
+        self.jac_nnz = len(pattern)
+        lines = ['def jacobian_data(t, y, k):',
+                 '    data = np.empty((%d,) + np.shape(y)[1:])' % self.jac_nnz]
+        for n, key in enumerate(pattern):
+            lines.append('    data[%d] = %s' % (n, _format_sum(entries[key])))
+        lines.append('    return data')
+        self._jacobian_data = _compile_function('\n'.join(lines),
+                                                'jacobian_data', filename)
+        self._jac_rows = self.jac_indices
+        self._jac_cols = np.repeat(np.arange(self.n_species),
+                                   np.diff(self.jac_indptr))
+
+    # Evaluation
+    # ----------
+
+    def param_vector(self, param_values=None):
+        """Return a full parameter vector, in the order of model.parameters.
+
+        `param_values` may be None (use the values in the model), a vector of
+        values for all parameters, or a dict mapping parameter names to values
+        that override those in the model. This follows the conventions of
+        :py:meth:`pysb.integrate.Solver.run`.
+        """
+        if param_values is not None and not isinstance(param_values, dict):
+            param_values = np.array(param_values, dtype=float)
+            if param_values.shape[0] != self.n_parameters:
+                raise ValueError("param_values must be the same length as "
+                                 "model.parameters")
+            return param_values
+        overrides = param_values or {}
+        values = np.array([p.value for p in self.model.parameters])
+        for name, value in overrides.items():
+            try:
+                values[self._param_index[name]] = value
+            except KeyError:
+                raise IndexError("param_values dictionary has unknown "
+                                 "parameter name (%s)" % name)
+        return values
+
+    def initial_values(self, param_values):
+        """Return the initial species amounts for a parameter vector.
+
+        `param_values` may also have shape ``(n_parameters, n_batch)``, in
+        which case the result has shape ``(n_species, n_batch)``.
+        """
+        param_values = np.asarray(param_values, dtype=float)
+        y0 = np.zeros((self.n_species,) + param_values.shape[1:])
+        for si, pi in self.initial_conditions:
+            y0[si] = param_values[pi]
+        return y0
+
+    def rate_constants(self, param_values):
+        """Return the rate constant of each reaction for a parameter vector."""
+        return self._rate_constants(np.asarray(param_values, dtype=float))
+
+    def rate_constants_jacobian(self, param_values):
+        """Return the derivatives of the rate constants for a parameter vector.
+
+        The result has shape ``(n_reactions, n_parameters)``.
+        """
+        return self._rate_constants_jacobian(np.asarray(param_values,
+                                                        dtype=float))
+
+    def rhs(self, t, y, k):
+        """Evaluate the right-hand side of the ODEs.
+
+        Parameters
+        ----------
+        t : float
+            Time (unused, as the EARM models are autonomous).
+        y : numpy.ndarray
+            Species amounts.
+        k : numpy.ndarray
+            Rate constants, as returned by :py:meth:`rate_constants`.
+        """
+        return self._rhs(t, y, k)
+
+    def reaction_rates(self, y, k):
+        """Return the rate of every reaction at the species amounts `y`."""
+        rates = np.array(k, dtype=float)
+        for j, reactants in enumerate(self.reactants):
+            for i in reactants:
+                rates[j] = rates[j] * y[i]
+        return rates
+
+    def jacobian_data(self, t, y, k):
+        """Return the non-zero entries of the Jacobian, in CSC order."""
+        return self._jacobian_data(t, y, k)
+
+    def jacobian(self, t, y, k):
+        """Return the Jacobian of the ODEs as a scipy.sparse.csc_matrix."""
+        return scipy.sparse.csc_matrix(
+            (self._jacobian_data(t, y, k), self.jac_indices, self.jac_indptr),
+            shape=(self.n_species, self.n_species))
+
+    def jacobian_dense(self, t, y, k, out=None):
+        """Return the Jacobian of the ODEs as a dense array.
+
+        If `out` is given, the Jacobian is written into it (it is assumed to
+        be zero outside of the sparsity pattern).
+        """
+        if out is None:
+            out = np.zeros((self.n_species, self.n_species))
+        out[self._jac_rows, self._jac_cols] = self._jacobian_data(t, y, k)
+        return out
+
+    def jacobian_symbolic(self):
+        """Return the Jacobian of the ODEs as a sparse sympy matrix.
+
+        Species are represented by the symbols ``y0, y1, ...`` and parameters
+        by their names.
+        """
+        y = sympy.symbols('y0:%d' % self.n_species)
+        rates = []
+        for k, reactants in zip(self.rate_constant_exprs, self.reactants):
+            rates.append(k * sympy.Mul(*[y[i] for i in reactants]))
+        jac = sympy.SparseMatrix(self.n_species, self.n_species, {})
+        for col in range(self.n_species):
+            for ptr in range(self.jac_indptr[col], self.jac_indptr[col + 1]):
+                row = self.jac_indices[ptr]
+                f = sum(self.stoichiometry[row, j] * rates[j]
+                        for j in np.flatnonzero(self.stoichiometry[row]))
+                jac[row, col] = sympy.diff(f, y[col])
+        return jac
+
+    def observables(self, y):
+        """Compute observable trajectories from species trajectories.
+
+        `y` has shape ``(n_times, n_species)``; the result has shape
+        ``(n_times, n_observables)``.
+        """
+        return np.dot(y, self.observables_matrix.T)
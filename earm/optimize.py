@@ -0,0 +1,801 @@
+"""
+Interchangeable global optimization strategies for parameter estimation.
+
+Fitting an EARM model means minimizing an objective function that costs one
+or more ODE integrations per evaluation, over a box of log-transformed rate
+constants. The strategies in this module share one interface,
+:py:meth:`Optimizer.minimize`, so that an estimation script can switch between
+them freely:
+
+- :py:class:`Anneal`, simulated annealing with the 'fast' cooling schedule of
+  the former ``scipy.optimize.anneal`` (removed from SciPy);
+- :py:class:`DifferentialEvolution`, the population-based method of
+  [Storn1997]_;
+- :py:class:`CMAES`, a covariance matrix adaptation evolution strategy
+  [Hansen2016]_;
+- :py:class:`ParallelTempering`, Metropolis sampling of several replicas at a
+  ladder of temperatures, with exchanges between neighboring replicas;
+- :py:class:`Polish`, local refinement of a point with L-BFGS-B.
+
+Objective functions are *batched*: they take an array of points with shape
+``(P, ndim)`` and return an array of P costs, so the population methods can
+evaluate a whole generation in one call (for example in a process pool, see
+:py:class:`PoolObjective`). :py:func:`vectorize` turns a function of a single
+point into a batched one, and :py:class:`CachedObjective` avoids evaluating
+the same point twice. Costs that are NaN are treated as infinite.
+
+An objective can also be *bounded* (see :py:func:`vectorize_bounded`): it is
+then called as ``func(points, threshold)``, with an upper bound for the cost
+of each point above which the strategy is certain to reject the point, and it
+may stop evaluating a point as soon as its cost is known to exceed the bound,
+returning any value above the bound instead of the exact cost (a simulation
+can stop early, for example, once a partial sum of squared errors is larger).
+:py:class:`Anneal` and :py:class:`ParallelTempering` pass the thresholds of
+their Metropolis tests, drawn before the evaluations, and
+:py:class:`DifferentialEvolution` passes the costs of the members that the
+trial points would replace; the other strategies call bounded objectives
+without thresholds.
+
+Progress is reported by calling ``callback(state)`` after every iteration with
+the :py:class:`OptimizerState`; the optimization stops if the callback
+returns True. The state holds everything needed to continue the optimization,
+including the random number generator, and it can be passed back to
+:py:meth:`Optimizer.minimize` to carry on from where it stopped. Long runs can
+also save their state to a checkpoint file at regular intervals (the
+`checkpoint` argument of :py:meth:`Optimizer.minimize`), from which a later
+run resumes and proceeds exactly as the interrupted run would have.
+"""
+
+import os
+import pickle
+import collections
+import multiprocessing
+
+import numpy as np
+import scipy.optimize
+
+from earm.util import write_atomic
+
+def vectorize(func, *args):
+    """Return a batched objective calling ``func(x, *args)`` for each point."""
+    def batched(points):
+        return np.array([func(x, *args) for x in points], dtype=float)
+    return batched
+
+def vectorize_bounded(func, *args):
+    """Return a bounded batched objective from a function of a single point.
+
+    The function is called as ``func(x, *args, threshold=t)`` for each point,
+    where t is the threshold of the point, or None when the caller does not
+    give thresholds.
+    """
+    def batched(points, threshold=None):
+        if threshold is None:
+            threshold = [None] * len(points)
+        return np.array([func(x, *args, threshold=t)
+                         for x, t in zip(points, threshold)], dtype=float)
+    batched.bounded = True
+    return batched
+
+def _call_bounded(args):
+    """Call a function of a single point with a threshold (for a pool)."""
+    func, x, threshold = args
+    return func(x, threshold=threshold)
+
+class CachedObjective(object):
+    """A batched objective that remembers the costs it has computed.
+
+    Optimizers often evaluate the same point more than once (a rejected move
+    followed by the same proposal, the members of a population that survive
+    a generation, restarted runs). The points of a batch that are in the
+    cache are not evaluated again; the others are evaluated together with
+    one call to `func`.
+
+    Parameters
+    ----------
+    func : callable
+        The batched objective function.
+    maxsize : int, optional
+        Maximum number of points kept; the least recently used points are
+        discarded first.
+    decimals : int, optional
+        If given, points are rounded to this number of decimals to form the
+        keys of the cache, so that points closer than that share one cost
+        (the cost of the first of them evaluated). By default, only identical
+        points share a cost.
+    path : string, optional
+        File in which the cache persists between runs. The entries in the file
+        are loaded when the cache is created, and :py:meth:`save` merges the
+        new entries into it. The file must only be shared by runs of the same
+        objective function (e.g. include a hash of the model in its name).
+    save_every : int, optional
+        Number of new entries after which the cache is saved to `path`.
+
+    If `func` is bounded, so is the cached objective. Costs that exceed
+    their threshold are not stored, since they may be smaller than the exact
+    costs. Copies of a point in one batch are evaluated once, with the
+    largest of their thresholds.
+
+    Attributes
+    ----------
+    hits, misses : int
+        Numbers of points found in and missing from the cache.
+    """
+
+    def __init__(self, func, maxsize=100000, decimals=None, path=None,
+                 save_every=1000):
+        self.func = func
+        self.bounded = getattr(func, 'bounded', False)
+        self.maxsize = maxsize
+        self.decimals = decimals
+        self.path = path
+        self.save_every = save_every
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._unsaved = {}
+        if path is not None and os.path.exists(path):
+            for key, cost in self._load().items():
+                self._store(key, cost)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _key(self, x):
+        if self.decimals is not None:
+            # Adding 0 turns -0.0 into 0.0
+            x = np.round(x, self.decimals) + 0
+        return np.asarray(x, dtype=float).tobytes()
+
+    def _store(self, key, cost):
+        self._entries.pop(key, None)
+        self._entries[key] = cost
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def __call__(self, points, threshold=None):
+        points = np.atleast_2d(points)
+        keys = [self._key(x) for x in points]
+        cost = np.empty(len(points))
+        missing = []
+        for i, key in enumerate(keys):
+            if key in self._entries:
+                # Move the entry to the most recently used end
+                cost[i] = self._entries.pop(key)
+                self._entries[key] = cost[i]
+                self.hits += 1
+            else:
+                missing.append(i)
+        # Points missing more than once in the batch are evaluated once, with
+        # the largest of their thresholds; the cost is then exact for every
+        # copy unless it exceeds that threshold
+        first = {}
+        for i in missing:
+            first.setdefault(keys[i], i)
+        self.misses += len(missing)
+        if first:
+            indices = sorted(first.values())
+            if self.bounded and threshold is not None:
+                threshold = np.asarray(threshold, dtype=float)
+                largest = {}
+                for i in missing:
+                    largest[keys[i]] = max(largest.get(keys[i], -np.inf),
+                                           threshold[i])
+                bound = np.array([largest[keys[i]] for i in indices])
+                new_cost = self.func(points[indices], bound)
+            else:
+                bound = np.full(len(indices), np.inf)
+                new_cost = self.func(points[indices])
+            new_cost = np.asarray(new_cost, dtype=float)
+            for i, c, b in zip(indices, new_cost.reshape(len(indices)), bound):
+                if not c > b:
+                    self._store(keys[i], c)
+                    self._unsaved[keys[i]] = c
+                first[keys[i]] = c
+        for i in missing:
+            cost[i] = first[keys[i]]
+        if self.path is not None and len(self._unsaved) >= self.save_every:
+            self.save()
+        return cost
+
+    def _load(self):
+        with open(self.path, 'rb') as f:
+            return pickle.load(f)
+
+    def save(self):
+        """Merge the new entries into the cache file."""
+        if self.path is None or not self._unsaved:
+            return
+        entries = self._load() if os.path.exists(self.path) else {}
+        entries.update(self._unsaved)
+        write_atomic(self.path, pickle.dumps(entries, 2))
+        self._unsaved = {}
+
+class PoolObjective(object):
+    """A batched objective evaluating the points in a pool of processes.
+
+    Parameters
+    ----------
+    func : callable
+        Function of a single point, which must be picklable (a module-level
+        function, or a :py:func:`functools.partial` of one).
+    processes : int, optional
+        Number of worker processes. Defaults to the number of CPUs.
+    initializer : callable, optional
+        Function called once in each worker when it starts, for example to
+        build a separate solver for the worker.
+    bounded : bool, optional
+        If True, `func` takes a `threshold` keyword argument (as for
+        :py:func:`vectorize_bounded`), and the objective is bounded.
+
+    The pool stays open until :py:meth:`close` is called.
+    """
+
+    def __init__(self, func, processes=None, initializer=None, bounded=False):
+        self.func = func
+        self.bounded = bounded
+        self.pool = multiprocessing.Pool(processes, initializer=initializer)
+
+    def __call__(self, points, threshold=None):
+        if self.bounded:
+            if threshold is None:
+                threshold = [None] * len(points)
+            cost = self.pool.map(_call_bounded, [
+                (self.func, x, t) for x, t in zip(points, threshold)])
+        else:
+            cost = self.pool.map(self.func, list(points))
+        return np.array(cost, dtype=float)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+class OptimizerState(object):
+    """The state of an optimization between two iterations.
+
+    Attributes
+    ----------
+    nit : int
+        Number of iterations completed.
+    nfev : int
+        Number of objective function evaluations.
+    x : numpy.ndarray
+        The current point, or the current population with shape
+        ``(P, ndim)``, depending on the strategy.
+    cost : float or numpy.ndarray
+        The cost of `x`.
+    best_x : numpy.ndarray
+        The best point found so far.
+    best_cost : float
+        The cost of `best_x`.
+    random : numpy.random.RandomState
+        The random number generator of the optimization.
+
+    Strategies store their other state (temperature, step size, ...) as
+    additional attributes.
+    """
+
+    def __init__(self, random):
+        self.nit = 0
+        self.nfev = 0
+        self.x = None
+        self.cost = None
+        self.best_x = None
+        self.best_cost = np.inf
+        self.random = random
+
+class Optimizer(object):
+    """Base class of the optimization strategies.
+
+    Parameters
+    ----------
+    maxiter : int
+        Maximum number of iterations.
+    seed : int, optional
+        Seed for the random number generator.
+
+    Subclasses implement ``_start(func, state, x0, lb, ub)``, which sets up a
+    new state, and ``_iterate(func, state, lb, ub)``, which performs one
+    iteration and returns True once the strategy has converged.
+    """
+
+    def __init__(self, maxiter, seed=None):
+        self.maxiter = maxiter
+        self.seed = seed
+
+    def minimize(self, func, x0, lb, ub, callback=None, state=None,
+                 checkpoint=None, checkpoint_every=10):
+        """Minimize a batched objective function within bounds.
+
+        Parameters
+        ----------
+        func : callable
+            Batched objective function (see the module documentation).
+        x0 : array-like
+            Starting point.
+        lb, ub : array-like
+            Lower and upper bounds on each coordinate.
+        callback : callable, optional
+            Called as ``callback(state)`` after each iteration; the
+            optimization stops if it returns True.
+        state : OptimizerState, optional
+            State returned by an earlier call with the same arguments, from
+            which to continue instead of starting anew.
+        checkpoint : string, optional
+            Path of a checkpoint file. If the file exists (and `state` is not
+            given), the optimization resumes from the state saved in it;
+            otherwise it starts anew. The state is saved to the file after
+            the start, every `checkpoint_every` iterations and at the end.
+        checkpoint_every : int, optional
+            Number of iterations between checkpoints.
+
+        Returns
+        -------
+        scipy.optimize.OptimizeResult
+            With the best point `x`, its cost `fun`, the numbers of iterations
+            `nit` and of evaluations `nfev`, a `message`, and the final
+            `state`.
+        """
+        lb = np.asarray(lb, dtype=float)
+        ub = np.asarray(ub, dtype=float)
+        if state is None and checkpoint is not None and \
+                os.path.exists(checkpoint):
+            optimizer, state = load_checkpoint(checkpoint)
+            if type(optimizer) is not type(self):
+                raise ValueError("Checkpoint %s was saved by %s, not %s" %
+                                 (checkpoint, type(optimizer).__name__,
+                                  type(self).__name__))
+        if state is None:
+            x0 = np.clip(np.asarray(x0, dtype=float), lb, ub)
+            state = OptimizerState(np.random.RandomState(self.seed))
+            self._start(func, state, x0, lb, ub)
+            if checkpoint is not None:
+                save_checkpoint(checkpoint, self, state)
+        message = 'Maximum number of iterations reached'
+        while state.nit < self.maxiter:
+            converged = self._iterate(func, state, lb, ub)
+            state.nit += 1
+            if checkpoint is not None and state.nit % checkpoint_every == 0:
+                save_checkpoint(checkpoint, self, state)
+            if callback is not None and callback(state):
+                message = 'Stopped by the callback'
+                break
+            if converged:
+                message = 'Converged'
+                break
+        if checkpoint is not None:
+            save_checkpoint(checkpoint, self, state)
+        return scipy.optimize.OptimizeResult(
+            x=state.best_x.copy(), fun=state.best_cost, nit=state.nit,
+            nfev=state.nfev, message=message, success=np.isfinite(
+                state.best_cost), state=state)
+
+    def _start(self, func, state, x0, lb, ub):
+        raise NotImplementedError
+
+    def _iterate(self, func, state, lb, ub):
+        raise NotImplementedError
+
+def save_checkpoint(path, optimizer, state):
+    """Save an optimizer and its state to a file, atomically.
+
+    The file is replaced in one step, so a job that is killed while saving
+    leaves the previous checkpoint intact.
+    """
+    write_atomic(path, pickle.dumps((optimizer, state), 2))
+
+def load_checkpoint(path):
+    """Load a checkpoint file, returning the (optimizer, state) pair.
+
+    Continuing from the state reproduces an uninterrupted run exactly, as
+    the state includes the random number generator.
+    """
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+def _evaluate(func, state, points, threshold=None):
+    """Evaluate a batch of points, keeping track of the best one.
+
+    The thresholds, if given, are passed on to bounded objectives; they must
+    not be below the best cost found, as a cost returned above its threshold
+    may be smaller than the exact cost.
+    """
+    points = np.atleast_2d(points)
+    if threshold is not None and getattr(func, 'bounded', False):
+        cost = func(points, np.atleast_1d(threshold))
+    else:
+        cost = func(points)
+    cost = np.asarray(cost, dtype=float).reshape(len(points))
+    cost[np.isnan(cost)] = np.inf
+    state.nfev += len(points)
+    i = np.argmin(cost)
+    if cost[i] < state.best_cost or state.best_x is None:
+        state.best_cost = cost[i]
+        state.best_x = points[i].copy()
+    return cost
+
+def latin_hypercube(random, n, lb, ub):
+    """Latin hypercube sample of n points in the box [lb, ub]."""
+    ndim = len(lb)
+    strata = np.array([random.permutation(n) for i in range(ndim)]).T
+    u = (strata + random.uniform(size=(n, ndim))) / n
+    return lb + u * (ub - lb)
+
+class Anneal(Optimizer):
+    """Simulated annealing with the 'fast' schedule of scipy.optimize.anneal.
+
+    Each iteration makes `dwell` moves at the current temperature, each one
+    evaluated and accepted or rejected by the Metropolis criterion before the
+    next, and then lowers the temperature to ``T0 * exp(-c * k ** quench)``
+    with ``c = m * exp(-n * quench)`` after k iterations. Moves are drawn
+    from the Cauchy-like distribution of the fast schedule, scaled by `step`;
+    moves that leave the bounds are rejected without evaluation.
+
+    Parameters
+    ----------
+    maxiter : int, optional
+        Maximum number of iterations (temperatures).
+    dwell : int, optional
+        Number of moves at each temperature.
+    quench, m, n : float, optional
+        Parameters of the cooling schedule.
+    T0 : float, optional
+        Initial temperature. If not given, it is estimated as 1.2 times the
+        range of the costs of 50 random moves from the starting point.
+    Tf : float, optional
+        Final temperature, at which the annealing stops.
+    step : float or array-like, optional
+        Scale of the moves in each coordinate.
+    seed : int, optional
+        Seed for the random number generator.
+    """
+
+    def __init__(self, maxiter=4000, dwell=50, quench=1.0, m=1.0, n=1.0,
+                 T0=None, Tf=1e-12, step=0.02, seed=None):
+        super(Anneal, self).__init__(maxiter, seed)
+        self.dwell = dwell
+        self.quench = quench
+        self.m = m
+        self.n = n
+        self.T0 = T0
+        self.Tf = Tf
+        self.step = step
+
+    def _start(self, func, state, x0, lb, ub):
+        state.x = x0.copy()
+        state.cost = _evaluate(func, state, x0)[0]
+        if self.T0 is None:
+            moves = x0 + (state.random.uniform(size=(50, len(x0))) - 0.5) * \
+                self.step
+            cost = _evaluate(func, state, np.clip(moves, lb, ub))
+            cost = cost[np.isfinite(cost)]
+            state.T0 = 1.2 * (cost.max() - cost.min()) if len(cost) else 1.0
+        else:
+            state.T0 = self.T0
+        state.temperature = state.T0
+        state.accepted = 0
+
+    def _iterate(self, func, state, lb, ub):
+        random = state.random
+        T = state.temperature
+        for i in range(self.dwell):
+            u = random.uniform(size=len(state.x))
+            with np.errstate(over='ignore'):
+                y = np.sign(u - 0.5) * T * ((1 + 1.0 / T) **
+                                            np.abs(2 * u - 1) - 1)
+            x = state.x + y * self.step
+            # The Metropolis test accepts the move if its cost is below the
+            # threshold, which is drawn before the evaluation
+            with np.errstate(divide='ignore'):
+                threshold = state.cost - T * np.log(random.uniform())
+            if np.any((x < lb) | (x > ub)):
+                cost = np.inf
+            else:
+                cost = _evaluate(func, state, x, threshold)[0]
+            if cost < threshold:
+                state.x, state.cost = x, cost
+                state.accepted += 1
+        c = self.m * np.exp(-self.n * self.quench)
+        state.temperature = state.T0 * np.exp(-c * (state.nit + 1) **
+                                              self.quench)
+        return state.temperature < self.Tf
+
+class DifferentialEvolution(Optimizer):
+    """Differential evolution [Storn1997]_ with batched generations.
+
+    Parameters
+    ----------
+    maxiter : int, optional
+        Maximum number of generations.
+    popsize : int, optional
+        The population has ``popsize * ndim`` members, initialized by Latin
+        hypercube sampling of the bounds (the first member is the starting
+        point).
+    mutation : float or (float, float), optional
+        Differential weight F. If a tuple, F is drawn uniformly from that
+        range for each generation (dithering).
+    recombination : float, optional
+        Crossover probability CR.
+    strategy : 'best1bin' or 'rand1bin', optional
+        Base vector of the mutations: the best member or a random one.
+    tol : float, optional
+        The optimization has converged when the standard deviation of the
+        costs of the population falls below `tol` times their mean.
+    seed : int, optional
+        Seed for the random number generator.
+    """
+
+    def __init__(self, maxiter=1000, popsize=15, mutation=(0.5, 1),
+                 recombination=0.7, strategy='best1bin', tol=0.01, seed=None):
+        super(DifferentialEvolution, self).__init__(maxiter, seed)
+        if strategy not in ('best1bin', 'rand1bin'):
+            raise ValueError("Unknown strategy '%s'; must be 'best1bin' or "
+                             "'rand1bin'" % strategy)
+        self.popsize = popsize
+        self.mutation = mutation
+        self.recombination = recombination
+        self.strategy = strategy
+        self.tol = tol
+
+    def _start(self, func, state, x0, lb, ub):
+        size = max(self.popsize * len(x0), 5)
+        state.x = latin_hypercube(state.random, size, lb, ub)
+        state.x[0] = x0
+        state.cost = _evaluate(func, state, state.x)
+
+    def _iterate(self, func, state, lb, ub):
+        random = state.random
+        population = state.x
+        size, ndim = population.shape
+        if np.ndim(self.mutation):
+            F = random.uniform(*self.mutation)
+        else:
+            F = self.mutation
+        # Three distinct members other than the target for each mutant
+        others = np.array([random.permutation(np.delete(np.arange(size), i))
+                           [:3] for i in range(size)])
+        if self.strategy == 'best1bin':
+            base = population[np.argmin(state.cost)]
+        else:
+            base = population[others[:, 2]]
+        mutants = base + F * (population[others[:, 0]] -
+                              population[others[:, 1]])
+        # Binomial crossover, with at least one coordinate from the mutant
+        cross = random.uniform(size=(size, ndim)) < self.recombination
+        cross[np.arange(size), random.randint(ndim, size=size)] = True
+        trials = np.where(cross, mutants, population)
+        # Coordinates out of bounds are drawn again within the bounds
+        outside = (trials < lb) | (trials > ub)
+        trials[outside] = (lb + random.uniform(size=(size, ndim)) *
+                           (ub - lb))[outside]
+        cost = _evaluate(func, state, trials, state.cost)
+        better = cost <= state.cost
+        population[better] = trials[better]
+        state.cost[better] = cost[better]
+        finite = state.cost[np.isfinite(state.cost)]
+        return (len(finite) == size and
+                np.std(finite) <= self.tol * np.abs(np.mean(finite)))
+
+class CMAES(Optimizer):
+    """Covariance matrix adaptation evolution strategy [Hansen2016]_.
+
+    The search runs in coordinates scaled so that the bounds are the unit
+    hypercube; sampled points outside it are moved to its boundary.
+
+    Parameters
+    ----------
+    maxiter : int, optional
+        Maximum number of generations.
+    popsize : int, optional
+        Number of points per generation, by default ``4 + 3 * ln(ndim)``.
+    sigma0 : float, optional
+        Initial step size, relative to the width of the bounds.
+    tolx : float, optional
+        The optimization has converged when the step size in every
+        direction falls below `tolx` (relative to the width of the bounds).
+    seed : int, optional
+        Seed for the random number generator.
+    """
+
+    def __init__(self, maxiter=1000, popsize=None, sigma0=0.1, tolx=1e-8,
+                 seed=None):
+        super(CMAES, self).__init__(maxiter, seed)
+        self.popsize = popsize
+        self.sigma0 = sigma0
+        self.tolx = tolx
+
+    def _strategy_parameters(self, n):
+        """Return the default strategy parameters for dimension n."""
+        lam = self.popsize or 4 + int(3 * np.log(n))
+        mu = lam // 2
+        weights = np.log(mu + 0.5) - np.log(np.arange(1, mu + 1))
+        weights /= weights.sum()
+        mueff = 1 / np.sum(weights ** 2)
+        cc = (4 + mueff / n) / (n + 4 + 2 * mueff / n)
+        cs = (mueff + 2) / (n + mueff + 5)
+        c1 = 2 / ((n + 1.3) ** 2 + mueff)
+        cmu = min(1 - c1, 2 * (mueff - 2 + 1 / mueff) / ((n + 2) ** 2 + mueff))
+        damps = 1 + 2 * max(0, np.sqrt((mueff - 1) / (n + 1)) - 1) + cs
+        chin = np.sqrt(n) * (1 - 1. / (4 * n) + 1. / (21 * n ** 2))
+        return lam, mu, weights, mueff, cc, cs, c1, cmu, damps, chin
+
+    def _start(self, func, state, x0, lb, ub):
+        n = len(x0)
+        state.mean = (x0 - lb) / (ub - lb)
+        state.sigma = self.sigma0
+        state.C = np.eye(n)
+        state.B = np.eye(n)
+        state.D = np.ones(n)
+        state.pc = np.zeros(n)
+        state.ps = np.zeros(n)
+        state.x = x0[None, :].copy()
+        state.cost = _evaluate(func, state, x0)
+
+    def _iterate(self, func, state, lb, ub):
+        n = len(state.mean)
+        (lam, mu, weights, mueff, cc, cs, c1, cmu, damps,
+         chin) = self._strategy_parameters(n)
+        z = state.random.standard_normal((lam, n))
+        u = np.clip(state.mean + state.sigma * np.dot(z * state.D, state.B.T),
+                    0, 1)
+        y = (u - state.mean) / state.sigma
+        state.x = lb + u * (ub - lb)
+        state.cost = _evaluate(func, state, state.x)
+
+        # Move the mean to the weighted average of the mu best points
+        selected = y[np.argsort(state.cost)[:mu]]
+        yw = np.dot(weights, selected)
+        state.mean = state.mean + state.sigma * yw
+        # Update the evolution paths
+        inv_sqrt_c_yw = np.dot(state.B, np.dot(state.B.T, yw) / state.D)
+        state.ps = ((1 - cs) * state.ps +
+                    np.sqrt(cs * (2 - cs) * mueff) * inv_sqrt_c_yw)
+        ps_norm = np.linalg.norm(state.ps)
+        hsig = (ps_norm / np.sqrt(1 - (1 - cs) ** (2 * (state.nit + 1))) /
+                chin < 1.4 + 2. / (n + 1))
+        state.pc = ((1 - cc) * state.pc +
+                    hsig * np.sqrt(cc * (2 - cc) * mueff) * yw)
+        # Rank-one and rank-mu updates of the covariance matrix
+        state.C = ((1 - c1 - cmu) * state.C +
+                   c1 * (np.outer(state.pc, state.pc) +
+                         (1 - hsig) * cc * (2 - cc) * state.C) +
+                   cmu * np.dot(selected.T * weights, selected))
+        state.sigma *= np.exp((cs / damps) * (ps_norm / chin - 1))
+        state.C = np.triu(state.C) + np.triu(state.C, 1).T
+        eigenvalues, state.B = np.linalg.eigh(state.C)
+        state.D = np.sqrt(np.maximum(eigenvalues, 1e-20))
+        return state.sigma * state.D.max() < self.tolx
+
+class ParallelTempering(Optimizer):
+    """Parallel tempering (replica-exchange Metropolis) optimization.
+
+    Each replica performs a Gaussian random walk whose moves are accepted
+    with the Metropolis criterion at the temperature of the replica; the
+    proposals of all replicas are evaluated as one batch. After every
+    iteration, neighboring replicas (alternately the even and the odd pairs)
+    exchange their positions with the usual replica-exchange probability,
+    which lets the coldest replica escape local minima.
+
+    Parameters
+    ----------
+    maxiter : int, optional
+        Maximum number of iterations.
+    temperatures : array-like, optional
+        Temperature of each replica, by default 8 temperatures spaced
+        logarithmically from 1 to 1000.
+    step : float or array-like, optional
+        Standard deviation of the moves in each coordinate.
+    seed : int, optional
+        Seed for the random number generator.
+    """
+
+    def __init__(self, maxiter=1000, temperatures=None, step=0.05, seed=None):
+        super(ParallelTempering, self).__init__(maxiter, seed)
+        if temperatures is None:
+            temperatures = np.logspace(0, 3, 8)
+        self.temperatures = np.asarray(temperatures, dtype=float)
+        self.step = step
+
+    def _start(self, func, state, x0, lb, ub):
+        n_replicas = len(self.temperatures)
+        state.x = np.tile(x0, (n_replicas, 1))
+        state.cost = np.repeat(_evaluate(func, state, x0), n_replicas)
+        state.accepted = np.zeros(n_replicas, dtype=int)
+        state.swaps = np.zeros(n_replicas - 1, dtype=int)
+
+    def _iterate(self, func, state, lb, ub):
+        random = state.random
+        T = self.temperatures
+        proposals = state.x + random.normal(size=state.x.shape) * self.step
+        inside = np.all((proposals >= lb) & (proposals <= ub), axis=1)
+        log_u = np.log(random.uniform(size=len(T)))
+        cost = np.full(len(T), np.inf)
+        if inside.any():
+            threshold = state.cost - T * log_u
+            cost[inside] = _evaluate(func, state, proposals[inside],
+                                     threshold[inside])
+        with np.errstate(invalid='ignore', over='ignore'):
+            accept = log_u < -(cost - state.cost) / T
+        state.x[accept] = proposals[accept]
+        state.cost[accept] = cost[accept]
+        state.accepted += accept
+        # Exchanges between neighbors
+        for i in range(state.nit % 2, len(T) - 1, 2):
+            with np.errstate(invalid='ignore', over='ignore'):
+                log_ratio = ((state.cost[i] - state.cost[i + 1]) *
+                             (1 / T[i] - 1 / T[i + 1]))
+            if np.log(random.uniform()) < log_ratio:
+                state.x[[i, i + 1]] = state.x[[i + 1, i]]
+                state.cost[[i, i + 1]] = state.cost[[i + 1, i]]
+                state.swaps[i] += 1
+        return False
+
+class Polish(Optimizer):
+    """Local refinement of a point with the L-BFGS-B method.
+
+    Unless a `gradient` function is given, the gradient is approximated by
+    forward differences, and the `ndim` + 1 points needed for it are
+    evaluated as one batch. Each iteration of L-BFGS-B counts as one
+    iteration of the optimization for the callback, but the optimization
+    cannot be resumed from an intermediate state (or checkpointed).
+
+    Parameters
+    ----------
+    maxiter : int, optional
+        Maximum number of L-BFGS-B iterations.
+    eps : float, optional
+        Step of the finite differences.
+    gradient : callable, optional
+        Function of a single point returning the pair (cost, gradient), for
+        example computed from sensitivities. When given, it replaces the
+        objective function and the finite differences.
+    """
+
+    def __init__(self, maxiter=100, eps=1e-4, gradient=None):
+        super(Polish, self).__init__(maxiter)
+        self.eps = eps
+        self.gradient = gradient
+
+    def minimize(self, func, x0, lb, ub, callback=None, state=None,
+                 checkpoint=None, checkpoint_every=10):
+        if checkpoint is not None:
+            raise ValueError("Polish does not support checkpoints")
+        lb = np.asarray(lb, dtype=float)
+        ub = np.asarray(ub, dtype=float)
+        x0 = np.clip(np.asarray(x0, dtype=float), lb, ub)
+        state = OptimizerState(None)
+        state.x = x0
+        cache = {}
+
+        def cost_and_gradient(x):
+            key = x.tobytes()
+            if key not in cache:
+                cache.clear()
+                if self.gradient is not None:
+                    cost, grad = self.gradient(x)
+                    _evaluate(lambda points: [cost], state, x)
+                    cache[key] = cost, np.asarray(grad, dtype=float)
+                else:
+                    # Step inward at the upper bounds
+                    h = np.where(x + self.eps <= ub, self.eps, -self.eps)
+                    points = np.vstack((x, x + np.diag(h)))
+                    cost = _evaluate(func, state, points)
+                    cache[key] = cost[0], (cost[1:] - cost[0]) / h
+            return cache[key]
+
+        def report(x):
+            state.nit += 1
+            state.x = x.copy()
+            state.cost = cost_and_gradient(x)[0]
+            if callback is not None:
+                callback(state)
+
+        result = scipy.optimize.minimize(
+            lambda x: cost_and_gradient(x)[0], x0,
+            jac=lambda x: cost_and_gradient(x)[1], method='L-BFGS-B',
+            bounds=list(zip(lb, ub)), callback=report,
+            options={'maxiter': self.maxiter})
+        return scipy.optimize.OptimizeResult(
+            x=state.best_x.copy(), fun=state.best_cost, nit=state.nit,
+            nfev=state.nfev, message=result.message,
+            success=np.isfinite(state.best_cost), state=state)
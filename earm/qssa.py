@@ -0,0 +1,460 @@
+"""
+Quasi-steady-state reduction of fast reversible reactions.
+
+Most of the reactions of the EARM models are reversible bindings (from
+:py:func:`earm.shared.bind`, :py:func:`earm.shared.bind_table` and the first
+step of :py:func:`earm.shared.catalyze`), and the complexes they form often
+relax in seconds or less while MOMP takes hours: the enzyme-substrate
+complexes of the catalytic steps, which turn over at rates of 1-10/s, set the
+stiffness of the ODEs, and the diffusion-limited binding of tBid to the
+anti-apoptotic proteins equilibrates in seconds. The slow dynamics only
+depend on the quasi-steady states of these complexes [Segel1989]_.
+
+:py:func:`find_fast_reactions` pairs each association with its reverse
+reaction, and computes the relaxation time of the complex along a simulation
+of the full model at nominal parameters: for the complex ``C`` of a pair with
+stoichiometry ``s``, it is ``1 / lambda`` with ``lambda = -grad(f_C) . s``,
+the rate at which a perturbation of the extent of the pair decays (for
+``E + S <-> C -> E + P``, ``kf (E + S) + kr + kc``). The pairs whose complex
+relaxes faster than a threshold throughout are fast.
+
+:py:class:`QSSANetwork` puts the complexes of the fast pairs in quasi-steady
+state, ``f_C = 0``. As in the total quasi-steady-state approximation, the
+amounts stay on this manifold by moving along the stoichiometry of the pairs,
+so the conserved totals are kept, and the full right-hand side ``f`` is
+projected parallel to them:
+
+    ``ydot = f - N_F (G N_F)^-1 G f``
+
+where ``N_F`` holds the stoichiometry of the fast pairs and ``G`` the
+gradients of ``f_C``. A complex that takes part in no other reaction is then
+in equilibrium with its components, and the initial amounts are brought onto
+the manifold by Newton's method. A :py:class:`QSSANetwork` can be used
+wherever :py:class:`earm.integrate.Solver` and
+:py:class:`earm.batch.BatchSolver` accept a :py:class:`earm.network.Network`,
+and :py:func:`error_report` compares its trajectories and costs with those of
+the full network. :py:func:`reduce_model` chains the three steps.
+
+The fast timescales drop out of the dynamics, but the complexes stay in the
+integrated state, and every evaluation of the projected right-hand side
+solves a linear system with the gradients of the fast complexes. This makes
+the reduced network no cheaper to integrate with the stiff integrators,
+whose step sizes are not limited by the fast timescales in the first place.
+For M1a (``lopez_embedded``) over 20000 s, 16 pairs are fast at the default
+timescale and the error of the observables is below 0.5%, but:
+
+- with ``'vode'`` (BDF), the full and reduced networks take 820 and 816
+  steps, and the reduced one takes about twice as long;
+- with ``'lsoda'`` and ``'bdf'``, the numbers of steps barely change either,
+  and the reduced network is 1.2 to 1.5 times slower;
+- only a non-stiff method gains: vode's ``'adams'`` takes 1729 steps
+  instead of 5373, and 1.5 times less time, which is still several times
+  the time of the full network with BDF.
+
+The reduction is therefore a tool to study the timescales of a model and to
+make it tractable for non-stiff (e.g. explicit or stochastic) methods, not
+a way to speed up the fits or the ensembles, which use stiff integrators.
+"""
+
+from __future__ import division
+
+import numpy as np
+import scipy.optimize
+
+from earm.network import Network, _compile_function, _format_term, \
+    _format_sum
+from earm.integrate import Solver
+
+def reversible_pairs(network):
+    """Return the associations of a network that have a reverse reaction.
+
+    Returns
+    -------
+    list of (tuple, tuple)
+        The ``(forward, reverse)`` pairs of reaction indices, where `forward`
+        lists the reactions that turn the same reactants into one complex
+        (usually only one reaction) and `reverse` those that turn the complex
+        back into the reactants. Pairs of unimolecular conversions are
+        oriented by the indices of the species.
+    """
+    groups = {}
+    for j, (reactants, products) in enumerate(zip(network.reactants,
+                                                  network.products)):
+        key = (tuple(sorted(reactants)), tuple(sorted(products)))
+        groups.setdefault(key, []).append(j)
+    pairs = []
+    for (reactants, products), forward in groups.items():
+        reverse = groups.get((products, reactants))
+        if (reverse is not None and len(products) == 1 and
+                (len(reactants) > 1 or reactants < products)):
+            pairs.append((tuple(forward), tuple(reverse)))
+    return sorted(pairs)
+
+class _FastPairs(object):
+    """The rates of change of the complexes of a set of pairs of reactions,
+    and their gradients."""
+
+    def __init__(self, network, pairs):
+        self.pairs = [(tuple(f), tuple(r)) for f, r in pairs]
+        self.n_pairs = len(self.pairs)
+        self.complexes = np.array([network.products[f[0]][0]
+                                   for f, r in self.pairs], dtype=int)
+        self.stoichiometry = network.stoichiometry[
+            :, [f[0] for f, r in self.pairs]].reshape(network.n_species, -1)
+        # The derivatives of the rate of change of each complex, as in
+        # Network._generate_code
+        entries = {}
+        for p, c in enumerate(self.complexes):
+            for j in np.flatnonzero(network.stoichiometry[c]):
+                reactants = network.reactants[j]
+                for l in sorted(set(reactants)):
+                    others = list(reactants)
+                    others.remove(l)
+                    factors = ['k[%d]' % j] + ['y[%d]' % i for i in others]
+                    coefficient = (reactants.count(l) *
+                                   network.stoichiometry[c, j])
+                    entries.setdefault((p, l), []).append(
+                        _format_term(coefficient, factors))
+        pattern = sorted(entries)
+        self.rows = np.array([p for p, l in pattern], dtype=int)
+        self.cols = np.array([l for p, l in pattern], dtype=int)
+        lines = ['def complex_gradients(y, k):',
+                 '    data = np.empty((%d,) + np.shape(y)[1:])' %
+                 len(pattern)]
+        for n, key in enumerate(pattern):
+            lines.append('    data[%d] = %s' % (n, _format_sum(entries[key])))
+        lines.append('    return data')
+        self._gradient_data = _compile_function(
+            '\n'.join(lines), 'complex_gradients',
+            '<%s fast pairs>' % network.model.name)
+        self.network = network
+
+    def gradient(self, y, k):
+        """Return the gradients of the rates of change of the complexes as an
+        array with shape ``(n_pairs, n_species)`` (followed by the batch
+        dimension, if any)."""
+        y = np.asarray(y)
+        g = np.zeros((self.n_pairs, self.network.n_species) + y.shape[1:])
+        g[self.rows, self.cols] = self._gradient_data(y, k)
+        return g
+
+    def relaxation_rates(self, y, k):
+        """Return the rate at which the complex of each pair relaxes."""
+        g = self.gradient(y, k)
+        return -np.einsum('pl...,lp->p...', g, self.stoichiometry)
+
+def _solve(a, b):
+    """Solve ``a x = b`` for x, where a has shape ``(m, m)`` and b ``(m,)``
+    or ``(m, ...)``, or a batch of either along a trailing dimension."""
+    if a.ndim == 2:
+        return np.linalg.solve(a, b)
+    x = np.linalg.solve(np.moveaxis(a, -1, 0), np.moveaxis(b, -1, 0))
+    return np.moveaxis(x, 0, -1)
+
+def relaxation_times(model, pairs, y, k):
+    """Return the relaxation times of the complexes of reversible pairs of
+    reactions.
+
+    Parameters
+    ----------
+    model : pysb.core.Model or earm.network.Network
+        The model.
+    pairs : list of (tuple, tuple)
+        Reversible pairs of reactions, as returned by
+        :py:func:`reversible_pairs`.
+    y : numpy.ndarray
+        Species amounts, with shape ``(n_species,)`` or, for several times,
+        ``(n_times, n_species)``.
+    k : numpy.ndarray
+        Rate constants of the reactions.
+
+    Returns
+    -------
+    numpy.ndarray
+        The relaxation time of each pair, with shape ``(n_pairs,)`` or
+        ``(n_times, n_pairs)``.
+    """
+    fast = _FastPairs(Network.of(model), pairs)
+    y = np.asarray(y, dtype=float)
+    k = np.asarray(k, dtype=float)
+    if y.ndim == 2:
+        k = k[:, None]
+    with np.errstate(divide='ignore'):
+        return (1 / fast.relaxation_rates(y.T, k)).T
+
+def find_fast_reactions(model, tspan, param_values=None, timescale=1.0,
+                        **solver_options):
+    """Find the reversible reactions that are fast along a simulation.
+
+    Parameters
+    ----------
+    model : pysb.core.Model or earm.network.Network
+        The model.
+    tspan : vector-like
+        Time points of the simulation of the full model.
+    param_values : vector-like or dict, optional
+        Parameter values of the simulation (by default, those of the model).
+    timescale : float, optional
+        The longest relaxation time, in seconds, of a fast pair. The default
+        of one second is short compared with the switch of MOMP, which takes
+        minutes.
+    **solver_options
+        Passed to :py:class:`earm.integrate.Solver`.
+
+    Returns
+    -------
+    list of (tuple, tuple)
+        The pairs of :py:func:`reversible_pairs` whose relaxation time is
+        below `timescale` at all the time points, except those whose complex
+        or stoichiometry is already that of faster pairs.
+    """
+    network = Network.of(model)
+    solver = Solver(network, tspan, **solver_options)
+    solver.run(param_values)
+    k = network.rate_constants(network.param_vector(param_values))
+    pairs = reversible_pairs(network)
+    tau = np.max(relaxation_times(network, pairs, solver.y, k), axis=0)
+    # Each complex can only be put in quasi-steady state once, and pairs
+    # that form a cycle with faster ones have no independent steady state
+    fast = []
+    complexes = set()
+    stoichiometry = np.zeros((network.n_species, 0))
+    for i in np.argsort(tau, kind='mergesort'):
+        if tau[i] > timescale:
+            break
+        forward = pairs[i][0][0]
+        complex_ = network.products[forward][0]
+        s = np.column_stack([stoichiometry,
+                             network.stoichiometry[:, forward]])
+        if (complex_ not in complexes and
+                np.linalg.matrix_rank(s) == s.shape[1]):
+            fast.append(pairs[i])
+            complexes.add(complex_)
+            stoichiometry = s
+    return sorted(fast)
+
+class QSSANetwork(Network):
+    """A network with the complexes of its fast reversible reactions in
+    quasi-steady state.
+
+    The object shares the structure and the compiled functions of the full
+    network, but its right-hand side and Jacobian are those of the reduced
+    dynamics on the quasi-steady-state manifold of the fast pairs, and its
+    initial amounts are on that manifold. The Jacobian is the full one
+    projected like the right-hand side, ``J - N_F (G N_F)^-1 G J``, which
+    neglects the curvature of the manifold; it is only used for the Newton
+    iterations of the integrators. Both are dense and cost more to evaluate
+    than those of the full network (see the module documentation).
+
+    Parameters
+    ----------
+    model : pysb.core.Model or earm.network.Network
+        The full model.
+    fast : list of (tuple, tuple)
+        The pairs of reactions to reduce, as returned by
+        :py:func:`find_fast_reactions`.
+
+    Attributes
+    ----------
+    full_network : earm.network.Network
+        The full network.
+    fast : list of (tuple, tuple)
+        The fast pairs.
+    fast_stoichiometry : numpy.ndarray
+        The stoichiometry of the fast pairs (in the forward direction), with
+        shape ``(n_species, n_fast)``.
+    """
+
+    def __init__(self, model, fast):
+        full = Network.of(model)
+        # Share the structure and the compiled functions of the full network
+        self.__dict__.update(full.__dict__)
+        self.full_network = full
+        self._fast = _FastPairs(full, fast)
+        self.fast = self._fast.pairs
+        self.fast_stoichiometry = self._fast.stoichiometry
+
+        # Sparsity pattern of the projected Jacobian: the rows of the species
+        # of the fast pairs fill in wherever (G N_F)^-1 G J has an entry
+        n_species, n_fast = self.n_species, self._fast.n_pairs
+        jac = np.zeros((n_species, n_species), dtype=bool)
+        jac[full._jac_rows, full._jac_cols] = True
+        g = np.zeros((n_fast, n_species), dtype=bool)
+        g[self._fast.rows, self._fast.cols] = True
+        n_f = self.fast_stoichiometry != 0
+        coupling = np.eye(n_fast, dtype=bool) | (np.dot(g, n_f) > 0)
+        while True:
+            closure = np.dot(coupling, coupling) > 0
+            if np.array_equal(closure, coupling):
+                break
+            coupling = closure
+        fill = np.dot(n_f, np.dot(coupling, np.dot(g, jac))) > 0
+        pattern = jac | fill
+        self._jac_cols, self._jac_rows = np.nonzero(pattern.T)
+        self.jac_indices = self._jac_rows
+        self.jac_indptr = np.searchsorted(self._jac_cols,
+                                          np.arange(n_species + 1))
+        self.jac_nnz = len(self.jac_indices)
+        self._full_rows, self._full_cols = full._jac_rows, full._jac_cols
+
+        self._rhs = self._projected_rhs
+        self._jacobian_data = self._projected_jacobian_data
+
+    def _projected_rhs(self, t, y, k):
+        full = self.full_network
+        f = full._rhs(t, y, k)
+        g = self._fast.gradient(y, k)
+        a = np.einsum('pl...,lq->pq...', g, self.fast_stoichiometry)
+        u = _solve(a, np.einsum('pl...,l...->p...', g, f))
+        return f - np.tensordot(self.fast_stoichiometry, u, axes=1)
+
+    def _projected_jacobian_data(self, t, y, k):
+        full = self.full_network
+        y = np.asarray(y)
+        jac = np.zeros((self.n_species, self.n_species) + y.shape[1:])
+        jac[self._full_rows, self._full_cols] = full._jacobian_data(t, y, k)
+        g = self._fast.gradient(y, k)
+        a = np.einsum('pl...,lq->pq...', g, self.fast_stoichiometry)
+        x = _solve(a, np.einsum('pl...,lm...->pm...', g, jac))
+        jac -= np.tensordot(self.fast_stoichiometry, x, axes=1)
+        return jac[self._jac_rows, self._jac_cols]
+
+    def equilibrate(self, y, k, tol=1e-12, max_iter=100):
+        """Return the amounts at which the complexes of the fast pairs are in
+        quasi-steady state.
+
+        The amounts are moved along the stoichiometry of the fast pairs only,
+        which keeps the conserved totals, by a damped Newton iteration that
+        keeps them positive.
+
+        Parameters
+        ----------
+        y : numpy.ndarray
+            Species amounts, or a batch of them with shape
+            ``(n_species, n_batch)``.
+        k : numpy.ndarray
+            Rate constants (with the same batch dimension as `y`).
+        tol : float, optional
+            Relative tolerance on the change in the amounts.
+        max_iter : int, optional
+            Maximum number of Newton iterations.
+
+        Raises
+        ------
+        RuntimeError
+            If the iteration does not converge.
+        """
+        y = np.array(y, dtype=float)
+        n_f = self.fast_stoichiometry
+        for i in range(max_iter):
+            w = self.full_network._rhs(0, y, k)[self._fast.complexes]
+            g = self._fast.gradient(y, k)
+            a = np.einsum('pl...,lq->pq...', g, n_f)
+            dy = -np.tensordot(n_f, _solve(a, w), axes=1)
+            # Stop short of any amount that would become negative
+            with np.errstate(divide='ignore', invalid='ignore'):
+                limit = np.where(dy < 0, -0.9 * y / dy, np.inf)
+            step = np.minimum(1, np.min(limit, axis=0))
+            y += step * dy
+            if np.all(np.abs(dy) <= tol * (np.abs(y) + 1)):
+                return y
+        raise RuntimeError("The complexes did not reach a quasi-steady state "
+                           "in %d iterations" % max_iter)
+
+    def initial_values(self, param_values):
+        """Return the initial species amounts for a parameter vector, with
+        the complexes of the fast pairs in quasi-steady state."""
+        y0 = super(QSSANetwork, self).initial_values(param_values)
+        return self.equilibrate(y0, self.rate_constants(param_values))
+
+def _run(solver, param_values):
+    """Run a solver and return its run time and numbers of steps and of
+    evaluations of the right-hand side."""
+    solver.run(param_values)
+    stats = solver.stats
+    return (stats.times['integrate'], stats.counts['steps'],
+            stats.counts['rhs'])
+
+def error_report(model, reduced, tspan, param_values=None, **solver_options):
+    """Compare the simulations of a full and a reduced network.
+
+    Parameters
+    ----------
+    model : pysb.core.Model or earm.network.Network
+        The full model.
+    reduced : QSSANetwork
+        The reduced network.
+    tspan : vector-like
+        Time points of the simulations.
+    param_values : vector-like or dict, optional
+        Parameter values of the simulations.
+    **solver_options
+        Passed to :py:class:`earm.integrate.Solver`.
+
+    Returns
+    -------
+    scipy.optimize.OptimizeResult
+        With the fields ``observables`` (the names of the observables),
+        ``error`` (the largest absolute difference of each observable over
+        `tspan`, relative to its largest value in the full simulation),
+        ``max_error``, ``yobs`` and ``yobs_reduced`` (the observables of the
+        two simulations, as record arrays), and ``time``, ``n_steps`` and
+        ``n_rhs`` (the run times, numbers of integrator steps and numbers of
+        evaluations of the right-hand side of the full and reduced
+        simulations, from the ``stats`` of the solvers).
+    """
+    network = Network.of(model)
+    full = Solver(network, tspan, **solver_options)
+    time_full, steps_full, rhs_full = _run(full, param_values)
+    solver = Solver(reduced, tspan, **solver_options)
+    time_reduced, steps_reduced, rhs_reduced = _run(solver, param_values)
+    scale = np.max(np.abs(full.yobs_view), axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        error = np.max(np.abs(solver.yobs_view - full.yobs_view), axis=0)
+        error = np.where(scale > 0, error / scale, error)
+    return scipy.optimize.OptimizeResult(
+        observables=list(network.observable_names), error=error,
+        max_error=np.max(error), yobs=full.yobs, yobs_reduced=solver.yobs,
+        time=(time_full, time_reduced), n_steps=(steps_full, steps_reduced),
+        n_rhs=(rhs_full, rhs_reduced))
+
+def reduce_model(model, tspan, param_values=None, timescale=1.0,
+                 **solver_options):
+    """Find the fast reversible reactions of a model, put their complexes in
+    quasi-steady state and report the error of the reduction.
+
+    The report also gives the run times and the numbers of steps and of
+    evaluations of the right-hand side of both networks with the given
+    solver options. With a stiff integrator the reduced network takes about
+    as many steps as the full one and more time; only non-stiff methods take
+    fewer steps (see the module documentation).
+
+    Parameters
+    ----------
+    model : pysb.core.Model or earm.network.Network
+        The model.
+    tspan : vector-like
+        Time points of the simulations used to find the fast reactions and
+        to evaluate the reduction.
+    param_values : vector-like or dict, optional
+        The nominal parameter values.
+    timescale : float, optional
+        The longest relaxation time of a fast pair (see
+        :py:func:`find_fast_reactions`).
+    **solver_options
+        Passed to :py:class:`earm.integrate.Solver`.
+
+    Returns
+    -------
+    reduced : QSSANetwork
+        The reduced network.
+    report : scipy.optimize.OptimizeResult
+        The comparison with the full network, from :py:func:`error_report`.
+    """
+    network = Network.of(model)
+    fast = find_fast_reactions(network, tspan, param_values, timescale,
+                               **solver_options)
+    reduced = QSSANetwork(network, fast)
+    report = error_report(network, reduced, tspan, param_values,
+                          **solver_options)
+    return reduced, report
@@ -0,0 +1,319 @@
+"""
+Global sensitivity analysis of the features of a model to its rate constants.
+
+The EARM models have tens to hundreds of rate parameters (about a hundred
+for M1a), of which only some are constrained by the MOMP timing data. Before
+spending a fitting budget on all of them, a global sensitivity analysis tells
+which ones matter for the features that are fitted: the delay time Td and the
+switching time Ts of MOMP (see :py:func:`earm.features.timing`) and the final
+amounts of observables such as cleaved PARP.
+
+The parameters vary log-uniformly within `radius` decades of their nominal
+values, all at once. Two methods are provided:
+
+- :py:func:`morris` computes the elementary effects of [Morris1991]_ along
+  random one-at-a-time trajectories and reports, for each parameter, their
+  mean ``mu``, the mean of their absolute values ``mu_star``
+  [Campolongo2007]_ and their standard deviation ``sigma``. It needs
+  ``r * (d + 1)`` simulations for `r` trajectories and `d` parameters, and is
+  meant to screen out the parameters that have no effect.
+- :py:func:`sobol` estimates the first-order and total Sobol indices
+  [Sobol2001]_ of each parameter, the fractions of the variance of a feature
+  due to the parameter alone and to the parameter and all its interactions,
+  with the estimators of [Saltelli2010]_. It needs ``n * (d + 2)``
+  simulations, and is meant for the parameters left by screening.
+
+All the simulations of an analysis are integrated by
+:py:class:`earm.batch.BatchSolver`, optionally in several processes. The
+results are :py:class:`scipy.optimize.OptimizeResult` objects, whose index
+arrays have one row per parameter and one column per feature, and
+:py:func:`ranking` sorts the parameters by any of their indices.
+"""
+
+import numpy as np
+import scipy.optimize
+
+from earm.batch import BatchSolver, run_parallel
+from earm.features import timing
+from earm.network import Network
+
+# The features computed by earm.features.timing; any other feature is the
+# final value of the observable of that name
+_timing_features = ['td', 'ts']
+
+def rate_parameters(model, param_values=None):
+    """Return the names of the parameters of a model that appear in its rules,
+    in the order of ``model.parameters``.
+
+    The parameters whose value is 0 (the rates of reactions that are turned
+    off) are left out, since they cannot vary on a log scale.
+    """
+    network = Network.of(model)
+    rate_params = network.model.parameters_rules()
+    values = network.param_vector(param_values)
+    return [p.name for p, value in zip(network.model.parameters, values)
+            if p in rate_params and value != 0]
+
+class _Problem(object):
+    """The parameters being varied, their ranges and the features of the
+    simulations."""
+
+    def __init__(self, model, tspan, parameters, radius, param_values,
+                 features, observable, processes, solver_options):
+        network = self.network = Network.of(model)
+        if parameters is None:
+            parameters = rate_parameters(network, param_values)
+        self.parameters = list(parameters)
+        try:
+            self.indices = [network.parameter_names.index(name)
+                            for name in self.parameters]
+        except ValueError:
+            unknown = set(self.parameters) - set(network.parameter_names)
+            raise IndexError("Unknown parameter name (%s)" %
+                             ', '.join(sorted(unknown)))
+        self.features = list(features)
+        for name in self.features:
+            if (name not in _timing_features and
+                name not in network.observable_names):
+                raise ValueError("Unknown feature (%s); must be one of %s or "
+                                 "an observable" %
+                                 (name, ', '.join(_timing_features)))
+        self.observable = network.observable_names.index(observable)
+        if isinstance(radius, dict):
+            radius = [radius.get(name, 1) for name in self.parameters]
+        self.radius = np.broadcast_to(np.asarray(radius, dtype=float),
+                                      (len(self.parameters),))
+        self.nominal = network.param_vector(param_values)
+        self.log_nominal = np.log10(self.nominal[self.indices])
+        self.processes = processes
+        self.solver = BatchSolver(network, tspan, **solver_options)
+
+    def evaluate(self, x):
+        """Return the features of the points `x` of the unit hypercube, with
+        shape ``(len(x), n_features)``."""
+        params = np.tile(self.nominal, (len(x), 1))
+        params[:, self.indices] = 10 ** (self.log_nominal +
+                                         self.radius * (2 * x - 1))
+        n = len(params)
+        yobs = run_parallel(self.solver, params, self.processes)
+
+        names = self.network.observable_names
+        values = np.empty((n, len(self.features)))
+        momp = None
+        for j, name in enumerate(self.features):
+            if name in _timing_features:
+                if momp is None:
+                    momp = timing(self.solver.tspan,
+                                  yobs[:, :, self.observable])
+                values[:, j] = momp[name]
+            else:
+                values[:, j] = yobs[:, -1, names.index(name)]
+        return values
+
+    def result(self, x, values, **indices):
+        return scipy.optimize.OptimizeResult(
+            parameters=self.parameters, features=self.features,
+            samples=self.log_nominal + self.radius * (2 * x - 1),
+            outputs=values, **indices)
+
+def morris_trajectories(r, d, levels=4, random=np.random):
+    """Return `r` random one-at-a-time trajectories in the unit hypercube.
+
+    Each trajectory starts from a random point of the grid of `levels`
+    values in each of the `d` dimensions and moves along each dimension once,
+    in random order, by ``levels / (2 * (levels - 1))``.
+
+    Returns
+    -------
+    numpy.ndarray
+        The points, with shape ``(r, d + 1, d)``.
+    """
+    if levels < 2 or levels % 2:
+        raise ValueError("levels must be an even number")
+    delta = levels / (2.0 * (levels - 1))
+    x = np.empty((r, d + 1, d))
+    x[:, 0] = random.randint(levels, size=(r, d)) / (levels - 1.0)
+    for t in range(r):
+        for step, i in enumerate(random.permutation(d)):
+            x[t, step + 1] = x[t, step]
+            # With an even number of levels, exactly one direction stays
+            # within the hypercube
+            if x[t, step, i] + delta <= 1 + 1e-12:
+                x[t, step + 1, i] += delta
+            else:
+                x[t, step + 1, i] -= delta
+    return x
+
+def _morris_indices(x, values):
+    """Return mu, mu_star, sigma and the number of finite effects of each
+    dimension, from trajectories with shape ``(r, d + 1, d)`` and their
+    features with shape ``(r, d + 1, n_features)``."""
+    r, d = x.shape[0], x.shape[2]
+    dx = np.diff(x, axis=1)
+    # The dimension that moves at each step of each trajectory
+    moved = np.argmax(np.abs(dx), axis=2)
+    rows = np.arange(r)[:, None]
+    steps = dx[rows, np.arange(d), moved]
+    effects = np.empty((r, d, values.shape[2]))
+    effects[rows, moved] = np.diff(values, axis=1) / steps[..., None]
+    finite = np.isfinite(effects)
+    count = finite.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mu = np.where(finite, effects, 0).sum(axis=0) / count
+        mu_star = np.where(finite, abs(effects), 0).sum(axis=0) / count
+        deviations = np.where(finite, effects - mu, 0)
+        sigma = np.sqrt((deviations ** 2).sum(axis=0) / (count - 1))
+    return mu, mu_star, sigma, count
+
+def morris(model, tspan, parameters=None, radius=1, r=20, levels=4,
+           param_values=None, features=('td', 'ts'), observable='aSmac',
+           seed=None, processes=1, **solver_options):
+    """Screen the parameters of a model by their elementary effects.
+
+    Parameters
+    ----------
+    model : pysb.core.Model or earm.network.Network
+        The model.
+    tspan : vector-like
+        Time points of the integration. Td and Ts are NaN for the systems
+        that do not switch within `tspan`.
+    parameters : list of strings, optional
+        Names of the parameters to vary; by default, those of
+        :py:func:`rate_parameters`.
+    radius : float or dict, optional
+        Range of each parameter, in decades on each side of its nominal
+        value, either the same for all the parameters or a dict mapping
+        parameter names to values (the others have a radius of 1).
+    r : int, optional
+        Number of trajectories.
+    levels : int, optional
+        Number of levels of the grid of each parameter (even).
+    param_values : dict, optional
+        Nominal values of some parameters, in place of those of the model.
+    features : sequence of strings, optional
+        Features of the simulations: ``'td'`` and ``'ts'`` (of
+        `observable`) or the name of an observable, for its final value.
+    observable : string, optional
+        Observable whose switch defines Td and Ts.
+    seed : int, optional
+        Seed of the random number generator.
+    processes : int, optional
+        Number of processes that run the simulations. None for the number of
+        CPUs.
+    **solver_options
+        Passed to :py:class:`earm.batch.BatchSolver`.
+
+    Returns
+    -------
+    scipy.optimize.OptimizeResult
+        With the attributes ``parameters`` and ``features`` (the names),
+        ``mu``, ``mu_star`` and ``sigma`` (the indices, with shape
+        ``(n_parameters, n_features)``, in units of the feature per unit of
+        the range of the parameter; NaN effects, of the simulations that do
+        not switch, are left out), ``n_effects`` (the number of effects each
+        index is computed from), and ``samples`` (the log10 parameter values
+        of the simulations) and ``outputs`` (their features).
+    """
+    problem = _Problem(model, tspan, parameters, radius, param_values,
+                       features, observable, processes, solver_options)
+    d = len(problem.parameters)
+    x = morris_trajectories(r, d, levels, np.random.RandomState(seed))
+    values = problem.evaluate(x.reshape(-1, d)).reshape(r, d + 1, -1)
+    mu, mu_star, sigma, count = _morris_indices(x, values)
+    return problem.result(x.reshape(-1, d), values.reshape(r * (d + 1), -1),
+                          mu=mu, mu_star=mu_star, sigma=sigma,
+                          n_effects=count)
+
+def _sobol_indices(fa, fb, fab):
+    """Return the first-order and total indices of each dimension, from the
+    features of the matrices A and B with shape ``(n, n_features)`` and of
+    the matrices A_B^(i) with shape ``(d, n, n_features)``."""
+    s1 = np.empty(fab.shape[::2])
+    st = np.empty(fab.shape[::2])
+    for i in range(len(fab)):
+        for j in range(fa.shape[1]):
+            # Systems with a NaN feature (that do not switch) are left out
+            finite = (np.isfinite(fa[:, j]) & np.isfinite(fb[:, j]) &
+                      np.isfinite(fab[i, :, j]))
+            a, b, ab = fa[finite, j], fb[finite, j], fab[i, finite, j]
+            variance = np.var(np.concatenate((a, b)))
+            s1[i, j] = np.mean(b * (ab - a)) / variance
+            st[i, j] = np.mean(np.square(a - ab)) / (2 * variance)
+    return s1, st
+
+def sobol(model, tspan, parameters=None, radius=1, n=1000, n_bootstrap=100,
+          param_values=None, features=('td', 'ts'), observable='aSmac',
+          seed=None, processes=1, **solver_options):
+    """Estimate the first-order and total Sobol indices of the parameters of
+    a model.
+
+    Parameters
+    ----------
+    model, tspan, parameters, radius, param_values
+        As for :py:func:`morris`.
+    features, observable, seed, processes, **solver_options
+        As for :py:func:`morris`.
+    n : int, optional
+        Number of points of each of the two sample matrices.
+    n_bootstrap : int, optional
+        Number of bootstrap resamples used to estimate the confidence
+        intervals of the indices; 0 to skip them.
+
+    Returns
+    -------
+    scipy.optimize.OptimizeResult
+        With the attributes ``parameters``, ``features``, ``samples`` and
+        ``outputs`` as for :py:func:`morris`, ``S1`` and ``ST`` (the
+        first-order and total indices, with shape
+        ``(n_parameters, n_features)``), and ``S1_conf`` and ``ST_conf``
+        (the half widths of their 95% bootstrap confidence intervals).
+    """
+    problem = _Problem(model, tspan, parameters, radius, param_values,
+                       features, observable, processes, solver_options)
+    d = len(problem.parameters)
+    random = np.random.RandomState(seed)
+    a = random.uniform(size=(n, d))
+    b = random.uniform(size=(n, d))
+    ab = np.tile(a, (d, 1, 1))
+    for i in range(d):
+        ab[i, :, i] = b[:, i]
+    x = np.concatenate((a, b, ab.reshape(d * n, d)))
+    values = problem.evaluate(x)
+    fa, fb = values[:n], values[n:2 * n]
+    fab = values[2 * n:].reshape(d, n, -1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        s1, st = _sobol_indices(fa, fb, fab)
+        s1_boot = np.empty((n_bootstrap,) + s1.shape)
+        st_boot = np.empty((n_bootstrap,) + st.shape)
+        for k in range(n_bootstrap):
+            sample = random.randint(n, size=n)
+            s1_boot[k], st_boot[k] = _sobol_indices(fa[sample], fb[sample],
+                                                    fab[:, sample])
+    if n_bootstrap:
+        s1_conf = 1.96 * np.std(s1_boot, axis=0)
+        st_conf = 1.96 * np.std(st_boot, axis=0)
+    else:
+        s1_conf = st_conf = np.full(s1.shape, np.nan)
+    return problem.result(x, values, S1=s1, ST=st, S1_conf=s1_conf,
+                          ST_conf=st_conf)
+
+def ranking(result, feature, index=None):
+    """Return the names of the parameters sorted by decreasing sensitivity.
+
+    Parameters
+    ----------
+    result : scipy.optimize.OptimizeResult
+        The result of :py:func:`morris` or :py:func:`sobol`.
+    feature : string
+        One of the features of the analysis.
+    index : string, optional
+        The index by which the parameters are sorted; by default ``mu_star``
+        for Morris screening and ``ST`` for Sobol indices.
+    """
+    if index is None:
+        index = 'mu_star' if 'mu_star' in result else 'ST'
+    values = result[index][:, result.features.index(feature)]
+    # NaN indices (of parameters without any finite effect) come last
+    order = np.argsort(-np.where(np.isfinite(values), values, -np.inf),
+                       kind='mergesort')
+    return [result.parameters[i] for i in order]
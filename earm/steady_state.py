@@ -0,0 +1,465 @@
+"""
+Steady states of a reaction network and their continuation in a parameter.
+
+The species of an EARM network are bound by mass conservation relations
+(total Bax, total Bcl2, ...), so the Jacobian of the ODEs is singular and the
+steady states are not isolated points of ``f(y) = 0``: for given initial
+amounts, the steady state lies on the affine subspace where the conserved
+totals keep their initial values. The steady states are therefore solved for
+in the reduced system of :py:mod:`earm.conservation`, the ODEs of the
+*independent* species, whose Jacobian is regular at a hyperbolic steady
+state and whose eigenvalues decide its stability.
+
+:py:func:`steady_state` solves the reduced system with a damped Newton
+method and the analytic Jacobian of the network. When Newton does not
+converge from the initial amounts, it is restarted from the states that the
+ODEs reach after successively longer integrations.
+
+:py:func:`continuation` follows a curve of steady states as one parameter
+varies (a rate constant or an initial amount, such as ``Bid_0``) by
+pseudo-arclength continuation [Allgower2003]_: each step predicts the next
+point along the tangent of the curve and corrects it with Newton iterations
+orthogonal to the tangent. Since the curve is parametrized by its arclength
+rather than by the parameter, it is followed around its fold points, where
+the parameter turns back and the stability of the steady states changes, so
+a single sweep traces every branch of a hysteresis loop. The fold points are
+located on the curve by bisection on the sign of the parameter component of
+the tangent.
+
+:py:func:`dose_response` computes the steady states for a list of doses
+(any set of parameter values that depends on one number, such as the amounts
+of the BH3-only proteins in the dose-response curves of [Chen2007febs]_),
+starting each solve from the steady state of the previous, neighboring dose
+rather than from the initial amounts.
+"""
+
+from __future__ import division
+
+import numpy as np
+import scipy.linalg
+import scipy.optimize
+
+from earm.network import Network
+from earm.integrate import Solver
+from earm.conservation import ConservationLaws
+
+def _newton(func, x0, tol, maxiter):
+    """Damped Newton iterations on ``func(x) -> (residual, jacobian)``.
+
+    Returns ``(x, converged, nit)``. The step is halved until the norm of the
+    residual decreases; the iterations have converged when every element of
+    the last full step was below `tol` times the sum of its ``|x|`` and the
+    largest ``|x|``.
+    """
+    x = np.array(x0, dtype=float)
+    if not len(x):
+        return x, True, 0
+    g, jac = func(x)
+    norm = np.linalg.norm(g)
+    for nit in range(1, maxiter + 1):
+        try:
+            dx = -scipy.linalg.solve(jac, g)
+        except (scipy.linalg.LinAlgError, ValueError):
+            return x, False, nit
+        if not np.all(np.isfinite(dx)):
+            return x, False, nit
+        step = 1.0
+        while True:
+            x_new = x + step * dx
+            g_new, jac_new = func(x_new)
+            norm_new = np.linalg.norm(g_new)
+            if norm_new <= (1 - step / 4) * norm or step < 1e-3:
+                break
+            step /= 2
+        x, g, jac, norm = x_new, g_new, jac_new, norm_new
+        scale = np.abs(x) + np.max(np.abs(x))
+        if step == 1.0 and np.all(np.abs(dx) <= tol * scale):
+            return x, True, nit
+    return x, False, maxiter
+
+def steady_state(model, param_values=None, y0=None, tol=1e-10, maxiter=100,
+                 relax=True, laws=None):
+    """Return the steady state reached from the initial amounts of a model.
+
+    Parameters
+    ----------
+    model : pysb.core.Model or earm.network.Network
+        The model.
+    param_values : vector-like or dict, optional
+        Parameter values (see :py:meth:`earm.network.Network.param_vector`).
+    y0 : vector-like, optional
+        Initial species amounts, which fix the conserved totals and serve as
+        the first guess. Defaults to the initial conditions of the model.
+    tol : float, optional
+        Relative tolerance of the Newton iterations on the species amounts.
+    maxiter : int, optional
+        Maximum number of Newton iterations from each starting point.
+    relax : bool, optional
+        If True (default) and Newton does not converge from `y0` to
+        non-negative amounts, the ODEs are integrated for 10, 100, ..., 1e8
+        time units and Newton is restarted from each state reached.
+    laws : ConservationLaws, optional
+        The conservation laws of the network, if already known.
+
+    Returns
+    -------
+    scipy.optimize.OptimizeResult
+        With attributes ``y`` (the steady state), ``eigenvalues`` (of the
+        Jacobian of the reduced system), ``stable`` (True if all of them have
+        negative real parts), ``success``, ``message`` and ``nit`` (the
+        total number of Newton iterations).
+    """
+    network = Network.of(model)
+    if laws is None:
+        laws = ConservationLaws(network)
+    params = network.param_vector(param_values)
+    k = network.rate_constants(params)
+    if y0 is None:
+        y0 = network.initial_values(params)
+    y0 = np.asarray(y0, dtype=float)
+    totals = laws.totals(y0)
+    ind = laws.independent
+    floor = tol * max(np.max(np.abs(y0)), np.max(np.abs(totals), initial=0))
+
+    def func(x):
+        y = laws.full(x, totals)
+        jac = network.jacobian_dense(0.0, y, k)
+        return network.rhs(0.0, y, k)[ind], laws.reduce_jacobian(jac)
+
+    starts = [y0]
+    if relax:
+        tspan = np.concatenate([[0], 10.0 ** np.arange(1, 9)])
+        starts = _relaxation(network, tspan, params, y0, starts)
+    nit = 0
+    success = False
+    for y_start in starts:
+        x, success, n = _newton(func, y_start[ind], tol, maxiter)
+        nit += n
+        y = laws.full(x, totals)
+        if success and np.min(y) >= -floor:
+            break
+        success = False
+    if success:
+        message = 'Converged to a steady state'
+    else:
+        message = 'Newton iterations did not converge to a steady state'
+    eigenvalues = scipy.linalg.eigvals(func(x)[1])
+    return scipy.optimize.OptimizeResult(
+        y=y, eigenvalues=eigenvalues, stable=_is_stable(eigenvalues),
+        success=success, message=message, nit=nit)
+
+def _relaxation(network, tspan, params, y0, starts):
+    """Lazily yield the starting points, then the states reached by
+    integrating the ODEs to each time in `tspan` after the first."""
+    for y in starts:
+        yield y
+    solver = Solver(network, tspan, rtol=1e-8, atol=1e-8)
+    solver.run(params, y0=y0)
+    for y in solver.y[1:]:
+        yield y
+
+def _is_stable(eigenvalues):
+    return bool(len(eigenvalues) == 0 or np.max(eigenvalues.real) < 0)
+
+def continuation(model, parameter, stop, param_values=None, y0=None, ds=0.01,
+                 ds_max=0.05, ds_min=1e-8, max_steps=2000, tol=1e-9,
+                 laws=None):
+    """Follow the steady states of a model as a parameter varies.
+
+    The curve of steady states is followed by pseudo-arclength continuation
+    from the steady state at the current value of the parameter until the
+    parameter leaves the interval between its starting value and `stop`.
+    The species amounts and the parameter are scaled for the continuation
+    (the amounts by their largest conserved total, and the parameter by the
+    length of the interval), and the arclength steps are measured in these
+    scaled units.
+
+    Parameters
+    ----------
+    model : pysb.core.Model or earm.network.Network
+        The model.
+    parameter : string
+        Name of the continuation parameter. It may be a rate parameter or the
+        initial amount of one or more species, whose conserved totals then
+        change with it.
+    stop : float
+        Final value of the parameter.
+    param_values : vector-like or dict, optional
+        Parameter values, including the starting value of `parameter`
+        (see :py:meth:`earm.network.Network.param_vector`).
+    y0 : vector-like, optional
+        Initial species amounts at the starting value of the parameter, from
+        which the first steady state is found. Defaults to the initial
+        conditions of the model.
+    ds, ds_max, ds_min : float, optional
+        Initial, largest and smallest arclength steps. The step grows when
+        the corrector converges quickly and is halved when it fails; the
+        continuation stops if it falls below `ds_min`.
+    max_steps : int, optional
+        Maximum number of continuation steps.
+    tol : float, optional
+        Tolerance of the Newton corrector, in scaled units.
+    laws : ConservationLaws, optional
+        The conservation laws of the network, if already known.
+
+    Returns
+    -------
+    scipy.optimize.OptimizeResult
+        With attributes
+
+        - ``p``: the values of the parameter along the curve;
+        - ``y``: the steady states, with shape ``(len(p), n_species)``;
+        - ``stable``: whether each steady state is stable;
+        - ``folds``: the indices of the fold points in ``p`` and ``y``;
+        - ``stable_branches``: a list of index arrays, one for each run of
+          consecutive stable steady states;
+        - ``success``, ``message`` and ``nsteps``.
+    """
+    network = Network.of(model)
+    if laws is None:
+        laws = ConservationLaws(network)
+    try:
+        pi = network.parameter_names.index(parameter)
+    except ValueError:
+        raise ValueError("Unknown parameter '%s'" % parameter)
+    params = network.param_vector(param_values).copy()
+    p0 = params[pi]
+    if stop == p0:
+        raise ValueError("stop must differ from the starting value of %s" %
+                         parameter)
+    first = steady_state(network, params, y0=y0, laws=laws)
+    if not first.success:
+        raise RuntimeError("No steady state found at %s = %g: %s" %
+                           (parameter, p0, first.message))
+    if y0 is None:
+        y0 = network.initial_values(params)
+    y0 = np.asarray(y0, dtype=float)
+    # Initial amounts that are set by the parameter move with it
+    direction = np.zeros(network.n_species)
+    for si, param_index in network.initial_conditions:
+        if param_index == pi:
+            direction[si] = 1
+    totals0 = laws.totals(y0)
+    dtotals = laws.totals(direction)
+    ind, dep = laws.independent, laws.dependent
+    sy = max(np.max(np.abs(totals0), initial=0),
+             np.max(np.abs(totals0 + dtotals * (stop - p0)), initial=0),
+             np.max(np.abs(first.y)), 1e-300)
+    sp = stop - p0
+    stoichiometry = network.stoichiometry
+
+    def state(z):
+        p = p0 + z[-1] * sp
+        params[pi] = p
+        totals = totals0 + dtotals * (p - p0)
+        return p, laws.full(z[:-1] * sy, totals)
+
+    def system(z):
+        """Scaled residual and its Jacobian with respect to z."""
+        p, y = state(z)
+        k = network.rate_constants(params)
+        dk = network.rate_constants_jacobian(params)[:, pi]
+        jac = network.jacobian_dense(0.0, y, k)
+        dfdp = (np.dot(stoichiometry,
+                       network.reaction_rates(y, np.ones_like(k)) * dk) +
+                np.dot(jac[:, dep], dtotals))
+        a = np.empty((len(ind), len(ind) + 1))
+        a[:, :-1] = laws.reduce_jacobian(jac)
+        a[:, -1] = dfdp[ind] * sp / sy
+        return network.rhs(0.0, y, k)[ind] / sy, a
+
+    def tangent(a, previous):
+        bordered = np.vstack([a, previous])
+        rhs = np.zeros(len(previous))
+        rhs[-1] = 1
+        t = scipy.linalg.solve(bordered, rhs)
+        return t / np.linalg.norm(t)
+
+    def correct(z_pred, t):
+        """Newton on the residual plus the hyperplane orthogonal to t."""
+        z = z_pred.copy()
+        for nit in range(1, 11):
+            g, a = system(z)
+            res = np.append(g, np.dot(t, z - z_pred))
+            try:
+                dz = -scipy.linalg.solve(np.vstack([a, t]), res)
+            except (scipy.linalg.LinAlgError, ValueError):
+                return None, a, nit
+            if not np.all(np.isfinite(dz)):
+                return None, a, nit
+            z += dz
+            if np.max(np.abs(dz)) <= tol:
+                return z, system(z)[1], nit
+        return None, a, nit
+
+    def record(z, a):
+        p, y = state(z)
+        eigenvalues = scipy.linalg.eigvals(a[:, :-1])
+        ps.append(p)
+        ys.append(y)
+        stable.append(_is_stable(eigenvalues))
+
+    z = np.append(first.y[ind] / sy, 0.0)
+    a = system(z)[1]
+    e_p = np.zeros(len(z))
+    e_p[-1] = 1
+    t = tangent(a, e_p)
+    ps, ys, stable, folds = [], [], [], []
+    record(z, a)
+    success = False
+    message = 'Maximum number of steps reached'
+    nsteps = 0
+    while nsteps < max_steps:
+        z_new, a_new, nit = correct(z + ds * t, t)
+        if z_new is None:
+            ds /= 2
+            if ds < ds_min:
+                message = 'Step size fell below ds_min'
+                break
+            continue
+        nsteps += 1
+        t_new = tangent(a_new, t)
+        if t_new[-1] * t[-1] < 0:
+            # Fold: bisect on the step for a zero parameter component of the
+            # tangent, starting from the last point
+            lo, hi = 0.0, ds
+            z_fold, a_fold = z_new, a_new
+            for _ in range(40):
+                h = (lo + hi) / 2
+                z_h, a_h, _ = correct(z + h * t, t)
+                if z_h is None:
+                    break
+                z_fold, a_fold = z_h, a_h
+                if tangent(a_h, t)[-1] * t[-1] > 0:
+                    lo = h
+                else:
+                    hi = h
+            folds.append(len(ps))
+            record(z_fold, a_fold)
+        q = z_new[-1]
+        if q > 1 or q < 0:
+            # Left the interval: end on its boundary
+            bound = 1.0 if q > 1 else 0.0
+            h = (bound - z[-1]) / (z_new[-1] - z[-1])
+            z_end = z + h * (z_new - z)
+
+            def fixed(x):
+                g, a = system(np.append(x, bound))
+                return g, a[:, :-1]
+
+            x, converged, _ = _newton(fixed, z_end[:-1], tol, 20)
+            if converged:
+                z_end = np.append(x, bound)
+                record(z_end, system(z_end)[1])
+            success = True
+            message = 'Reached the end of the parameter interval'
+            break
+        record(z_new, a_new)
+        z, t = z_new, t_new
+        if nit <= 3:
+            ds = min(ds * 1.5, ds_max)
+
+    stable = np.array(stable, dtype=bool)
+    breaks = np.flatnonzero(np.diff(stable.astype(int))) + 1
+    stable_branches = [run for run in np.split(np.arange(len(stable)), breaks)
+                       if len(run) and stable[run[0]]]
+    return scipy.optimize.OptimizeResult(
+        p=np.array(ps), y=np.array(ys).reshape(-1, network.n_species),
+        stable=stable, folds=np.array(folds, dtype=int),
+        stable_branches=stable_branches, success=success, message=message,
+        nsteps=nsteps)
+
+def dose_response(model, doses, dose_params, param_values=None,
+                  method='newton', tmax=5e4, tol=1e-8, laws=None):
+    """Return the steady states of a model over a range of doses.
+
+    The doses are visited in increasing order, and the solve for each dose
+    starts from the steady state of the previous one, shifted by the change
+    in the initial amounts so that the conserved totals are those of the new
+    dose (each dose starts from the initial amounts of the model if the
+    shift would make an amount negative). Neighboring doses have close
+    steady states, so a warm-started solve takes a few Newton iterations, or
+    a short integration. Like a slow ramp of the dose, the sweep follows the
+    branch of steady states it started on: where the model is bistable, it
+    may differ from the steady state reached from the initial amounts.
+
+    Parameters
+    ----------
+    model : pysb.core.Model or earm.network.Network
+        The model.
+    doses : vector-like
+        The doses, in any order.
+    dose_params : callable
+        ``dose_params(dose)`` returns a dict of parameter values for a dose,
+        which override those in `param_values`.
+    param_values : vector-like or dict, optional
+        Parameter values common to all doses (see
+        :py:meth:`earm.network.Network.param_vector`).
+    method : 'newton' or 'integrate', optional
+        With ``'newton'`` (default), the steady state is solved for with
+        :py:func:`steady_state` (which falls back on integration when Newton
+        does not converge). With ``'integrate'``, the ODEs are integrated
+        from the warm start, at time points that double from 10 up to
+        `tmax`, until the change of the amounts between two time points is
+        below `tol` (relative to the amounts, plus `tol` times the largest
+        amount).
+    tmax : float, optional
+        Longest integration time with ``'integrate'``.
+    tol : float, optional
+        Relative tolerance of the steady states.
+    laws : ConservationLaws, optional
+        The conservation laws of the network, if already known.
+
+    Returns
+    -------
+    scipy.optimize.OptimizeResult
+        With attributes ``y``, the steady states with shape
+        ``(len(doses), n_species)`` in the order of `doses`, and ``success``,
+        a boolean array that is False for the doses at which the solve did
+        not converge (by `tmax` with ``'integrate'``).
+    """
+    if method not in ('newton', 'integrate'):
+        raise ValueError("Unknown method '%s'; must be 'newton' or "
+                         "'integrate'" % method)
+    network = Network.of(model)
+    if method == 'newton' and laws is None:
+        laws = ConservationLaws(network)
+    doses = np.asarray(doses, dtype=float)
+    base = network.param_vector(param_values)
+    y = np.empty((len(doses), network.n_species))
+    success = np.zeros(len(doses), dtype=bool)
+    if method == 'integrate':
+        tspan = [0.0]
+        while tspan[-1] < tmax:
+            tspan.append(min(10.0 * 2 ** (len(tspan) - 1), tmax))
+        solver = Solver(network, tspan, rtol=tol, atol=tol)
+    previous = None
+    for i in np.argsort(doses, kind='mergesort'):
+        params = base.copy()
+        for name, value in dose_params(doses[i]).items():
+            params[network.parameter_names.index(name)] = value
+        y0 = network.initial_values(params)
+        start = y0
+        if previous is not None:
+            shifted = previous[0] + (y0 - previous[1])
+            if np.min(shifted) >= 0:
+                start = shifted
+        if method == 'newton':
+            result = steady_state(network, params, y0=start, tol=tol,
+                                  laws=laws)
+            y[i], success[i] = result.y, result.success
+        else:
+            converged = []
+
+            def stop(j, yj):
+                change = np.abs(yj - solver.y[j - 1])
+                if np.all(change <= tol * (np.abs(yj) + np.max(yj))):
+                    converged.append(j)
+                    return True
+                return False
+
+            solver.run(params, y0=start, stop=stop)
+            last = converged[0] if converged else len(tspan) - 1
+            y[i], success[i] = solver.y[last], bool(converged)
+        previous = y[i], y0
+    return scipy.optimize.OptimizeResult(y=y, success=success)
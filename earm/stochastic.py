@@ -0,0 +1,485 @@
+"""
+Exact stochastic simulation of the reaction network of an EARM model.
+
+All of the EARM models are parameterized in numbers of molecules per cell
+(see :py:data:`earm.shared.V`, with which 1 nM is 1000 molecules), so their
+networks can be simulated stochastically as they are: the rate constants of
+the ODEs are the stochastic rate constants of the reactions. A reaction with
+rate constant k has the propensity k * x_a * x_b * ..., the product of the
+numbers of molecules of its reactants, except that a species that appears m
+times among the reactants contributes x (x - 1) ... (x - m + 1), as the
+symmetry factor 1/m! is already included in k by BioNetGen.
+
+:py:class:`StochasticSolver` samples trajectories exactly with the next
+reaction method of [Gibson2000]_. Each reaction has a putative time of
+firing, and the times are kept in an indexed priority queue (a binary heap
+with the position of every reaction in it), so the next reaction is found in
+constant time. When a reaction fires, only the propensities of the reactions
+that depend on it are recomputed: the *dependency graph* of the network
+gives, for each reaction, the reactions that have one of the species it
+changes among their reactants. The times of the dependent reactions are
+rescaled to their new propensities rather than drawn again, so one random
+number is used per event, and the heap is updated at a cost logarithmic in
+the number of reactions. As for the ODE functions of
+:py:class:`earm.network.Network`, Python code that fires each reaction and
+updates the propensities that depend on it is generated and compiled once
+per model.
+
+Exact simulation fires every reaction, which is prohibitively slow for the
+full models, with their hundreds of thousands of molecules of PARP,
+cytochrome c and Smac. :py:class:`HybridSolver` only fires the slow
+reactions exactly, and integrates the fast ones as ODEs.
+"""
+
+from __future__ import division
+
+import itertools
+
+import numpy as np
+import scipy.integrate
+
+from earm.network import Network
+
+def _compile_functions(source, names, filename):
+    """Compile module-level source code and return the named objects."""
+    namespace = {}
+    exec(compile(source, filename, 'exec'), namespace)
+    return [namespace[name] for name in names]
+
+def _output_arrays(network, n_times):
+    """Return the species and observable arrays of a solver (``y``,
+    ``yobs`` and ``yobs_view``)."""
+    y = np.ndarray((n_times, network.n_species))
+    if network.n_observables:
+        yobs = np.ndarray(n_times, list(zip(network.observable_names,
+                                            itertools.repeat(float))))
+    else:
+        yobs = np.ndarray((n_times, 0))
+    return y, yobs, yobs.view(float).reshape(n_times, -1)
+
+def _initial_amounts(network, param_values, y0):
+    """Return the parameter vector and the initial amounts of a run, rounded
+    to whole numbers of molecules."""
+    param_values = network.param_vector(param_values)
+    if y0 is None:
+        y0 = network.initial_values(param_values)
+    else:
+        y0 = np.array(y0, dtype=float)
+        if y0.shape != (network.n_species,):
+            raise ValueError("y0 must be the same length as model.species")
+    return param_values, np.rint(y0)
+
+def _propensity(j, reactants):
+    """Format the propensity of reaction j as a code fragment."""
+    factors = ['k[%d]' % j]
+    for i in sorted(set(reactants)):
+        factors.append('y[%d]' % i)
+        for m in range(1, reactants.count(i)):
+            factors.append('(y[%d] - %d)' % (i, m))
+    return '*'.join(factors)
+
+class StochasticSolver(object):
+    """Simulate a model with the exact stochastic simulation algorithm.
+
+    Parameters
+    ----------
+    model : pysb.core.Model or earm.network.Network
+        The model to simulate. Passing a Network that has already been built
+        avoids generating the network of the model again.
+    tspan : vector-like
+        Time values at which the species amounts are returned. The first
+        value is the initial time.
+    seed : int, optional
+        Seed of the random number generator. Successive runs draw from the
+        same generator, so they give independent trajectories.
+
+    Attributes
+    ----------
+    network : earm.network.Network
+        The network of the model.
+    dependents : list of lists of int
+        The dependency graph: the reactions whose propensities change when
+        each reaction fires (including the reaction itself).
+    y : numpy.ndarray
+        Species trajectories of the last run (numbers of molecules), with
+        shape ``(len(tspan), n_species)``.
+    yobs : numpy.ndarray with record-style data-type
+        Observable trajectories, with fields named after the observables.
+    yobs_view : numpy.ndarray
+        An array view on ``yobs`` with shape ``(len(tspan), n_observables)``.
+    n_events : int
+        Number of reactions fired in the last run.
+    """
+
+    def __init__(self, model, tspan, seed=None):
+        self.network = Network.of(model)
+        self.model = self.network.model
+        self.tspan = np.asarray(tspan, dtype=float)
+        self.random = np.random.RandomState(seed)
+
+        network = self.network
+        n_species = network.n_species
+        self.y, self.yobs, self.yobs_view = _output_arrays(network,
+                                                           len(self.tspan))
+        self.n_events = 0
+
+        consumers = [[] for i in range(n_species)]
+        for j, reactants in enumerate(network.reactants):
+            for i in set(reactants):
+                consumers[i].append(j)
+        self.dependents = []
+        for j in range(network.n_reactions):
+            changed = np.flatnonzero(network.stoichiometry[:, j])
+            dependents = set([j])
+            for i in changed:
+                dependents.update(consumers[i])
+            self.dependents.append(sorted(dependents))
+        self._generate_code()
+
+    def _generate_code(self):
+        network = self.network
+        lines = ['def propensities(y, k):',
+                 '    return [%s]' % ', '.join(
+                     _propensity(j, reactants)
+                     for j, reactants in enumerate(network.reactants))]
+        # One function per reaction, which fires the reaction and updates
+        # the propensities of its dependents
+        for j in range(network.n_reactions):
+            lines.append('def fire_%d(y, a, k):' % j)
+            for i in np.flatnonzero(network.stoichiometry[:, j]):
+                change = int(round(network.stoichiometry[i, j]))
+                lines.append('    y[%d] %s= %d' % (
+                    i, '+' if change > 0 else '-', abs(change)))
+            for d in self.dependents[j]:
+                lines.append('    a[%d] = %s' % (
+                    d, _propensity(d, network.reactants[d])))
+        lines.append('fire = [%s]' % ', '.join(
+            'fire_%d' % j for j in range(network.n_reactions)))
+        self._propensities, self._fire = _compile_functions(
+            '\n'.join(lines), ['propensities', 'fire'],
+            '<%s stochastic>' % self.model.name)
+
+    def run(self, param_values=None, y0=None):
+        """Simulate one trajectory.
+
+        Returns nothing; access the StochasticSolver object's ``y``,
+        ``yobs``, or ``yobs_view`` attributes to retrieve the results.
+
+        Parameters
+        ----------
+        param_values : vector-like or dictionary, optional
+            Parameter values, as for :py:meth:`earm.integrate.Solver.run`.
+        y0 : vector-like, optional
+            Initial amounts of all species, in the order of model.species,
+            rounded to whole numbers of molecules. If not specified, they are
+            taken from the initial conditions of the model.
+        """
+        network = self.network
+        param_values, y0 = _initial_amounts(network, param_values, y0)
+        y = [int(v) for v in y0]
+        k = network.rate_constants(param_values).tolist()
+        a = self._propensities(y, k)
+        fire, dependents = self._fire, self.dependents
+        tspan = self.tspan.tolist()
+        inf = float('inf')
+
+        # Exponential random numbers are drawn in blocks
+        block = self.random.standard_exponential(4096).tolist()
+        b = 0
+        t = tspan[0]
+        tau = []
+        for aj in a:
+            tau.append(t + block[b] / aj if aj > 0 else inf)
+            b += 1
+            if b == len(block):
+                block = self.random.standard_exponential(4096).tolist()
+                b = 0
+
+        # Indexed binary heap of the reactions, ordered by their times
+        heap = sorted(range(len(a)), key=tau.__getitem__)
+        pos = [0] * len(a)
+        for p, j in enumerate(heap):
+            pos[j] = p
+        size = len(heap)
+
+        def update(d, time):
+            """Set the time of reaction d and restore the heap order."""
+            tau[d] = time
+            p = pos[d]
+            while p > 0:
+                parent = (p - 1) >> 1
+                other = heap[parent]
+                if tau[other] <= time:
+                    break
+                heap[p] = other
+                pos[other] = p
+                p = parent
+            while True:
+                child = 2 * p + 1
+                if child >= size:
+                    break
+                if child + 1 < size and tau[heap[child + 1]] < tau[heap[child]]:
+                    child += 1
+                other = heap[child]
+                if tau[other] >= time:
+                    break
+                heap[p] = other
+                pos[other] = p
+                p = child
+            heap[p] = d
+            pos[d] = p
+
+        self.y[0] = y
+        out, n_out = 1, len(tspan)
+        n_events = 0
+        while out < n_out:
+            j = heap[0] if size else None
+            t = tau[j] if size else inf
+            while out < n_out and tspan[out] < t:
+                self.y[out] = y
+                out += 1
+            if out == n_out:
+                break
+            deps = dependents[j]
+            old = [a[d] for d in deps]
+            fire[j](y, a, k)
+            n_events += 1
+            for d, a_old in zip(deps, old):
+                a_new = a[d]
+                if d != j and a_new == a_old:
+                    continue
+                if a_new == 0:
+                    time = inf
+                elif d == j or a_old == 0:
+                    time = t + block[b] / a_new
+                    b += 1
+                    if b == len(block):
+                        block = self.random.standard_exponential(4096).tolist()
+                        b = 0
+                else:
+                    time = t + a_old / a_new * (tau[d] - t)
+                update(d, time)
+        self.n_events = n_events
+        self.yobs_view[:] = network.observables(self.y)
+
+class HybridSolver(object):
+    """Simulate a model with a hybrid of the exact stochastic simulation
+    algorithm and the ODEs.
+
+    The reactions are partitioned into fast and slow ones by their
+    propensities [Haseltine2002]_: reactions that fire at least
+    `fast_propensity` times per unit time, which are those of the abundant
+    species (such as PARP, cytochrome c and Smac), are integrated as ODEs by
+    the BDF method of :py:func:`scipy.integrate.solve_ivp`, and the others,
+    such as the ligation of the few hundred receptors, fire one by one as in
+    the exact algorithm. The integral of the total propensity of the slow
+    reactions along the ODE solution is accumulated until it reaches an
+    exponential random number, at which time one of them fires, chosen in
+    proportion to its propensity [Salis2005]_. Slow reactions only consume
+    whole molecules: their propensities are those of the amounts rounded
+    down. The partition is revised after every slow reaction and at every
+    output time, when the amounts of the species that take part in no fast
+    reaction are rounded to whole molecules. After a slow reaction, the
+    integration continues at the step size and order it had reached, so the
+    cost of a run grows with the number of slow reactions, which
+    `fast_propensity` controls: with it set to zero, this is the ODE model,
+    and with it set to infinity, the exact algorithm.
+
+    Parameters
+    ----------
+    model : pysb.core.Model or earm.network.Network
+        The model to simulate.
+    tspan : vector-like
+        Time values at which the species amounts are returned. The first
+        value is the initial time.
+    fast_propensity : float, optional
+        Smallest propensity (in reactions per unit time) of a fast reaction.
+    rtol, atol : float, optional
+        Tolerances of the ODE integrator (`atol` is in molecules).
+    seed : int, optional
+        Seed of the random number generator.
+
+    Attributes
+    ----------
+    network : earm.network.Network
+        The network of the model.
+    y : numpy.ndarray
+        Species trajectories of the last run, with shape
+        ``(len(tspan), n_species)``. The amounts of species in fast reactions
+        need not be whole numbers.
+    yobs : numpy.ndarray with record-style data-type
+        Observable trajectories, with fields named after the observables.
+    yobs_view : numpy.ndarray
+        An array view on ``yobs`` with shape ``(len(tspan), n_observables)``.
+    n_events : int
+        Number of slow reactions fired in the last run.
+    fast : numpy.ndarray of bool
+        The fast reactions at the end of the last run.
+    """
+
+    def __init__(self, model, tspan, fast_propensity=0.1, rtol=1e-3, atol=0.1,
+                 seed=None):
+        self.network = Network.of(model)
+        self.model = self.network.model
+        self.tspan = np.asarray(tspan, dtype=float)
+        self.fast_propensity = fast_propensity
+        self.rtol = rtol
+        self.atol = atol
+        self.random = np.random.RandomState(seed)
+
+        network = self.network
+        self.y, self.yobs, self.yobs_view = _output_arrays(network,
+                                                           len(self.tspan))
+        self.n_events = 0
+        self.fast = np.zeros(network.n_reactions, bool)
+        self._changes = network.stoichiometry.T.copy()
+        self._changed = self._changes != 0
+        self._propensities, = _compile_functions(
+            'def propensities(y, k):\n    return [%s]' % ', '.join(
+                _propensity(j, reactants)
+                for j, reactants in enumerate(network.reactants)),
+            ['propensities'], '<%s hybrid>' % self.model.name)
+
+    def _whole_propensities(self, y, k):
+        """Return the propensities of the reactions at amounts y rounded down
+        to whole molecules."""
+        return self._propensities(np.floor(np.maximum(y, 0)).tolist(), k)
+
+    def _fire(self, y, a):
+        """Fire a slow reaction chosen in proportion to its propensity a, if
+        any can fire, and return whether one did."""
+        c = np.cumsum(a)
+        if c[-1] == 0:
+            return False
+        j = np.searchsorted(c, self.random.uniform() * c[-1], 'right')
+        y += self._changes[j]
+        np.maximum(y, 0, out=y)
+        return True
+
+    def run(self, param_values=None, y0=None):
+        """Simulate one trajectory.
+
+        Returns nothing; access the HybridSolver object's ``y``, ``yobs``, or
+        ``yobs_view`` attributes to retrieve the results.
+
+        Parameters
+        ----------
+        param_values : vector-like or dictionary, optional
+            Parameter values, as for :py:meth:`earm.integrate.Solver.run`.
+        y0 : vector-like, optional
+            Initial amounts of all species, in the order of model.species,
+            rounded to whole numbers of molecules. If not specified, they are
+            taken from the initial conditions of the model.
+        """
+        network = self.network
+        param_values, y = _initial_amounts(network, param_values, y0)
+        k = network.rate_constants(param_values)
+        tspan = self.tspan
+        propensities = self._propensities
+        k_fast = np.zeros_like(k)
+        jac = np.zeros((network.n_species, network.n_species))
+        fast = np.zeros(network.n_reactions, bool)
+
+        t = tspan[0]
+        self.y[0] = y
+        out, n_out = 1, len(tspan)
+        n_events = 0
+        bdf = sol = None
+        while out < n_out:
+            a = np.array(propensities(y.tolist(), k))
+            fast_old, fast = fast, a >= self.fast_propensity
+            discrete = ~self._changed[fast].any(axis=0)
+            y[discrete] = np.rint(y[discrete])
+            a = np.where(fast, 0, self._whole_propensities(y, k))
+            k_slow = np.where(fast, 0, k).tolist()
+            threshold = self.random.standard_exponential()
+
+            if not fast.any():
+                # Only slow reactions: the propensities are constant until
+                # the next one fires
+                a0 = a.sum()
+                t_next = t + threshold / a0 if a0 > 0 else np.inf
+                while out < n_out and tspan[out] < t_next:
+                    self.y[out] = y
+                    out += 1
+                if out < n_out:
+                    t = t_next
+                    n_events += self._fire(y, a)
+                continue
+
+            if bdf is None:
+                k_fast[:] = np.where(fast, k, 0)
+                bdf = _HybridBDF(
+                    lambda t, y: network.rhs(t, y, k_fast), t, y, tspan[out],
+                    jac=lambda t, y: network.jacobian_dense(t, y, k_fast, jac),
+                    rtol=self.rtol, atol=self.atol)
+            elif np.array_equal(fast, fast_old):
+                bdf.restart(t, y, tspan[out], sol)
+            else:
+                k_fast[:] = np.where(fast, k, 0)
+                bdf.restart(t, y, tspan[out])
+            hazard = 0.0
+            a0 = a.sum()
+            while True:
+                message = bdf.step()
+                if bdf.status == 'failed':
+                    raise RuntimeError(message)
+                t0, t1 = bdf.t_old, bdf.t
+                sol = bdf.dense_output()
+                # Integral of the total slow propensity over the step, by
+                # Simpson's rule
+                am = sum(self._whole_propensities(sol(0.5 * (t0 + t1)),
+                                                  k_slow))
+                a1 = sum(self._whole_propensities(bdf.y, k_slow))
+                step = (t1 - t0) / 6 * (a0 + 4 * am + a1)
+                if hazard + step >= threshold:
+                    t = t0 + (threshold - hazard) / step * (t1 - t0)
+                    y = sol(t)
+                    n_events += self._fire(
+                        y, np.array(self._whole_propensities(y, k_slow)))
+                    break
+                hazard += step
+                a0 = a1
+                if bdf.status == 'finished':
+                    t = t1
+                    y = bdf.y.copy()
+                    self.y[out] = y
+                    out += 1
+                    break
+        self.n_events = n_events
+        self.fast = fast
+        self.yobs_view[:] = network.observables(self.y)
+
+class _HybridBDF(scipy.integrate.BDF):
+    """The BDF method, which can be restarted after a discontinuous change of
+    the state without starting again from a small first step."""
+
+    def restart(self, t, y, t_bound, sol=None):
+        """Continue the integration from time `t`, at which the state is
+        changed to `y`, up to `t_bound`.
+
+        If `sol`, the interpolant of a step that contains `t`, is given, the
+        differences of the solution are taken from it at the current step
+        size and order, as if the step had ended at `t`; otherwise (if the
+        equations have changed) the method starts again at order 1.
+        """
+        D = self.D
+        h = self.h_abs * self.direction
+        if sol is None:
+            self.order = 1
+            D[1] = self.fun(t, y) * h
+        else:
+            values = sol(t - h * np.arange(self.order + 1)).T
+            for j in range(1, self.order + 1):
+                values = values[:-1] - values[1:]
+                D[j] = values[0]
+        D[0] = y
+        D[self.order + 1:] = 0
+        self.t = t
+        self.y = y.copy()
+        self.t_bound = t_bound
+        self.status = 'running'
+        self.n_equal_steps = 0
+        if sol is None:
+            self.J = self.jac(t, y)
+        self.LU = None
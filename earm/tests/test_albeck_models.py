@@ -29,6 +29,7 @@ from earm.mito import albeck_11c
 from earm.mito import albeck_11d
 from earm.mito import albeck_11e
 from earm.mito import albeck_11f
+from earm.mito.albeck_figures import add_caspase8
 
 from matplotlib.pyplot import figure, ion, plot, legend
 import numpy as np
@@ -37,68 +38,6 @@ import os.path
 # The default integration tolerance in pysb.integrate
 rtol = 1e-6
 
-def add_caspase8(model):
-    """Add the reaction C8 + Bid <-> C8:Bid -> C8 + tBid.
-
-    All of the MOMP sub-models in this model repository have been written
-    to have tBid as their upstream "interface," and Smac/Cytochrome C release
-    as their downstream "interface." However, in the original publication
-    [Albeck2008]_, the authors incorporated the additional upstream
-    step of Bid cleavage by caspase 8 into all of the sub-models that they
-    explored.
-
-    Therefore, to match the output of the PySB models in this repository to
-    the output produced by the original MATLAB models, it is necessary to add
-    the upstream caspase-8:Bid reactions.
-
-    This function takes a model object and adds the necessary elements:
-
-    - Caspase-8 Monomer 
-    - Caspase-8 initial condition
-    - Caspase-8/Bid cleavage reaction and associated parameters
-
-    In addition, since in the original publication the plotted figures
-    considered Smac release kinetics in the absence of Cytochrome C release,
-    this function sets the Cytochrome C initial condition to 0 (this prevents
-    Cytochrome C from competing with Smac for pore transport, which affects
-    the observed Smac release kinetics slightly).
-    """
-
-    # If not already added, add upstream caspase reactions to model
-    if model.monomers.get('C8') is None:
-        Bid = model.monomers.get('Bid')
-        # Add caspase 8
-        C8 = Monomer('C8', ['state', 'bf'], {'state': ['pro', 'A']},
-                     _export=False)
-        model.add_component(C8)
-
-        # Add caspase 8 initial condition (with placeholder value 1)
-        C8_0 = Parameter('C8_0', 1, _export=False)
-        model.add_component(C8_0)
-        model.initial(C8(state='A', bf=None), C8_0)
-
-        # Add rules C8 + Bid <-> C8:Bid -> Bid + C8*
-        kf = Parameter('bind_C8A_BidU_to_C8ABidU_kf', 1e-7, _export=False)
-        kr = Parameter('bind_C8A_BidU_to_C8ABidU_kr', 1e-3, _export=False)
-        kc = Parameter('catalyze_C8ABidU_to_C8A_BidT_kc', 1, _export=False)
-        model.add_component(kf)
-        model.add_component(kr)
-        model.add_component(kc)
-
-        rb = Rule('bind_C8A_BidU_to_C8ABidU',
-             C8(state='A', bf=None) + Bid(state='U', bf=None) <>
-             C8(state='A', bf=1) % Bid(state='U', bf=1),
-             kf, kr, _export=False)
-        rc = Rule('catalyze_C8ABidU_to_C8A_BidT',
-             C8(state='A', bf=1) % Bid(state='U', bf=1) >>
-             C8(state='A', bf=None) + Bid(state='T', bf=None),
-             kc, _export=False)
-        model.add_component(rb)
-        model.add_component(rc)
-
-    # Set CytoC to 0 so transport is only of Smac
-    model.parameters['CytoC_0'].value = 0
-
 def run_figure_sim(model):
     """Run the C8 dose-response series shown in Fig. 11 of [Albeck2008]_.
 
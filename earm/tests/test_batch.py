@@ -0,0 +1,67 @@
+"""
+Tests for the batched simulator in :py:mod:`earm.batch`, which is checked
+against one-at-a-time integrations with :py:class:`earm.integrate.Solver`.
+"""
+
+import unittest
+
+import numpy as np
+
+from earm import models
+from earm.batch import BatchSolver, run_parallel
+from earm.integrate import Solver
+
+class TestBatchSolver(unittest.TestCase):
+    def setUp(self):
+        self.model = models.get('lopez_embedded')
+        self.tspan = np.linspace(0, 20000, 101)
+        self.solver = BatchSolver(self.model, self.tspan, rtol=1e-7,
+                                  atol=1e-7, batch_size=3)
+
+    def test_matches_solver(self):
+        """Each system reproduces a separate integration of its parameters."""
+        network = self.solver.network
+        random = np.random.RandomState(1)
+        params = (np.tile(network.param_vector(), (4, 1)) *
+                  random.lognormal(0, 0.2, (4, network.n_parameters)))
+        yobs = self.solver.run(params)
+        self.assertEqual(yobs.shape, (4, len(self.tspan),
+                                      network.n_observables))
+        single = Solver(network, self.tspan, rtol=1e-8, atol=1e-8)
+        for i, p in enumerate(params):
+            single.run(p)
+            scale = np.abs(single.yobs_view).max(axis=0)
+            self.assertTrue(np.allclose(yobs[i], single.yobs_view,
+                                        atol=1e-3 * scale.max()),
+                            "system %d differs" % i)
+
+    def test_param_values_dict(self):
+        """A dict of per-system values overrides single parameters."""
+        yobs = self.solver.run({'PARP_0': [0, 1e6]})
+        self.assertEqual(yobs.shape[0], 2)
+        index = self.solver.network.observable_names.index('cPARP')
+        self.assertTrue(np.all(yobs[0, :, index] == 0))
+        self.assertTrue(yobs[1, -1, index] > 0)
+
+    def test_y0(self):
+        """Initial conditions can be given for each system."""
+        network = self.solver.network
+        y0 = np.tile(network.initial_values(network.param_vector()), (2, 1))
+        y0[1] = 0
+        self.solver.save_species = True
+        self.solver.run(y0=y0)
+        self.assertTrue(np.all(self.solver.y[1] == 0))
+        self.assertTrue(np.allclose(self.solver.y[0, 0], y0[0]))
+
+    def test_run_parallel(self):
+        """Systems split among processes give the same trajectories."""
+        params = self.solver.param_matrix({'L_0': [1000, 2000, 3000, 4000]})
+        serial = self.solver.run(params)
+        parallel = run_parallel(self.solver, params, 2)
+        self.assertTrue(np.allclose(parallel, serial, rtol=1e-5, atol=1e-3))
+
+    def test_bad_shape(self):
+        self.assertRaises(ValueError, self.solver.run, np.ones((2, 3)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+"""
+Tests for the benchmarks in :py:mod:`earm.benchmark`.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from earm import benchmark
+
+class TestBenchmark(unittest.TestCase):
+    def test_run(self):
+        """The benchmarks that apply to a model are timed."""
+        report = benchmark.run(['mito.albeck_11b'], repeat=1)
+        self.assertEqual([r['benchmark'] for r in report['results']],
+                         ['generate', 'simulate', 'ssa', 'dose_sweep'])
+        self.assertTrue(all(r['time'] > 0 for r in report['results']))
+        self.assertTrue(report['results'][2]['n_events'] > 0)
+        self.assertEqual(report['machine']['python'].split('.')[0], '2')
+        self.assertRaises(ValueError, benchmark.run, ['mito.albeck_11b'],
+                          ['odesolve'])
+
+    def test_save_compare(self):
+        """Saved reports can be compared, largest slowdowns first."""
+        old = {'machine': benchmark.machine_info(), 'repeat': 1,
+               'results': [{'model': 'howells', 'benchmark': 'simulate',
+                            'time': 1.0},
+                           {'model': 'howells', 'benchmark': 'ssa',
+                            'time': 2.0}]}
+        new = {'machine': old['machine'], 'repeat': 1,
+               'results': [{'model': 'howells', 'benchmark': 'simulate',
+                            'time': 3.0},
+                           {'model': 'howells', 'benchmark': 'ssa',
+                            'time': 1.0},
+                           {'model': 'cui_direct', 'benchmark': 'ssa',
+                            'time': 1.0}]}
+        directory = tempfile.mkdtemp()
+        try:
+            path = benchmark.save(old, os.path.join(directory, 'old.json'))
+            self.assertEqual(benchmark.load(path), old)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(benchmark.compare(old, new),
+                         [('howells', 'simulate', 1.0, 3.0, 3.0),
+                          ('howells', 'ssa', 2.0, 1.0, 0.5)])
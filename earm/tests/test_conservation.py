@@ -0,0 +1,72 @@
+"""
+Tests for the conservation laws and the reduced system of ODEs in
+:py:mod:`earm.conservation`.
+"""
+
+import unittest
+
+import numpy as np
+
+from earm import models
+from earm.network import Network
+from earm.integrate import Solver
+from earm.conservation import ConservationLaws, ReducedSystem
+
+class TestConservationLaws(unittest.TestCase):
+    def test_laws(self):
+        """The laws span the left null space of the stoichiometry matrix."""
+        network = Network(models.get('chen_biophys_j'))
+        laws = ConservationLaws(network)
+        n = network.stoichiometry
+        self.assertTrue(np.allclose(np.dot(laws.matrix, n), 0))
+        self.assertEqual(laws.n_laws,
+                         network.n_species - np.linalg.matrix_rank(n))
+        self.assertTrue(np.array_equal(laws.matrix[:, laws.dependent],
+                                       np.eye(laws.n_laws)))
+        y = np.random.RandomState(0).uniform(0, 1e4, network.n_species)
+        y2 = laws.full(y[laws.independent], laws.totals(y))
+        self.assertTrue(np.allclose(y2, y))
+
+class TestReducedSystem(unittest.TestCase):
+    def setUp(self):
+        self.network = Network(models.get('lopez_embedded'))
+        self.system = ReducedSystem(self.network)
+        self.k = self.network.rate_constants(self.network.param_vector())
+        self.y = np.random.RandomState(0).uniform(1, 1e4,
+                                                  self.network.n_species)
+
+    def test_functions(self):
+        """The reduced functions are those of the full network restricted to
+        the independent species, by the chain rule."""
+        laws = self.system.laws
+        ind = laws.independent
+        totals = laws.totals(self.y)
+        x = self.y[ind]
+        self.assertTrue(self.system.n_species < self.network.n_species)
+        xdot = self.system.rhs(0, x, self.k, totals)
+        self.assertTrue(np.allclose(
+            xdot, self.network.rhs(0, self.y, self.k)[ind], rtol=1e-12))
+        jac = self.network.jacobian_dense(0, self.y, self.k)
+        expected = laws.reduce_jacobian(jac)
+        self.assertTrue(np.allclose(
+            self.system.jacobian_dense(0, x, self.k, totals), expected,
+            rtol=1e-12))
+        self.assertTrue(np.allclose(
+            self.system.jacobian(0, x, self.k, totals).toarray(), expected,
+            rtol=1e-12))
+
+    def test_solver(self):
+        """Reduced integrations agree with full ones, for every integrator,
+        and keep the totals exactly."""
+        tspan = np.linspace(0, 20000, 101)
+        laws = self.system.laws
+        for options in [{}, {'integrator': 'bdf'}, {'dense_output': True}]:
+            full = Solver(self.network, tspan, **options)
+            full.run()
+            reduced = Solver(self.network, tspan, reduce=True, **options)
+            reduced.run()
+            self.assertTrue(np.allclose(reduced.yobs_view, full.yobs_view,
+                                        rtol=1e-3, atol=1))
+            totals = laws.totals(reduced.y.T).T
+            self.assertTrue(np.allclose(totals, totals[0], rtol=1e-12))
+        self.assertTrue(np.allclose(reduced.solution(tspan), reduced.y))
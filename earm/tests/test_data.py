@@ -0,0 +1,78 @@
+"""
+Tests for the cache of experimental data in :py:mod:`earm.data`, which is
+checked against parsing the source files directly.
+"""
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from earm import data
+
+try:
+    import xlrd
+except ImportError:
+    xlrd = None
+
+class TestData(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_reporters(self):
+        """The cached data equal the CSV file, and are memory-mapped."""
+        path = os.path.join(data.xpdata_dir, 'forfits',
+                            'EC-RP_IMS-RP_IC-RP_data_for_models.csv')
+        expected = np.genfromtxt(path, delimiter=',', names=True)
+        for i in range(2):
+            dataset = data.load('reporters', directory=self.dir)
+            self.assertEqual(dataset.columns, list(expected.dtype.names))
+            for name in dataset.columns:
+                self.assertTrue(np.array_equal(dataset[name], expected[name]))
+        self.assertTrue(isinstance(dataset.array, np.memmap))
+        self.assertEqual(dataset[['Time', 'VAR']].shape, (2, len(expected)))
+        self.assertEqual(dataset.to_records().dtype, expected.dtype)
+
+    def test_invalidation(self):
+        data.load('reporters', directory=self.dir)
+        array_path = os.path.join(self.dir, 'reporters.npy')
+        meta_path = os.path.join(self.dir, 'reporters.json')
+        def edit_meta(edit):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            edit(meta)
+            with open(meta_path, 'w') as f:
+                json.dump(meta, f)
+            # Mark the cached array to tell whether it is rebuilt
+            np.save(array_path, np.zeros((len(meta['columns']), 1)))
+        # A different modification time with the same content is accepted
+        def touch(meta):
+            meta['signature'][1] = 0
+        edit_meta(touch)
+        self.assertEqual(len(data.load('reporters', directory=self.dir)), 1)
+        # A different content is parsed again
+        def change(meta):
+            meta['signature'][1] = 0
+            meta['source']['sha1'] = ''
+        edit_meta(change)
+        self.assertEqual(len(data.load('reporters', directory=self.dir)), 112)
+
+    @unittest.skipIf(xlrd is None, "xlrd is not installed")
+    def test_spreadsheets(self):
+        for name in ('bax_gfp', 'bcl2_gfp', 'bclxl_gfp', 'bid_gfp'):
+            dataset = data.load(name, directory=self.dir)
+            self.assertEqual(len(dataset.columns), 2)
+            self.assertTrue(len(dataset) > 100)
+            self.assertTrue(np.all(np.isfinite(dataset.array)))
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, data.load, 'nonexistent')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+"""
+Tests for the population simulations in :py:mod:`earm.ensemble`.
+"""
+
+import unittest
+
+import numpy as np
+
+from earm import models, ensemble
+from earm.features import timing
+from earm.integrate import Solver
+from earm.network import Network
+
+class TestEnsemble(unittest.TestCase):
+    def setUp(self):
+        self.network = Network(models.get('lopez_embedded'))
+        self.tspan = np.linspace(0, 20000, 201)
+
+    def test_lognormal(self):
+        """The samples have the nominal mean and the given variability."""
+        samples = ensemble.sample_initial_conditions(
+            self.network, 100000, cv={'Bid_0': 0.3, 'Bax_0': 0.1},
+            parameters=['Bid_0', 'Bax_0'], seed=0)
+        self.assertEqual(sorted(samples), ['Bax_0', 'Bid_0'])
+        for name, cv in (('Bid_0', 0.3), ('Bax_0', 0.1)):
+            nominal = self.network.param_vector()[
+                self.network.parameter_names.index(name)]
+            x = samples[name]
+            self.assertAlmostEqual(x.mean() / nominal, 1, delta=0.01)
+            self.assertAlmostEqual(x.std() / x.mean(), cv, delta=0.01)
+        default = ensemble.sample_initial_conditions(self.network, 1)
+        self.assertTrue('Bid_0' in default and 'L_0' not in default)
+
+    def test_nominal_population(self):
+        """Without variability, every cell is the nominal cell."""
+        result = ensemble.simulate_population(self.network, self.tspan, n=3,
+                                              cv=0)
+        solver = Solver(self.network, self.tspan)
+        solver.run()
+        td = timing(self.tspan, solver.yobs['aSmac'])['td']
+        self.assertTrue(np.allclose(result['td'], td, rtol=1e-3))
+        self.assertTrue(np.all(result['Bid_0'] == 4e4))
+
+    def test_processes(self):
+        """Cells are simulated alike in several processes."""
+        kwargs = dict(n=6, seed=1, param_values={'L_0': 1000})
+        serial = ensemble.simulate_population(self.network, self.tspan,
+                                              **kwargs)
+        parallel = ensemble.simulate_population(self.network, self.tspan,
+                                                processes=2, **kwargs)
+        self.assertTrue(np.array_equal(serial, parallel))
+        self.assertTrue(np.all(np.isfinite(serial['td'])))
+        self.assertTrue(np.std(serial['td']) > 0)
+
+    def test_censored_momp_times(self):
+        """The cells still alive at the end of the recording are left out of
+        the observed times, and out of the simulated ones."""
+        end = ensemble.end_time('bcl2_gfp')
+        self.assertEqual(end, 16 * 3600)
+        observed = ensemble.momp_times('bcl2_gfp')
+        self.assertTrue(len(observed) > 0 and np.all(observed < end))
+        self.assertEqual(ensemble.end_time('bid_gfp'), None)
+        td = np.append(observed, [end, end + 1, np.nan])
+        self.assertEqual(ensemble.ks_distance(td, observed, end)[0], 0)
@@ -0,0 +1,45 @@
+"""
+Tests for the trajectory features in :py:mod:`earm.features`, which are
+checked on sigmoids whose crossing times are known exactly.
+"""
+
+import unittest
+
+import numpy as np
+
+from earm import features
+
+t = np.linspace(0, 20000, 1001)
+
+def sigmoid(td, ts, top=1.0):
+    """Trajectory crossing 10% of `top` at td - ts/2 and 90% at td + ts/2."""
+    k = 2 * np.log(9) / ts
+    return top / (1 + np.exp(-k * (t - td)))
+
+class TestTiming(unittest.TestCase):
+    def test_sigmoids(self):
+        """Td, Ts and yfinal of a batch of sigmoids."""
+        td = np.array([5000., 9810., 12000.])
+        ts = np.array([600., 180., 2000.])
+        y = np.array([sigmoid(d, s, 1e5) for d, s in zip(td, ts)])
+        for interpolation, tol in (('cubic', 1.0), ('linear', 10.0)):
+            result = features.timing(t, y, interpolation=interpolation)
+            self.assertEqual(result.shape, (3,))
+            self.assertTrue(np.allclose(result['td'], td, atol=tol))
+            self.assertTrue(np.allclose(result['ts'], ts, atol=tol))
+        self.assertTrue(np.all(result['yfinal'] == y[:, -1]))
+
+    def test_single(self):
+        result = features.timing(t, sigmoid(9810., 180.))
+        self.assertEqual(result.shape, ())
+        self.assertAlmostEqual(float(result['td']), 9810., delta=1.0)
+
+    def test_no_crossing(self):
+        """Trajectories that do not rise through a level give NaN."""
+        y = np.array([np.zeros(len(t)), np.ones(len(t)), t])
+        times = features.crossing_times(t, y, [0.5])
+        self.assertTrue(np.all(np.isnan(times[:2])))
+        self.assertAlmostEqual(times[2, 0], 10000.)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+"""
+Tests for the counters and timers in :py:mod:`earm.instrument`.
+"""
+
+import time
+import unittest
+import warnings
+from StringIO import StringIO
+
+import numpy as np
+
+from earm import models
+from earm.instrument import Stats, PeriodicLog
+from earm.integrate import Solver
+from earm.network import Network
+
+class TestStats(unittest.TestCase):
+    def test_stats(self):
+        """Stages accumulate time and calls, counters their increments."""
+        stats = Stats()
+        for i in range(3):
+            with stats.timer('sleep'):
+                time.sleep(0.01)
+        stats.count('events', 5)
+        stats.count('events')
+        self.assertEqual(stats.calls['sleep'], 3)
+        self.assertTrue(0.03 <= stats.times['sleep'] <= stats.elapsed)
+        self.assertEqual(stats.counts, {'events': 6})
+        other = Stats()
+        other.update(stats)
+        other.update(stats)
+        self.assertEqual(other.calls['sleep'], 6)
+        self.assertEqual(other.counts['events'], 12)
+        self.assertTrue('sleep' in stats.summary())
+        self.assertTrue(stats.line().endswith('events 6'))
+        stats.reset()
+        self.assertEqual((stats.times, stats.counts), ({}, {}))
+
+    def test_periodic_log(self):
+        """The log line is written when the interval has elapsed, and the
+        result of the wrapped callback is returned."""
+        stats = Stats()
+        stream = StringIO()
+        log = PeriodicLog(stats, 0, lambda state: state > 1, stream)
+        self.assertFalse(log(1))
+        self.assertTrue(log(2))
+        self.assertEqual(stream.getvalue().count('stats: '), 2)
+        log = PeriodicLog(stats, 3600, stream=stream)
+        log(1)
+        self.assertEqual(stream.getvalue().count('stats: '), 2)
+
+class TestSolverStats(unittest.TestCase):
+    def setUp(self):
+        self.network = Network(models.get('mito.lopez_embedded'))
+        self.tspan = np.linspace(0, 20000, 101)
+
+    def test_counts(self):
+        """The solver counts its runs, steps and evaluations with every
+        integrator."""
+        for options in ({}, {'integrator': 'lsoda'}, {'integrator': 'bdf'},
+                        {'dense_output': True}):
+            stats = Stats()
+            solver = Solver(self.network, self.tspan, stats=stats, **options)
+            solver.run()
+            solver.run(stop=lambda i, y: i == 10)
+            self.assertEqual(stats.counts['runs'], 2)
+            self.assertEqual(stats.counts['stopped'], 1)
+            self.assertTrue(stats.counts['steps'] > 0)
+            self.assertTrue(stats.counts['rhs'] >= stats.counts['steps'])
+            self.assertTrue(stats.counts['jacobian'] > 0)
+            self.assertEqual(stats.calls['integrate'], 2)
+            self.assertFalse('failures' in stats.counts)
+
+    def test_failures(self):
+        """A run that the integrator gives up on is counted as a failure."""
+        solver = Solver(self.network, self.tspan, nsteps=5)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)
+            solver.run()
+        self.assertEqual(solver.stats.counts['failures'], 1)
@@ -0,0 +1,168 @@
+"""
+Tests for the compiled network functions in :py:mod:`earm.network` and the
+ODE solver in :py:mod:`earm.integrate`, which are checked against the
+finite-difference Jacobian and against :py:func:`pysb.integrate.odesolve`.
+"""
+
+import unittest
+
+import numpy as np
+import pysb.integrate
+
+from earm import models
+from earm.network import Network
+from earm.integrate import Solver, SensitivitySolver
+
+class TestNetwork(unittest.TestCase):
+    def setUp(self):
+        self.network = Network(models.get('lopez_embedded'))
+        p = self.network.param_vector()
+        self.k = self.network.rate_constants(p)
+        # An arbitrary state with all species present
+        self.y = np.random.RandomState(0).uniform(1, 1e4,
+                                                  self.network.n_species)
+
+    def test_rhs_matches_stoichiometry(self):
+        """The compiled RHS equals N * v."""
+        network = self.network
+        expected = np.dot(network.stoichiometry,
+                          network.reaction_rates(self.y, self.k))
+        ydot = network.rhs(0, self.y, self.k)
+        self.assertTrue(np.allclose(ydot, expected, rtol=1e-12))
+
+    def test_jacobian(self):
+        """The analytic Jacobian matches central finite differences."""
+        network = self.network
+        jac = network.jacobian(0, self.y, self.k).toarray()
+        fd = np.empty_like(jac)
+        for j in range(network.n_species):
+            h = self.y[j] * 1e-6
+            dy = np.zeros(network.n_species)
+            dy[j] = h
+            fd[:, j] = (network.rhs(0, self.y + dy, self.k) -
+                        network.rhs(0, self.y - dy, self.k)) / (2 * h)
+        scale = np.abs(fd).max() + 1
+        self.assertTrue(np.allclose(jac, fd, atol=scale * 1e-6))
+        # Every non-zero entry must be inside the sparsity pattern
+        self.assertEqual(np.count_nonzero(jac), network.jac_nnz)
+
+    def test_rate_constants_jacobian(self):
+        """The derivatives of the rate constants match finite differences."""
+        network = self.network
+        p = network.param_vector()
+        dk = network.rate_constants_jacobian(p)
+        for j in range(network.n_parameters):
+            dp = np.zeros(network.n_parameters)
+            dp[j] = p[j] * 1e-6 or 1e-6
+            fd = (network.rate_constants(p + dp) -
+                  network.rate_constants(p - dp)) / (2 * dp[j])
+            self.assertTrue(np.allclose(dk[:, j], fd, rtol=1e-6))
+
+    def test_batch_evaluation(self):
+        """The compiled functions accept a trailing batch dimension."""
+        network = self.network
+        y = np.column_stack([self.y, 2 * self.y])
+        k = np.column_stack([self.k, self.k])
+        ydot = network.rhs(0, y, k)
+        self.assertTrue(np.allclose(ydot[:, 1],
+                                    network.rhs(0, 2 * self.y, self.k)))
+        data = network.jacobian_data(0, y, k)
+        self.assertEqual(data.shape, (network.jac_nnz, 2))
+
+class TestSolver(unittest.TestCase):
+    def test_matches_pysb(self):
+        """The Solver reproduces pysb.integrate.odesolve for M1a."""
+        model = models.get('lopez_embedded')
+        tspan = np.linspace(0, 20000, 201)
+        expected = pysb.integrate.odesolve(model, tspan, rtol=1e-8,
+                                           atol=1e-8)
+        for integrator in ('vode', 'lsoda', 'bdf'):
+            solver = Solver(model, tspan, rtol=1e-8, atol=1e-8,
+                            integrator=integrator)
+            solver.run()
+            for name in solver.network.observable_names:
+                scale = np.abs(expected[name]).max()
+                self.assertTrue(np.allclose(solver.yobs[name], expected[name],
+                                            atol=scale * 1e-4),
+                                "%s differs using %s" % (name, integrator))
+
+    def test_param_values_dict(self):
+        """Parameters can be overridden by name, as with pysb's Solver."""
+        model = models.get('lopez_embedded')
+        solver = Solver(model, np.linspace(0, 20000, 11))
+        solver.run({'PARP_0': 0})
+        self.assertTrue(np.all(solver.yobs['cPARP'] == 0))
+
+    def test_stop(self):
+        """The integration stops when the stop function returns True."""
+        model = models.get('lopez_embedded')
+        tspan = np.linspace(0, 20000, 11)
+        for integrator in ('vode', 'bdf'):
+            solver = Solver(model, tspan, integrator=integrator)
+            solver.run()
+            expected = solver.y.copy()
+            seen = []
+            def stop(i, y):
+                seen.append(i)
+                self.assertTrue(np.all(y == solver.y[i]))
+                return i == 4
+            solver.run(stop=stop)
+            self.assertEqual(seen, [1, 2, 3, 4])
+            self.assertTrue(np.allclose(solver.y[:5], expected[:5]))
+            self.assertTrue(np.all(np.isnan(solver.y[5:])))
+
+    def test_dense_output(self):
+        """Dense output mode gives the same trajectories, at the time points
+        and in between them."""
+        model = models.get('lopez_embedded')
+        tfine = np.linspace(0, 20000, 401)
+        reference = Solver(model, tfine, rtol=1e-9, atol=1e-9)
+        reference.run()
+        scale = np.abs(reference.y).max(axis=0) + 1
+        for integrator in ('vode', 'bdf'):
+            solver = Solver(model, tfine[::20], rtol=1e-6, atol=1e-6,
+                            integrator=integrator, dense_output=True)
+            solver.run()
+            self.assertTrue(np.allclose(solver.y / scale,
+                                        reference.y[::20] / scale,
+                                        atol=1e-4))
+            self.assertTrue(np.allclose(solver.dense(tfine) / scale,
+                                        reference.y / scale, atol=1e-3))
+            self.assertEqual(solver.solution.t[-1], tfine[-1])
+            # Stopping gives the same results up to the stop
+            expected = solver.y.copy()
+            solver.run(stop=lambda i, y: i == 10)
+            self.assertTrue(np.allclose(solver.y[:11], expected[:11],
+                                        rtol=1e-12))
+            self.assertTrue(np.all(np.isnan(solver.y[11:])))
+        self.assertRaises(ValueError, Solver, model, tfine,
+                          integrator='lsoda', dense_output=True)
+
+class TestSensitivitySolver(unittest.TestCase):
+    def test_finite_differences(self):
+        """The sensitivities match finite differences of the trajectories."""
+        model = models.get('lopez_embedded')
+        tspan = np.linspace(0, 20000, 41)
+        names = ['bind_L_R_to_LR_kf', 'Bid_0', 'Smac_0']
+        solver = SensitivitySolver(model, tspan, parameters=names, log=True,
+                                   rtol=1e-9, atol=1e-9)
+        solver.run()
+        single = Solver(solver.network, tspan, rtol=1e-10, atol=1e-10)
+        p = solver.network.param_vector()
+        for j, index in enumerate(solver.param_indices):
+            # Central differences in log10 space
+            h = 1e-4
+            yobs = []
+            for sign in (1, -1):
+                values = p.copy()
+                values[index] *= 10 ** (sign * h)
+                single.run(values)
+                yobs.append(single.yobs_view.copy())
+            fd = (yobs[0] - yobs[1]) / (2 * h)
+            scale = np.abs(fd).max() + 1
+            self.assertTrue(np.allclose(solver.obs_sens[:, :, j], fd,
+                                        atol=scale * 1e-3),
+                            "%s differs" % names[j])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+Tests for the model inventory in :py:mod:`earm.model_specs`.
+"""
+
+import os
+import csv
+import json
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from earm import models, model_specs
+from earm.netcache import generate_equations
+
+class TestModelSpecs(unittest.TestCase):
+    def setUp(self):
+        self.names = ['mito.albeck_11b', 'mito.howells']
+        # Start from an empty network cache
+        self.cache_dir = os.environ.get('EARM_CACHE_DIR')
+        os.environ['EARM_CACHE_DIR'] = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(os.environ['EARM_CACHE_DIR'])
+        if self.cache_dir is None:
+            del os.environ['EARM_CACHE_DIR']
+        else:
+            os.environ['EARM_CACHE_DIR'] = self.cache_dir
+
+    def test_specs(self):
+        """The specs are those of the network of the model."""
+        self.assertFalse(model_specs.model_specs('mito.albeck_11b')['cached'])
+        model = model_specs.build('mito.albeck_11b')
+        generate_equations(model)
+        specs = model_specs.model_specs('mito.albeck_11b')
+        self.assertEqual(sorted(specs), sorted(model_specs.fields))
+        self.assertEqual(specs['species'], len(model.species))
+        self.assertEqual(specs['reactions'], len(model.reactions))
+        self.assertEqual(specs['parameters'], len(model.parameters))
+        self.assertEqual(specs['parameters'],
+                         len(models.get('mito.albeck_11b').parameters) + 1)
+        self.assertTrue(specs['cached'])
+
+    def test_processes(self):
+        """Models are inventoried alike in several processes."""
+        serial = model_specs.all_specs(self.names, processes=1)
+        parallel = model_specs.all_specs(self.names, processes=2)
+        self.assertEqual([s['model'] for s in parallel], self.names)
+        # The first run filled the cache
+        self.assertFalse(any(s['cached'] for s in serial))
+        self.assertTrue(all(s['cached'] for s in parallel))
+        for s in serial + parallel:
+            del s['time'], s['cached']
+        self.assertEqual(serial, parallel)
+
+    def test_formats(self):
+        """The JSON and CSV reports hold the same specs."""
+        specs = model_specs.all_specs(self.names, processes=1)
+        f = StringIO()
+        model_specs.write_json(specs, f)
+        from_json = json.loads(f.getvalue())
+        f = StringIO()
+        model_specs.write_csv(specs, f)
+        from_csv = list(csv.DictReader(StringIO(f.getvalue())))
+        self.assertEqual(len(from_json), 2)
+        for s, j, c in zip(specs, from_json, from_csv):
+            self.assertEqual(j['model'], s['model'])
+            self.assertEqual(j['odes'], s['odes'])
+            self.assertEqual(int(c['odes']), s['odes'])
+            self.assertAlmostEqual(float(c['time']), s['time'])
@@ -3,8 +3,9 @@ A suite of tests to ensure that each of the models in the EARM
 repository can be successfully loaded and have its reaction network
 generated.
 
-For every model, pysb.bng.generate_network(model) is called; if there
-are no errors, the test passes.
+For every model, earm.netcache.generate_network(model) is called; if there
+are no errors, the test passes. The network is taken from the network cache
+if the model has been generated before.
 """
 
 # Import the full extrinsic apoptosis models:
@@ -43,7 +44,7 @@ import earm.mito.cui_direct1 as m13b
 import earm.mito.cui_direct2 as m14b
 import earm.mito.howells as m15b
 
-from pysb.bng import generate_network
+from earm.netcache import generate_network
 import nose
 import traceback
 
@@ -0,0 +1,99 @@
+"""
+Tests for the on-disk network cache in :py:mod:`earm.netcache`.
+
+Each test builds a fresh copy of a small binding model so that the cache is
+exercised with distinct but identical model objects, the same way it is used
+when a model is loaded by two different processes.
+"""
+
+import unittest
+import tempfile
+import shutil
+import os
+
+from pysb import Model, Monomer, Parameter, Rule, Observable
+import pysb.bng
+from earm import netcache
+
+def build_model(kf=1e-4):
+    """Build the model A + B <> A:B, with A:B >> A + C."""
+    model = Model('netcache_test', _export=False)
+    A = Monomer('A', ['b'], _export=False)
+    B = Monomer('B', ['b'], _export=False)
+    C = Monomer('C', _export=False)
+    for c in (A, B, C):
+        model.add_component(c)
+    params = [Parameter('A_0', 100, _export=False),
+              Parameter('B_0', 50, _export=False),
+              Parameter('kf', kf, _export=False),
+              Parameter('kr', 1e-2, _export=False),
+              Parameter('kc', 1e-1, _export=False)]
+    for p in params:
+        model.add_component(p)
+    A_0, B_0, kf, kr, kc = params
+    model.add_component(Rule('bind', A(b=None) + B(b=None) <>
+                             A(b=1) % B(b=1), kf, kr, _export=False))
+    model.add_component(Rule('convert', A(b=1) % B(b=1) >> A(b=None) + C(),
+                             kc, _export=False))
+    model.add_component(Observable('C_total', C(), _export=False))
+    model.initial(A(b=None), A_0)
+    model.initial(B(b=None), B_0)
+    return model
+
+class TestNetworkCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.generate_network = pysb.bng.generate_network
+
+    def tearDown(self):
+        pysb.bng.generate_network = self.generate_network
+        shutil.rmtree(self.directory)
+
+    def test_restore_skips_bng(self):
+        """A second copy of the model is restored without running BNG."""
+        model = build_model()
+        netcache.generate_equations(model, directory=self.directory)
+        self.assertTrue(netcache.is_cached(model, directory=self.directory))
+
+        def fail(*args, **kwargs):
+            raise AssertionError('BioNetGen should not have been called')
+        pysb.bng.generate_network = fail
+        restored = build_model()
+        netcache.generate_equations(restored, directory=self.directory)
+        self.assertEqual([str(s) for s in model.species],
+                         [str(s) for s in restored.species])
+        self.assertEqual([str(o) for o in model.odes],
+                         [str(o) for o in restored.odes])
+        self.assertEqual(len(model.reactions), len(restored.reactions))
+        self.assertEqual(list(model.observables['C_total'].species),
+                         list(restored.observables['C_total'].species))
+
+    def test_key_depends_on_content(self):
+        """Changing a parameter value changes the cache key."""
+        self.assertEqual(netcache.model_hash(build_model()),
+                         netcache.model_hash(build_model()))
+        self.assertNotEqual(netcache.model_hash(build_model()),
+                            netcache.model_hash(build_model(kf=2e-4)))
+
+    def test_synth_deg_unchanged(self):
+        """Looking up a model with a degradation rule does not add the source
+        and sink species to it, nor does adding them change its key."""
+        model = build_model()
+        model.add_component(Rule('degrade', model.monomers['C']() >> None,
+                                 model.parameters['kc'], _export=False))
+        key = netcache.model_hash(model)
+        self.assertFalse(netcache.is_cached(model, directory=self.directory))
+        self.assertEqual(len(model.monomers), 3)
+        netcache.generate_equations(model, directory=self.directory)
+        self.assertEqual(len(model.monomers), 5)
+        self.assertEqual(netcache.model_hash(model), key)
+        self.assertTrue(netcache.is_cached(model, directory=self.directory))
+
+    def test_clear(self):
+        """clear() removes all entries from the cache."""
+        netcache.generate_network(build_model(), directory=self.directory)
+        self.assertEqual(netcache.clear(directory=self.directory), 1)
+        self.assertEqual(os.listdir(self.directory), [])
+
+if __name__ == '__main__':
+    unittest.main()
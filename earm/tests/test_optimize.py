@@ -0,0 +1,211 @@
+"""
+Tests for the optimization strategies in :py:mod:`earm.optimize`, which are
+run on a shifted quadratic bowl and on the Rosenbrock function.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from earm import optimize
+
+center = np.array([0.3, -0.2, 0.5])
+lb = -np.ones(3)
+ub = np.ones(3)
+
+def bowl(points):
+    return np.sum((points - center) ** 2, axis=1)
+
+def rosenbrock(x):
+    return np.sum(100 * (x[1:] - x[:-1] ** 2) ** 2 + (1 - x[:-1]) ** 2)
+
+class TestStrategies(unittest.TestCase):
+    def check(self, optimizer, tol):
+        result = optimizer.minimize(bowl, np.zeros(3), lb, ub)
+        self.assertTrue(result.success)
+        self.assertTrue(np.allclose(result.x, center, atol=tol),
+                        "%s found %s" % (type(optimizer).__name__, result.x))
+        self.assertAlmostEqual(result.fun, bowl(result.x[None, :])[0])
+
+    def test_anneal(self):
+        self.check(optimize.Anneal(maxiter=200, dwell=20, step=0.5, seed=1),
+                   0.1)
+
+    def test_differential_evolution(self):
+        self.check(optimize.DifferentialEvolution(maxiter=100, seed=1), 0.05)
+
+    def test_cmaes(self):
+        self.check(optimize.CMAES(maxiter=200, seed=1), 1e-3)
+
+    def test_parallel_tempering(self):
+        self.check(optimize.ParallelTempering(maxiter=500, step=0.05,
+                                              temperatures=[1e-3, 1e-2, 1e-1],
+                                              seed=1), 0.1)
+
+    def test_polish(self):
+        result = optimize.Polish(eps=1e-7).minimize(
+            optimize.vectorize(rosenbrock), np.zeros(3), -2 * ub, 2 * ub)
+        self.assertTrue(np.allclose(result.x, 1, atol=1e-3))
+
+    def test_polish_gradient(self):
+        """An analytic gradient replaces the finite differences."""
+        def gradient(x):
+            return np.sum((x - center) ** 2), 2 * (x - center)
+        result = optimize.Polish(gradient=gradient).minimize(
+            bowl, np.zeros(3), lb, ub)
+        self.assertTrue(np.allclose(result.x, center, atol=1e-6))
+        self.assertEqual(result.nfev, result.state.nfev)
+
+class TestInterface(unittest.TestCase):
+    def test_bounds(self):
+        """The points evaluated stay within the bounds."""
+        def checked(points):
+            self.assertTrue(np.all((points >= lb) & (points <= ub)))
+            return bowl(points)
+        for optimizer in (optimize.DifferentialEvolution(maxiter=5, seed=0),
+                          optimize.CMAES(maxiter=5, sigma0=1, seed=0)):
+            optimizer.minimize(checked, np.zeros(3), lb, ub)
+
+    def test_callback(self):
+        """The callback sees each iteration and can stop the optimization."""
+        seen = []
+        def callback(state):
+            seen.append(state.nit)
+            return state.nit == 3
+        result = optimize.CMAES(maxiter=10, seed=0).minimize(
+            bowl, np.zeros(3), lb, ub, callback=callback)
+        self.assertEqual(seen, [1, 2, 3])
+        self.assertEqual(result.nit, 3)
+
+    def test_resume(self):
+        """Continuing from a returned state equals an uninterrupted run."""
+        full = optimize.DifferentialEvolution(maxiter=10, tol=0, seed=2)
+        expected = full.minimize(bowl, np.zeros(3), lb, ub)
+        part = optimize.DifferentialEvolution(maxiter=4, tol=0, seed=2)
+        state = part.minimize(bowl, np.zeros(3), lb, ub).state
+        result = full.minimize(bowl, np.zeros(3), lb, ub, state=state)
+        self.assertTrue(np.all(result.x == expected.x))
+        self.assertEqual(result.nfev, expected.nfev)
+
+    def test_nan_is_infinite(self):
+        result = optimize.CMAES(maxiter=5, seed=0).minimize(
+            lambda points: np.where(points[:, 0] > 0, np.nan, bowl(points)),
+            np.zeros(3), lb, ub)
+        self.assertTrue(result.x[0] <= 0)
+
+    def test_bounded_objective(self):
+        """Thresholds let a bounded objective give up on rejected points
+        without changing the course of the optimization."""
+        def cost(x, threshold=None):
+            c = bowl(x[None, :])[0]
+            if threshold is not None and c > threshold:
+                # Any value above the threshold will do
+                return threshold + 1
+            return c
+        for optimizer in (
+                lambda: optimize.Anneal(maxiter=5, dwell=10, seed=4),
+                lambda: optimize.DifferentialEvolution(maxiter=5, seed=4),
+                lambda: optimize.ParallelTempering(maxiter=20, seed=4)):
+            expected = optimizer().minimize(optimize.vectorize(cost),
+                                            np.zeros(3), lb, ub)
+            cached = optimize.CachedObjective(optimize.vectorize_bounded(cost))
+            result = optimizer().minimize(cached, np.zeros(3), lb, ub)
+            self.assertTrue(np.all(result.x == expected.x))
+            self.assertEqual(result.fun, expected.fun)
+        # Costs above their thresholds are not cached
+        cached = optimize.CachedObjective(optimize.vectorize_bounded(cost))
+        points = np.array([center, np.zeros(3)])
+        self.assertEqual(list(cached(points, [1, 0.1])), [0, 1.1])
+        self.assertEqual(len(cached), 1)
+        # Copies of a point are evaluated with the largest of their thresholds
+        cached = optimize.CachedObjective(optimize.vectorize_bounded(cost))
+        points = np.zeros((3, 3))
+        self.assertTrue(np.allclose(cached(points, [0.1, 1, 0.2]),
+                                    bowl(points)))
+        self.assertEqual(len(cached), 1)
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'fit.ckpt')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_resume_is_exact(self):
+        """A run resumed from a checkpoint equals an uninterrupted run."""
+        def optimizer():
+            return optimize.Anneal(maxiter=10, dwell=5, step=0.5, seed=3)
+        expected = optimizer().minimize(bowl, np.zeros(3), lb, ub)
+        # Kill the run during iteration 7, after a checkpoint at 5
+        def kill(state):
+            if state.nit == 7:
+                raise KeyboardInterrupt
+        self.assertRaises(KeyboardInterrupt, optimizer().minimize, bowl,
+                          np.zeros(3), lb, ub, callback=kill,
+                          checkpoint=self.path, checkpoint_every=5)
+        _, state = optimize.load_checkpoint(self.path)
+        self.assertEqual(state.nit, 5)
+        result = optimizer().minimize(bowl, np.zeros(3), lb, ub,
+                                      checkpoint=self.path)
+        self.assertTrue(np.all(result.x == expected.x))
+        self.assertEqual(result.fun, expected.fun)
+        self.assertEqual(result.nfev, expected.nfev)
+        self.assertEqual(result.state.temperature,
+                         expected.state.temperature)
+
+    def test_wrong_optimizer(self):
+        optimize.CMAES(maxiter=2, seed=0).minimize(bowl, np.zeros(3), lb, ub,
+                                                   checkpoint=self.path)
+        self.assertRaises(ValueError,
+                          optimize.DifferentialEvolution(maxiter=2).minimize,
+                          bowl, np.zeros(3), lb, ub, checkpoint=self.path)
+
+class TestCachedObjective(unittest.TestCase):
+    def setUp(self):
+        self.evaluated = []
+
+    def func(self, points):
+        self.evaluated.extend(map(tuple, points))
+        return bowl(points)
+
+    def test_hits_and_misses(self):
+        cached = optimize.CachedObjective(self.func)
+        points = np.array([[0, 0, 0], [1, 0, 0], [0, 0, 0]], dtype=float)
+        self.assertTrue(np.all(cached(points) == bowl(points)))
+        self.assertEqual(len(self.evaluated), 2)
+        self.assertTrue(np.all(cached(points[:2]) == bowl(points[:2])))
+        self.assertEqual(len(self.evaluated), 2)
+        self.assertEqual((cached.hits, cached.misses), (2, 3))
+
+    def test_quantized_lru(self):
+        cached = optimize.CachedObjective(self.func, maxsize=2, decimals=3)
+        cached(np.array([[0.1, 0, 0], [0.2, 0, 0]]))
+        # Within the rounding of the first point, which becomes the most
+        # recently used, so the second one is discarded by the third
+        cached(np.array([[0.1001, 0, 0]]))
+        cached(np.array([[0.3, 0, 0]]))
+        self.assertEqual(len(cached), 2)
+        cached(np.array([[0.1, 0, 0], [0.2, 0, 0]]))
+        self.assertEqual(len(self.evaluated), 4)
+
+    def test_persistence(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'cache.pkl')
+            points = np.array([[0.5, 0.5, 0.5]])
+            cached = optimize.CachedObjective(self.func, path=path)
+            cached(points)
+            cached.save()
+            other = optimize.CachedObjective(self.func, path=path)
+            self.assertEqual(other(points)[0], bowl(points)[0])
+            self.assertEqual(other.hits, 1)
+            self.assertEqual(len(self.evaluated), 1)
+        finally:
+            shutil.rmtree(tmp)
+
+if __name__ == '__main__':
+    unittest.main()
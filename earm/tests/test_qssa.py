@@ -0,0 +1,118 @@
+"""
+Tests for the quasi-steady-state reduction in :py:mod:`earm.qssa`, on a
+Michaelis-Menten enzyme and on a full model.
+"""
+
+import unittest
+
+import numpy as np
+from pysb import Model, Monomer, Parameter, Rule
+
+from earm import models
+from earm.network import Network
+from earm.integrate import Solver
+from earm.batch import BatchSolver
+from earm.qssa import reversible_pairs, relaxation_times, \
+    find_fast_reactions, QSSANetwork, error_report, reduce_model
+
+def enzyme_model():
+    """E + S <-> C -> E + P, with the complex relaxing in about 0.1 s and
+    the substrate converted in hours."""
+    model = Model('enzyme', _export=False)
+    E = Monomer('E', ['b'], _export=False)
+    S = Monomer('S', ['b', 'p'], {'p': ['u', 'p']}, _export=False)
+    for m in E, S:
+        model.add_component(m)
+    for name, value in [('kf', 1e-4), ('kr', 1), ('kc', 10), ('E_0', 100),
+                        ('S_0', 1e5)]:
+        model.add_component(Parameter(name, value, _export=False))
+    p = model.parameters
+    model.add_component(Rule('bind', E(b=None) + S(b=None, p='u') >>
+                             E(b=1) % S(b=1, p='u'), p['kf'], _export=False))
+    model.add_component(Rule('unbind', E(b=1) % S(b=1, p='u') >>
+                             E(b=None) + S(b=None, p='u'), p['kr'],
+                             _export=False))
+    model.add_component(Rule('cat', E(b=1) % S(b=1, p='u') >>
+                             E(b=None) + S(b=None, p='p'), p['kc'],
+                             _export=False))
+    model.initial(E(b=None), p['E_0'])
+    model.initial(S(b=None, p='u'), p['S_0'])
+    return model
+
+class TestEnzyme(unittest.TestCase):
+    def setUp(self):
+        self.network = Network(enzyme_model())
+        self.k = self.network.rate_constants(self.network.param_vector())
+
+    def test_pairs(self):
+        """The binding is the only reversible pair, and its complex relaxes
+        at kf (E + S) + kr + kc."""
+        pairs = reversible_pairs(self.network)
+        self.assertEqual(len(pairs), 1)
+        forward = pairs[0][0][0]
+        self.assertEqual(len(self.network.reactants[forward]), 2)
+        y = self.network.initial_values(self.network.param_vector())
+        tau = relaxation_times(self.network, pairs, y, self.k)
+        self.assertAlmostEqual(tau[0], 1 / (1e-4 * (100 + 1e5) + 1 + 10))
+
+    def test_reduction(self):
+        """The reduced network keeps the complex in quasi-steady state and
+        the totals conserved, and follows the full one without its fast
+        timescale."""
+        tspan = np.linspace(0, 3600, 61)
+        fast = find_fast_reactions(self.network, tspan)
+        self.assertEqual(len(fast), 1)
+        reduced = QSSANetwork(self.network, fast)
+        solver = Solver(reduced, tspan, rtol=1e-8, atol=1e-8)
+        solver.run()
+        full = Solver(self.network, tspan, rtol=1e-8, atol=1e-8)
+        full.run()
+        # Apart from the initial binding, which is instantaneous
+        scale = np.max(full.y, axis=0)
+        self.assertTrue(np.all(np.abs(solver.y[1:] - full.y[1:]) <
+                               1e-3 * scale))
+        complex_ = reduced.products[fast[0][0][0]][0]
+        for y in solver.y:
+            self.assertTrue(abs(self.network.rhs(0, y, self.k)[complex_]) <
+                            1e-6 * y.sum())
+        self.assertTrue(np.allclose(solver.y[:, 1:].sum(axis=1), 1e5))
+        self.assertTrue(np.allclose(solver.y[:, 0] + solver.y[:, 2], 100))
+        eigenvalues = lambda network, y: np.linalg.eigvals(
+            network.jacobian_dense(0, y, self.k)).real
+        y = solver.y[30]
+        self.assertTrue(np.min(eigenvalues(self.network, y)) < -10)
+        self.assertTrue(np.min(eigenvalues(reduced, y)) > -1)
+
+class TestFullModel(unittest.TestCase):
+    def setUp(self):
+        self.network = Network(models.get('lopez_embedded'))
+        self.tspan = np.linspace(0, 20000, 101)
+
+    def test_reduce_model(self):
+        """The fast complexes of a full model are reduced with a small error,
+        and a non-stiff integrator takes far fewer steps."""
+        reduced, report = reduce_model(self.network, self.tspan,
+                                       method='adams')
+        self.assertTrue(len(reduced.fast) > 0)
+        self.assertTrue(report.max_error < 0.01)
+        self.assertEqual(len(report.error), self.network.n_observables)
+        self.assertTrue(report.n_steps[1] < report.n_steps[0] / 2)
+        self.assertTrue(report.n_rhs[1] < report.n_rhs[0] / 2)
+        self.assertTrue(np.all(np.array(report.time) > 0))
+        # The steps are counted with every integrator
+        report = error_report(self.network, reduced, self.tspan,
+                              integrator='bdf')
+        self.assertTrue(min(report.n_steps) > 0)
+
+    def test_batch(self):
+        """A reduced network can be integrated in batches."""
+        fast = find_fast_reactions(self.network, self.tspan)
+        reduced = QSSANetwork(self.network, fast)
+        params = {'Bid_0': np.array([2e4, 4e4, 8e4])}
+        batch = BatchSolver(reduced, self.tspan)
+        yobs = batch.run(params)
+        solver = Solver(reduced, self.tspan)
+        for i, bid in enumerate(params['Bid_0']):
+            solver.run({'Bid_0': bid})
+            self.assertTrue(np.allclose(yobs[i], solver.yobs_view,
+                                        rtol=1e-3, atol=1))
@@ -0,0 +1,70 @@
+"""
+Tests for the model registry in :py:mod:`earm.models`.
+"""
+
+import unittest
+
+import numpy as np
+from pysb import Parameter
+
+from earm import models, lopez_modules
+from earm.integrate import Solver
+from earm.network import Network
+
+class TestRegistry(unittest.TestCase):
+    def test_names(self):
+        """The registry lists the 15 full and 15 MOMP-only models."""
+        self.assertEqual(len(models.full_names), 15)
+        self.assertEqual(len(models.mito_names), 15)
+        self.assertEqual(len(set(models.names)), 30)
+
+    def test_get_is_cached(self):
+        """get() builds a model once and then returns the same instance."""
+        model = models.get('mito.albeck_11b')
+        self.assertTrue(models.is_built('mito.albeck_11b'))
+        self.assertTrue(models.get('mito.albeck_11b') is model)
+        self.assertEqual(model.name, 'earm.mito.albeck_11b')
+
+    def test_get_is_read_only(self):
+        """Nothing can be added to the instance returned by get()."""
+        model = models.get('mito.albeck_11b')
+        n_parameters = len(model.parameters)
+        self.assertRaises(TypeError, model.add_component,
+                          Parameter('extra', 1, _export=False))
+        self.assertRaises(TypeError, model.initial,
+                          model.monomers['Bid'](state='T', bf=None),
+                          model.parameters['Bid_0'])
+        self.assertEqual(len(model.parameters), n_parameters)
+
+    def test_build_is_independent(self):
+        """build() returns a new instance that can be modified safely."""
+        shared = models.get('mito.albeck_11c')
+        private = models.build('mito.albeck_11c')
+        self.assertFalse(private is shared)
+        self.assertEqual([p.name for p in private.parameters],
+                         [p.name for p in shared.parameters])
+        private.parameters['Bax_0'].value *= 2
+        self.assertNotEqual(private.parameters['Bax_0'].value,
+                            shared.parameters['Bax_0'].value)
+
+    def test_pore_size(self):
+        """The lopez models can be built with larger pores, which release
+        Smac."""
+        model = models.build('mito.lopez_embedded', pore_max_size=8)
+        self.assertEqual(lopez_modules.default_pore_max_size, 4)
+        network = Network(model)
+        sizes = [sum(mp.monomer.name == 'Bax' for mp in cp.monomer_patterns)
+                 for cp in model.species]
+        self.assertEqual(max(sizes), 8)
+        solver = Solver(network, np.linspace(0, 20000, 101))
+        solver.run()
+        self.assertTrue(solver.yobs['cSmac'][-1] >
+                        0.5 * model.parameters['Smac_0'].value)
+        self.assertRaises(ValueError, models.build, 'mito.albeck_11b',
+                          pore_max_size=8)
+
+    def test_unknown_name(self):
+        self.assertRaises(ValueError, models.get, 'albeck_11z')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Tests for the global sensitivity analyses in :py:mod:`earm.sensitivity`.
+"""
+
+import unittest
+
+import numpy as np
+
+from earm import models, model_specs, sensitivity
+from earm.network import Network
+
+def ishigami(x):
+    """The Ishigami function of points of the unit cube, with known Sobol
+    indices."""
+    x = np.pi * (2 * x - 1)
+    return (np.sin(x[..., 0]) + 7 * np.sin(x[..., 1]) ** 2 +
+            0.1 * x[..., 2] ** 4 * np.sin(x[..., 0]))[..., None]
+
+class TestEstimators(unittest.TestCase):
+    def test_morris_linear(self):
+        """The elementary effects of a linear function are its slopes."""
+        slopes = np.array([2.0, -1.0, 0.0])
+        x = sensitivity.morris_trajectories(5, 3,
+                                            random=np.random.RandomState(0))
+        self.assertTrue(np.all((x >= 0) & (x <= 1)))
+        self.assertTrue(np.all(np.sum(np.diff(x, axis=1) != 0, axis=2) == 1))
+        mu, mu_star, sigma, count = sensitivity._morris_indices(
+            x, np.dot(x, slopes)[..., None])
+        self.assertTrue(np.allclose(mu[:, 0], slopes))
+        self.assertTrue(np.allclose(mu_star[:, 0], abs(slopes)))
+        self.assertTrue(np.allclose(sigma, 0))
+        self.assertTrue(np.all(count == 5))
+
+    def test_sobol_ishigami(self):
+        """The indices of the Ishigami function match their exact values."""
+        random = np.random.RandomState(0)
+        n = 20000
+        a = random.uniform(size=(n, 3))
+        b = random.uniform(size=(n, 3))
+        ab = np.tile(a, (3, 1, 1))
+        for i in range(3):
+            ab[i, :, i] = b[:, i]
+        s1, st = sensitivity._sobol_indices(ishigami(a), ishigami(b),
+                                            ishigami(ab))
+        self.assertTrue(np.allclose(s1[:, 0], [0.314, 0.442, 0], atol=0.03))
+        self.assertTrue(np.allclose(st[:, 0], [0.558, 0.442, 0.244],
+                                    atol=0.03))
+
+class TestModel(unittest.TestCase):
+    def setUp(self):
+        self.network = Network(models.get('mito.lopez_embedded'))
+        self.tspan = np.linspace(0, 20000, 101)
+        self.parameters = ['equilibrate_BaxC_to_BaxM_kf',
+                           'bind_BaxA_BclxLM_kr',
+                           'catalyze_BidMBakM_to_BidM_BakA_kc']
+        self.kwargs = dict(parameters=self.parameters,
+                           features=['td', 'ts', 'cSmac'],
+                           observable='cSmac', seed=0)
+
+    def test_rate_parameters(self):
+        names = sensitivity.rate_parameters(self.network)
+        self.assertTrue(set(self.parameters) <= set(names))
+        self.assertFalse('Bax_0' in names)
+        # Rates of reactions that are turned off are left out
+        names = sensitivity.rate_parameters(
+            self.network, {'bind_BaxA_BclxLM_kr': 0})
+        self.assertFalse('bind_BaxA_BclxLM_kr' in names)
+        names = sensitivity.rate_parameters(
+            model_specs.build('mito.chen_biophys_j'))
+        self.assertFalse('spontaneous_pore_BaxA_to_Bax4_kr' in names)
+        self.assertTrue('spontaneous_pore_BaxA_to_Bax4_kf' in names)
+
+    def test_morris(self):
+        """Screening gives indices for every parameter and feature, and
+        the same results in several processes."""
+        result = sensitivity.morris(self.network, self.tspan, r=3,
+                                    radius=0.5, **self.kwargs)
+        self.assertEqual(result.mu_star.shape, (3, 3))
+        self.assertEqual(result.samples.shape, (12, 3))
+        self.assertTrue(np.all(abs(result.samples -
+                                   result.samples.mean(axis=0)) <= 1))
+        self.assertTrue(np.all(result.mu_star > 0))
+        self.assertEqual(sorted(sensitivity.ranking(result, 'td')),
+                         sorted(self.parameters))
+        parallel = sensitivity.morris(self.network, self.tspan, r=3,
+                                      radius=0.5, processes=2, **self.kwargs)
+        self.assertTrue(np.array_equal(result.outputs, parallel.outputs))
+
+    def test_sobol(self):
+        result = sensitivity.sobol(self.network, self.tspan, n=16,
+                                   **self.kwargs)
+        self.assertEqual(result.outputs.shape, (16 * 5, 3))
+        for index in ('S1', 'ST', 'S1_conf', 'ST_conf'):
+            self.assertEqual(result[index].shape, (3, 3))
+        self.assertTrue(np.all(np.isfinite(result.ST)))
+
+    def test_unknown_feature(self):
+        self.assertRaises(ValueError, sensitivity.morris, self.network,
+                          self.tspan, features=['aSmac'],
+                          observable='cSmac')
@@ -31,7 +31,7 @@ setUp() method of each test.
 import unittest
 from earm.mito import chen_biophys_j, chen_febs_direct, \
     chen_febs_indirect, cui_direct, cui_direct1, cui_direct2, howells
-from pysb.bng import generate_equations
+from earm.netcache import generate_equations
 from pysb.integrate import odesolve
 from pysb import *
 import numpy as np
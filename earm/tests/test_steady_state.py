@@ -0,0 +1,135 @@
+"""
+Tests for the steady states, continuation and dose sweeps in
+:py:mod:`earm.steady_state`, on a small bistable switch with known folds and
+on the MOMP model of [Chen2007biophysj]_.
+"""
+
+import unittest
+
+import numpy as np
+from pysb import Model, Monomer, Parameter, Rule
+
+from earm import models
+from earm.network import Network
+from earm.integrate import Solver
+from earm.steady_state import ConservationLaws, steady_state, continuation, \
+    dose_response
+
+def switch_model():
+    """X is activated by itself (I + 2 A -> 3 A), with a basal activation
+    and a first-order deactivation; it is bistable for intermediate amounts
+    of X."""
+    model = Model('switch', _export=False)
+    X = Monomer('X', ['s'], {'s': ['I', 'A']}, _export=False)
+    model.add_component(X)
+    for name, value in [('k0', 0.01), ('k1', 1), ('k2', 1), ('X_0', 1)]:
+        model.add_component(Parameter(name, value, _export=False))
+    p = model.parameters
+    model.add_component(Rule('basal', X(s='I') >> X(s='A'), p['k0'],
+                             _export=False))
+    model.add_component(Rule('auto', X(s='I') + X(s='A') + X(s='A') >>
+                             X(s='A') + X(s='A') + X(s='A'), p['k1'],
+                             _export=False))
+    model.add_component(Rule('deact', X(s='A') >> X(s='I'), p['k2'],
+                             _export=False))
+    model.initial(X(s='I'), p['X_0'])
+    return model
+
+class TestSwitch(unittest.TestCase):
+    def setUp(self):
+        self.network = Network(switch_model())
+
+    def test_steady_state(self):
+        """Newton reaches the steady state of a long integration."""
+        params = self.network.param_vector({'X_0': 5})
+        result = steady_state(self.network, params)
+        self.assertTrue(result.success)
+        self.assertTrue(result.stable)
+        solver = Solver(self.network, [0, 1e4], rtol=1e-10, atol=1e-12)
+        solver.run(params)
+        self.assertTrue(np.allclose(result.y, solver.y[-1], rtol=1e-7))
+
+    def test_continuation(self):
+        """The folds of the S-shaped curve in X_0 are found."""
+        result = continuation(self.network, 'X_0', 10)
+        self.assertTrue(result.success)
+        self.assertEqual(len(result.folds), 2)
+        self.assertEqual(len(result.stable_branches), 2)
+        # Low branch, then unstable, then high branch
+        self.assertTrue(result.stable[0] and result.stable[-1])
+        self.assertFalse(result.stable[(result.folds[0] +
+                                        result.folds[1]) // 2])
+        self.assertAlmostEqual(result.p[-1], 10)
+        # X_0 = (a - k0 (1 - a)) / (k1/2 (1 - a) a^2) along the curve, with
+        # a the active fraction; the folds are its extrema
+        a = np.linspace(0.011, 0.99, 200001)
+        x0 = np.sqrt((a - 0.01 * (1 - a)) / (0.5 * (1 - a) * a ** 2))
+        lo = a < 0.1
+        expected = [x0[lo].max(), x0[~lo].min()]
+        self.assertTrue(np.allclose(result.p[result.folds], expected,
+                                    rtol=1e-6))
+        k = self.network.rate_constants(self.network.param_vector())
+        for y in result.y:
+            ydot = self.network.rhs(0, y, k)
+            self.assertTrue(np.all(np.abs(ydot) < 1e-8 * y.sum()))
+
+    def test_dose_response(self):
+        """Warm-started sweeps, in any order of the doses, agree with cold
+        solves."""
+        doses = np.array([1.5, 0.5, 3.0, 1.0, 2.0])
+        dose_params = lambda x0: {'X_0': x0}
+        newton = dose_response(self.network, doses, dose_params)
+        integrate = dose_response(self.network, doses, dose_params,
+                                  method='integrate', tmax=1e4)
+        self.assertTrue(np.all(newton.success) and
+                        np.all(integrate.success))
+        for dose, y1, y2 in zip(doses, newton.y, integrate.y):
+            cold = steady_state(self.network, {'X_0': dose}).y
+            self.assertTrue(np.allclose(y1, cold, rtol=1e-7))
+            self.assertTrue(np.allclose(y2, cold, rtol=1e-5))
+
+class TestChenBistability(unittest.TestCase):
+    def test_continuation(self):
+        """The curve in Bid_0 agrees with long integrations."""
+        model = models.build('mito.chen_biophys_j')
+        Bid_0 = Parameter('Bid_0', 0, _export=False)
+        model.add_component(Bid_0)
+        model.initial(model.monomers['Bid'](state='T', bf=None), Bid_0)
+        network = Network(model)
+        param_values = {'spontaneous_pore_BaxA_to_Bax4_kf': 0}
+        laws = ConservationLaws(network, network.rate_constants(
+            network.param_vector(param_values)))
+        result = continuation(network, 'Bid_0', 4e4,
+                              param_values=param_values, laws=laws)
+        self.assertTrue(result.success)
+        self.assertTrue(np.all(result.stable))
+        solver = Solver(network, [0, 1e6], rtol=1e-10, atol=1e-8)
+        for i in range(0, len(result.p), 7):
+            param_values['Bid_0'] = result.p[i]
+            solver.run(param_values)
+            self.assertTrue(np.allclose(result.y[i], solver.y[-1],
+                                        rtol=1e-5, atol=1e-2))
+
+    def test_analysis(self):
+        """The analysis of the model leaves the shared instance unchanged."""
+        from earm.mito import chen_biophys_j
+        shared = chen_biophys_j.model
+        sizes = (len(shared.parameters), len(shared.initial_conditions))
+        result = chen_biophys_j.bistability_analysis()
+        self.assertTrue(result.success)
+        self.assertTrue(np.all(result.stable))
+        self.assertEqual(len(result.folds), 0)
+        self.assertEqual((len(shared.parameters),
+                          len(shared.initial_conditions)), sizes)
+
+class TestChenFebsFigure(unittest.TestCase):
+    def test_figure_2a(self):
+        """The figure leaves the shared instances of the models unchanged."""
+        from earm.mito import chen_febs_direct, chen_febs_indirect, \
+            chen_febs_figures
+        shared = [chen_febs_direct.model, chen_febs_indirect.model]
+        sizes = [(len(m.parameters), len(m.initial_conditions))
+                 for m in shared]
+        chen_febs_figures.figure_2a()
+        self.assertEqual([(len(m.parameters), len(m.initial_conditions))
+                          for m in shared], sizes)
@@ -0,0 +1,116 @@
+"""
+Tests for the exact and hybrid stochastic simulators in
+:py:mod:`earm.stochastic`.
+"""
+
+import unittest
+
+import numpy as np
+
+from earm import models
+from earm.network import Network
+from earm.integrate import Solver
+from earm.steady_state import ConservationLaws
+from earm.stochastic import StochasticSolver, HybridSolver
+from earm.tests.test_steady_state import switch_model
+
+class TestStochasticSolver(unittest.TestCase):
+    def setUp(self):
+        self.network = Network(switch_model())
+
+    def test_propensities(self):
+        """Reactants that appear twice contribute x (x - 1)."""
+        solver = StochasticSolver(self.network, [0, 1])
+        k = [0.5, 2.0, 3.0]
+        # Species are X(s='I') and X(s='A'); the reactions are basal
+        # activation, autoactivation (I + 2 A) and deactivation
+        a = solver._propensities([5, 3], k)
+        self.assertEqual(a, [0.5 * 5, 2.0 * 5 * 3 * 2, 3.0 * 3])
+
+    def test_dependency_graph(self):
+        """Firing a reaction updates every propensity that changes."""
+        network = Network(models.get('lopez_embedded'))
+        solver = StochasticSolver(network, [0, 1])
+        random = np.random.RandomState(0)
+        y = random.randint(10, 1000, network.n_species).tolist()
+        k = network.rate_constants(network.param_vector()).tolist()
+        for j in range(network.n_reactions):
+            yj = list(y)
+            a = solver._propensities(yj, k)
+            solver._fire[j](yj, a, k)
+            self.assertEqual(yj, (np.array(y) +
+                                  network.stoichiometry[:, j]).tolist())
+            self.assertTrue(np.allclose(a, solver._propensities(yj, k),
+                                        rtol=1e-14))
+
+    def test_stationary_distribution(self):
+        """Without autoactivation, the number of active X is binomial."""
+        tspan = np.arange(0, 4001.0)
+        solver = StochasticSolver(self.network, tspan, seed=0)
+        solver.run({'k0': 1, 'k1': 0, 'k2': 3, 'X_0': 200})
+        active = solver.y[100:, 1]
+        # Binomial(200, 1/4): mean 50, variance 37.5
+        self.assertAlmostEqual(active.mean(), 50, delta=1)
+        self.assertAlmostEqual(active.var(), 37.5, delta=5)
+        self.assertTrue(np.all(solver.y.sum(axis=1) == 200))
+        self.assertTrue(np.allclose(solver.yobs_view,
+                                    self.network.observables(solver.y)))
+
+    def test_seed(self):
+        """Runs are reproducible from the seed, and successive runs
+        differ."""
+        tspan = np.linspace(0, 10, 11)
+        params = {'X_0': 100}
+        solver1 = StochasticSolver(self.network, tspan, seed=1)
+        solver2 = StochasticSolver(self.network, tspan, seed=1)
+        solver1.run(params)
+        solver2.run(params)
+        self.assertTrue(np.array_equal(solver1.y, solver2.y))
+        first = solver1.y.copy()
+        solver1.run(params)
+        self.assertFalse(np.array_equal(solver1.y, first))
+
+class TestHybridSolver(unittest.TestCase):
+    def setUp(self):
+        self.network = Network(switch_model())
+
+    def test_ode_limit(self):
+        """With every reaction fast, a run is the solution of the ODEs."""
+        tspan = np.linspace(0, 20, 21)
+        params = {'X_0': 1000, 'k1': 1e-6}
+        solver = HybridSolver(self.network, tspan, fast_propensity=0,
+                              rtol=1e-8, atol=1e-6)
+        solver.run(params)
+        ode = Solver(self.network, tspan, rtol=1e-8, atol=1e-6)
+        ode.run(params)
+        self.assertEqual(solver.n_events, 0)
+        self.assertTrue(np.allclose(solver.y, ode.y, rtol=1e-5))
+
+    def test_exact_limit(self):
+        """With every reaction slow, the number of active X is binomial."""
+        tspan = np.arange(0, 1001.0)
+        solver = HybridSolver(self.network, tspan, fast_propensity=np.inf,
+                              seed=0)
+        solver.run({'k0': 1, 'k1': 0, 'k2': 3, 'X_0': 200})
+        active = solver.y[100:, 1]
+        self.assertAlmostEqual(active.mean(), 50, delta=1)
+        self.assertAlmostEqual(active.var(), 37.5, delta=5)
+        self.assertTrue(np.array_equal(solver.y, np.rint(solver.y)))
+        self.assertTrue(np.all(solver.y.sum(axis=1) == 200))
+
+    def test_full_model(self):
+        """A run of a full model has both fast and slow reactions, reaches
+        the end state of the ODEs and nearly keeps the conserved totals."""
+        network = Network(models.get('lopez_embedded'))
+        tspan = np.linspace(0, 20000, 21)
+        solver = HybridSolver(network, tspan, seed=0)
+        solver.run()
+        self.assertTrue(solver.n_events > 0)
+        self.assertTrue(0 < solver.fast.sum() < network.n_reactions)
+        ode = Solver(network, tspan)
+        ode.run()
+        self.assertTrue(np.allclose(solver.yobs_view[-1], ode.yobs_view[-1],
+                                    rtol=0.01))
+        laws = ConservationLaws(network)
+        totals = np.array([laws.totals(y) for y in solver.y])
+        self.assertTrue(np.allclose(totals, totals[0], rtol=1e-3, atol=1))
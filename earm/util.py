@@ -1,3 +1,7 @@
+import os
+import errno
+import tempfile
+
 def convert_um_to_num(concentration):
     """Convert uM concentration to # of molecules, assuming v=1.661e-12 L."""
     return concentration*1e6
@@ -13,3 +17,52 @@ def convert_um_kf_to_stoch(rate):
 def convert_nm_kf_to_stoch(rate):
     molar_rate = rate*1e9
     return molar_rate*1e-12
+
+def cache_dir(*subdirs):
+    """Return the path to a directory in the EARM cache, creating it if needed.
+
+    The cache lives in ``~/.earm`` unless the environment variable
+    ``EARM_CACHE_DIR`` is set, in which case that directory is used instead.
+    """
+    root = os.environ.get('EARM_CACHE_DIR',
+                          os.path.join(os.path.expanduser('~'), '.earm'))
+    path = os.path.join(root, *subdirs)
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    return path
+
+def write_atomic(path, data, mode='wb'):
+    """Write `data` to `path` so that readers never see a partial file.
+
+    The data is written to a new temporary file in the same directory, which
+    is then renamed over `path`.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                                    prefix=os.path.basename(path) + '.',
+                                    suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as f:
+            f.write(data)
+        _replace(tmp_path, path)
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _replace(src, dst):
+    """Rename `src` to `dst`, replacing `dst` if it exists."""
+    if hasattr(os, 'replace'):
+        os.replace(src, dst)
+    elif os.name == 'nt':
+        # os.rename does not overwrite on Windows with Python 2
+        try:
+            os.remove(dst)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+        os.rename(src, dst)
+    else:
+        os.rename(src, dst)
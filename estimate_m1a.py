@@ -1,13 +1,20 @@
-import pysb.integrate
 import pysb.util
 import numpy as np
 import scipy.optimize
-import scipy.interpolate
 import matplotlib.pyplot as plt
 import os
-import inspect
+import sys
+import copy
+import shutil
+import hashlib
+import functools
+import multiprocessing
 
 from earm.lopez_embedded import model
+from earm.integrate import Solver, SensitivitySolver
+from earm.netcache import model_hash
+from earm.util import cache_dir
+from earm import optimize, features, data, instrument
 
 
 # List of model observables and corresponding data file columns for
@@ -19,11 +26,10 @@ var_names = ['nrm_var_ICRP', 'nrm_var_ECRP']
 obs_totals = [model.parameters['Bid_0'].value,
               model.parameters['PARP_0'].value]
 
-# Load experimental data file
+# Load experimental data (from xpdata/forfits, through the binary cache of
+# earm.data)
 earm_path = os.path.dirname(__file__)
-data_path = os.path.join(earm_path, 'xpdata', 'forfits',
-                         'EC-RP_IMS-RP_IC-RP_data_for_models.csv')
-exp_data = np.genfromtxt(data_path, delimiter=',', names=True)
+exp_data = data.load('reporters')
 
 # Model observable corresponding to the IMS-RP reporter (MOMP timing)
 momp_obs = 'aSmac'
@@ -33,17 +39,20 @@ momp_obs_total = model.parameters['Smac_0'].value
 momp_data = np.array([9810.0, 180.0, momp_obs_total])
 momp_var = np.array([7245000.0, 3600.0, 1e4])
 
-# Build time points for the integrator, using the same time scale as the
-# experimental data but with greater resolution to help the integrator converge.
+# Store simulation results at the experimental time points only. The solver
+# runs in dense output mode, taking whatever steps it needs in between, and
+# the interpolant of the last run (solver.solution) gives the trajectories at
+# any other time.
 ntimes = len(exp_data['Time'])
-# Factor by which to increase time resolution
-tmul = 10
-# Do the sampling such that the original experimental timepoints can be
-# extracted with a slice expression instead of requiring interpolation.
-tspan = np.linspace(exp_data['Time'][0], exp_data['Time'][-1],
-                    (ntimes-1) * tmul + 1)
-# Initialize solver object
-solver = pysb.integrate.Solver(model, tspan, rtol=1e-5, atol=1e-5)
+tspan = np.array(exp_data['Time'], dtype=float)
+# Time spent in each stage of objective_func and counts of its evaluations,
+# to which the solver adds the counts of its integrations (see
+# earm.instrument)
+stats = instrument.Stats()
+# Initialize solver object. The reaction network is restored from the network
+# cache, and the solver uses a compiled RHS and analytic sparse Jacobian.
+solver = Solver(model, tspan, rtol=1e-5, atol=1e-5, dense_output=True,
+                stats=stats)
 
 # Get parameters for rates only
 rate_params = model.parameters_rules()
@@ -55,54 +64,73 @@ nominal_values = np.array([p.value for p in model.parameters])
 bounds_radius = 2
 
 
-def objective_func(x, rate_mask, lb, ub):
+def objective_func(x, rate_mask, lb, ub, threshold=None):
 
-    # Print out an indication of how the annealing is progressing
-    print_anneal_status()
+    """Return the error of the simulation with log10 rates x.
+
+    If a threshold is given, the simulation stops as soon as the part of the
+    error accumulated at the experimental time points so far exceeds it, and
+    that partial error (a lower bound of the error) is returned instead.
+    Since the terms of the error are all positive, this does not change the
+    outcome of comparing the error with the threshold.
+
+    """
+
+    stats.count('evaluations')
 
     # Apply hard bounds
-    if np.any((x < lb) | (x > ub)):
-        print "bounds-check failed"
+    with stats.timer('bounds check'):
+        out_of_bounds = np.any((x < lb) | (x > ub))
+    if out_of_bounds:
+        stats.count('out of bounds')
         return np.inf
 
     # Simulate model with rates taken from x (which is log transformed)
-    param_values = np.array([p.value for p in model.parameters])
-    param_values[rate_mask] = 10 ** x
-    solver.run(param_values)
+    with stats.timer('parameter vector'):
+        param_values = np.array([p.value for p in model.parameters])
+        param_values[rate_mask] = 10 ** x
+    with stats.timer('simulation'):
+        if threshold is None:
+            solver.run(param_values)
+        else:
+            partial = PartialError(threshold)
+            solver.run(param_values, stop=partial)
+    if threshold is not None and partial.exceeded:
+        stats.count('aborted')
+        return partial.error
 
     # Calculate error for point-by-point trajectory comparisons
     e1 = 0
-    for obs_name, data_name, var_name, obs_total in \
-            zip(obs_names, data_names, var_names, obs_totals):
-        # Get model observable trajectory (this is the slice expression
-        # mentioned above in the comment for tspan)
-        ysim = solver.yobs[obs_name][::tmul]
-        # Normalize it to 0-1
-        ysim_norm = ysim / obs_total
-        # Get experimental measurement and variance
-        ydata = exp_data[data_name]
-        yvar = exp_data[var_name]
-        # Compute error between simulation and experiment (chi-squared)
-        e1 += np.sum((ydata - ysim_norm) ** 2 / (2 * yvar)) / len(ydata)
+    with stats.timer('trajectory error'):
+        for obs_name, data_name, var_name, obs_total in \
+                zip(obs_names, data_names, var_names, obs_totals):
+            # Get model observable trajectory at the experimental time points
+            ysim = solver.yobs[obs_name]
+            # Normalize it to 0-1
+            ysim_norm = ysim / obs_total
+            # Get experimental measurement and variance
+            ydata = exp_data[data_name]
+            yvar = exp_data[var_name]
+            # Compute error between simulation and experiment (chi-squared)
+            e1 += np.sum((ydata - ysim_norm) ** 2 / (2 * yvar)) / len(ydata)
 
     # Calculate error for Td, Ts, and final value for IMS-RP reporter
     # =====
-    # Normalize trajectory
-    ysim_momp = solver.yobs[momp_obs]
-    ysim_momp_norm = ysim_momp / np.nanmax(ysim_momp)
-    # Build a spline to interpolate it
-    st, sc, sk = scipy.interpolate.splrep(solver.tspan, ysim_momp_norm)
-    # Use root-finding to find the point where trajectory reaches 10% and 90%
-    t10 = scipy.interpolate.sproot((st, sc-0.10, sk))[0]
-    t90 = scipy.interpolate.sproot((st, sc-0.90, sk))[0]
-    # Calculate Td as the mean of these times
-    td = (t10 + t90) / 2
-    # Calculate Ts as their difference
-    ts = t90 - t10
-    # Get yfinal, the last element from the trajectory
-    yfinal = ysim_momp[-1]
+    # Td is the mean of the times at which the trajectory reaches 10% and 90%
+    # of its maximum, Ts their difference, and yfinal its last value. The
+    # crossings are found on the interpolant of the solver, from its values
+    # and slopes at the steps of the integrator.
+    if solver.solution is None:
+        return np.inf
+    with stats.timer('MOMP timing'):
+        momp_row = solver.network.observables_matrix[
+            solver.network.observable_names.index(momp_obs)]
+        momp_timing = features.timing(
+            solver.solution.t, np.dot(solver.solution.y, momp_row),
+            dydt=np.dot(solver.solution.ydot, momp_row))
     # Build a vector of the 3 variables to fit
-    momp_sim = [td, ts, yfinal]
+    momp_sim = [momp_timing['td'], momp_timing['ts'],
+                solver.yobs[momp_obs][-1]]
     # Perform chi-squared calculation against mean and variance vectors
     e2 = np.sum((momp_data - momp_sim) ** 2 / (2 * momp_var)) / 3
 
@@ -110,23 +138,157 @@ def objective_func(x, rate_mask, lb, ub):
     return error
 
 
-def print_anneal_status():
-    """Print annealing progress report"""
-    # scipy.optimize.anneal doesn't offer any introspection, so we have to dig
-    # into its stack frames directly to find what we need. This function will
-    # only work properly when called directly from the objective function. It
-    # could be modified to walk the stack until the proper frame is found, but
-    # right now it just explicitly looks two levels up.
-    caller_frame, _, _, caller_func, _, _ = inspect.stack()[2]
-    # Only report when called from anneal, not from getstart_temp
-    if caller_func == 'anneal':
-        caller_locals = caller_frame.f_locals
-        # Only report on the first iteration of the 'dwell' loop
-        if caller_locals['n'] == 1:
-            print 'best fit:', caller_locals['best_state'].cost, 'current fit:', caller_locals['current_state'].cost
+# Solver for the sensitivities of the trajectories to the log10 rates, which
+# is built the first time objective_and_gradient is called
+sens_solver = None
+
+
+def objective_and_gradient(x, rate_mask, lb, ub):
+
+    """Return the objective function and its gradient with respect to x.
+
+    The gradient is computed exactly (to within the integration tolerances)
+    from the forward sensitivities of the trajectories, so it costs about one
+    integration of an enlarged system instead of len(x) + 1 simulations.
+
+    The error is the same as that of objective_func, except that the 10% and
+    90% crossing times of the IMS-RP trajectory are found on the interpolant
+    of the integrator rather than interpolated between the time points (see
+    earm.features), so the two functions agree to within the accuracy of the
+    interpolation.
+
+    """
+
+    global sens_solver
+    if sens_solver is None:
+        sens_solver = SensitivitySolver(
+            solver.network, tspan, parameters=np.flatnonzero(rate_mask),
+            log=True, rtol=solver.rtol, atol=solver.atol)
+    network = sens_solver.network
+    grad = np.zeros(len(x))
+
+    # Apply hard bounds
+    if np.any((x < lb) | (x > ub)):
+        return np.inf, grad
+
+    param_values = nominal_values.copy()
+    param_values[rate_mask] = 10 ** x
+    sens_solver.run(param_values)
+    yobs = sens_solver.yobs
+    obs_sens = sens_solver.obs_sens
+
+    # Point-by-point trajectory comparisons
+    e1 = 0
+    for obs_name, data_name, var_name, obs_total in \
+            zip(obs_names, data_names, var_names, obs_totals):
+        i = network.observable_names.index(obs_name)
+        ysim_norm = yobs[:, i] / obs_total
+        dysim_norm = obs_sens[:, i] / obs_total
+        ydata = exp_data[data_name]
+        yvar = exp_data[var_name]
+        residual = ydata - ysim_norm
+        e1 += np.sum(residual ** 2 / (2 * yvar)) / len(ydata)
+        grad -= np.dot(residual / yvar, dysim_norm) / len(ydata)
+
+    # Td, Ts and final value for the IMS-RP reporter. The normalized
+    # trajectory is y / M, where M is its maximum, so a crossing time t* of
+    # the level c satisfies y(t*) = c M, and by implicit differentiation
+    # dt*/dx = -(dy/dx(t*) - c dM/dx) / (dy/dt(t*)).
+    # The maximum and the intervals of the crossings are taken from the
+    # values at the steps of the integrator.
+    i = network.observable_names.index(momp_obs)
+    if not np.all(np.isfinite(yobs[:, i])):
+        return np.inf, grad
+    obs_row = network.observables_matrix[i]
+    steps = sens_solver.solution.ts
+    ysim_momp = np.dot(obs_row, sens_solver.solution(steps)[:network.n_species])
+    imax = np.argmax(ysim_momp)
+    ymax = ysim_momp[imax]
+    dymax = np.dot(obs_row, sens_solver.dense(steps[imax])[1])
+    k = network.rate_constants(param_values)
+    crossings = []
+    for c in (0.10, 0.90):
+        above = np.flatnonzero(ysim_momp >= c * ymax)
+        if len(above) == 0 or above[0] == 0:
+            return np.inf, grad
+        j = above[0]
+        t = scipy.optimize.brentq(
+            lambda t: np.dot(obs_row, sens_solver.dense(t)[0]) - c * ymax,
+            steps[j - 1], steps[j])
+        y, s = sens_solver.dense(t)
+        ydot = np.dot(obs_row, network.rhs(t, y, k))
+        crossings.append((t, -(np.dot(obs_row, s) - c * dymax) / ydot))
+    (t10, dt10), (t90, dt90) = crossings
+    momp_sim = np.array([(t10 + t90) / 2, t90 - t10, yobs[-1, i]])
+    dmomp_sim = np.array([(dt10 + dt90) / 2, dt90 - dt10, obs_sens[-1, i]])
+    residual = momp_data - momp_sim
+    e2 = np.sum(residual ** 2 / (2 * momp_var)) / 3
+    grad -= np.dot(residual / momp_var, dmomp_sim) / 3
+
+    return e1 + e2, grad
+
+
+class PartialError(object):
+
+    """Running sum of the point-by-point errors during a simulation.
+
+    Used as the `stop` function of solver.run, it adds the error terms of
+    each experimental time point as soon as the solver reaches it, and stops
+    the simulation when their sum exceeds the threshold.
+
+    """
+
+    # Observable rows of the data points, and the data at each of them
+    obs_matrix = np.array([solver.network.observables_matrix[
+        solver.network.observable_names.index(name)] for name in obs_names])
+    ydata = np.column_stack([exp_data[name] for name in data_names])
+    yvar = np.column_stack([exp_data[name] for name in var_names])
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.error = 0.0
+        self.exceeded = False
+
+    def __call__(self, i, y):
+        ysim_norm = np.dot(self.obs_matrix, y) / obs_totals
+        self.error += np.sum((self.ydata[i] - ysim_norm) ** 2 /
+                             (2 * self.yvar[i])) / ntimes
+        self.exceeded = self.error > self.threshold
+        return self.exceeded
+
 
+def print_status(state):
+    """Print a progress report; used as the optimizer callback."""
+    print 'iteration:', state.nit, 'best fit:', state.best_cost, \
+        'current fit:', np.min(state.cost)
+
+
+def default_optimizer(seed=None):
+    """Return the simulated annealing strategy used by default."""
+    # Displacement size for annealing moves
+    dx = .02
+    return optimize.Anneal(maxiter=4000, quench=0.5, step=dx, seed=seed)
+
+
+def objective_cache_path():
+    """Return the path of the on-disk cache of objective function values.
+
+    The name of the file identifies everything the objective function depends
+    on (the model, the data, the time points, the solver tolerances and the
+    bounds), so a change to any of them starts a new cache.
+    """
+    digest = hashlib.sha1(model_hash(model).encode('utf-8'))
+    digest.update(exp_data.source['sha1'].encode('utf-8'))
+    digest.update(repr((tspan.tolist(), solver.rtol, solver.atol,
+                        bounds_radius)).encode('utf-8'))
+    return os.path.join(cache_dir('objectives'),
+                        'estimate_m1a-%s.pkl' % digest.hexdigest())
 
-def estimate(start_values=None):
+
+def estimate(start_values=None, optimizer=None, polish=False,
+             callback=print_status, processes=None, checkpoint=None,
+             cache=False, cache_decimals=None, gradient=False,
+             early_abort=True, log_interval=None):
 
     """Estimate parameter values by fitting to data.
 
@@ -135,6 +297,47 @@ def estimate(start_values=None):
     parameter_values : numpy array of floats, optional
         Starting parameter values. Taken from model's nominal parameter values
         if not specified.
+    optimizer : earm.optimize.Optimizer, optional
+        Optimization strategy, such as optimize.DifferentialEvolution() or
+        optimize.CMAES(). Defaults to simulated annealing (see
+        default_optimizer).
+    polish : bool, optional
+        If True, refine the result of the optimizer with optimize.Polish.
+    callback : callable, optional
+        Progress callback, called with the optimizer state after each
+        iteration.
+    processes : int, optional
+        If given, evaluate the objective function in a pool of that many
+        worker processes (this speeds up population-based strategies, which
+        evaluate a whole generation at once).
+    checkpoint : string, optional
+        Path of a checkpoint file for the optimizer state, which is saved
+        every 10 iterations. If the file exists, the optimization resumes
+        from it, and continues exactly as the interrupted run would have.
+    cache : bool, optional
+        If True, remember the value of the objective function at each point
+        evaluated, in memory and in the file given by objective_cache_path(),
+        so that points evaluated before (in this run or in an earlier one)
+        are not simulated again.
+    cache_decimals : int, optional
+        If given, points whose log10 rates agree to this number of decimals
+        share one cached value.
+    gradient : bool, optional
+        If True, the polishing step (see `polish`) uses the exact gradient
+        from objective_and_gradient instead of finite differences.
+    early_abort : bool, optional
+        If True (default), the optimizer passes its acceptance thresholds to
+        objective_func, so the simulation of a point that is certain to be
+        rejected stops as soon as its partial error exceeds the threshold
+        (this does not change the result of the optimization).
+    log_interval : float, optional
+        If given, print a line of the statistics of the objective function
+        (the time spent in each of its stages, and the counts of its
+        evaluations and of the steps, right-hand side and Jacobian
+        evaluations and failures of the solver) from the callback, at most
+        once every log_interval seconds. A summary of the statistics is
+        printed at the end in any case. The evaluations made in worker
+        processes (see `processes`) are not included.
 
     Returns
     =======
@@ -147,54 +350,200 @@ def estimate(start_values=None):
         start_values = nominal_values
     else:
         assert start_values.shape == nominal_values.shape
+    if optimizer is None:
+        optimizer = default_optimizer()
+    if log_interval is not None:
+        callback = instrument.PeriodicLog(stats, log_interval, callback)
     # Log-transform the starting position
     x0 = np.log10(start_values[rate_mask])
-    # Displacement size for annealing moves
-    dx = .02
-    # The default 'fast' annealing schedule uses the 'lower' and 'upper'
-    # arguments in a somewhat counterintuitive way. See
-    # http://projects.scipy.org/scipy/ticket/1126 for more information. This is
-    # how to get the search to start at x0 and use a displacement on the order
-    # of dx (note that this will affect the T0 estimation which *does* expect
-    # lower and upper to be the absolute expected bounds on x).
-    lower = x0 - dx / 2
-    upper = x0 + dx / 2
-    # Log-transform the rate parameter values
-    xnominal = np.log10(nominal_values[rate_mask])
     # Hard lower and upper bounds on x
-    lb = xnominal - bounds_radius
-    ub = xnominal + bounds_radius
-
-    # Perform the annealing
-    args = [rate_mask, lb, ub]
-    (xmin, Jmin, Tfinal, feval, iters, accept, retval) = \
-        scipy.optimize.anneal(objective_func, x0, full_output=True,
-                              maxiter=4000, quench=0.5,
-                              lower=lower, upper=upper,
-                              args=args)
+    lb, ub = log_bounds()
+
+    # Perform the optimization
+    func = functools.partial(objective_func, rate_mask=rate_mask, lb=lb, ub=ub)
+    if processes:
+        objective = optimize.PoolObjective(func, processes,
+                                           initializer=_init_worker,
+                                           bounded=early_abort)
+    elif early_abort:
+        objective = optimize.vectorize_bounded(func)
+    else:
+        objective = optimize.vectorize(func)
+    if cache:
+        cached = optimize.CachedObjective(objective, decimals=cache_decimals,
+                                          path=objective_cache_path())
+    else:
+        cached = objective
+    try:
+        result = optimizer.minimize(cached, x0, lb, ub, callback=callback,
+                                    checkpoint=checkpoint)
+        if polish:
+            if gradient:
+                polisher = optimize.Polish(gradient=functools.partial(
+                    objective_and_gradient, rate_mask=rate_mask, lb=lb,
+                    ub=ub))
+            else:
+                polisher = optimize.Polish()
+            result = polisher.minimize(cached, result.x, lb, ub,
+                                       callback=callback)
+    finally:
+        if processes:
+            objective.close()
+        if cache:
+            cached.save()
+            print 'objective cache: %d hits, %d misses' % (cached.hits,
+                                                          cached.misses)
     # Construct vector with resulting parameter values (un-log-transformed)
     params_estimated = start_values.copy()
-    params_estimated[rate_mask] = 10 ** xmin
+    params_estimated[rate_mask] = 10 ** result.x
 
-    # Display annealing results
-    for v in ('xmin', 'Jmin', 'Tfinal', 'feval', 'iters', 'accept', 'retval'):
-        print "%s: %s" % (v, locals()[v])
+    # Display optimization results
+    for v in ('x', 'fun', 'nit', 'nfev', 'message'):
+        print "%s: %s" % (v, result[v])
+    print stats.summary()
 
     return params_estimated
 
 
+def log_bounds():
+    """Return the hard lower and upper bounds on the log10 rate values."""
+    # Log-transform the rate parameter values
+    xnominal = np.log10(nominal_values[rate_mask])
+    return xnominal - bounds_radius, xnominal + bounds_radius
+
+
+def starting_points(k, method='lhs', spread=0.5, seed=None):
+
+    """Generate starting parameter vectors for multi-start estimation.
+
+    Parameters
+    ==========
+    k : int
+        Number of starting points.
+    method : 'lhs' or 'perturb', optional
+        'lhs' draws a Latin hypercube sample of the log10 rates over the whole
+        bounds_radius hypercube around the nominal values. 'perturb' adds a
+        uniform perturbation of at most `spread` (in log10 units) to each
+        nominal log10 rate, clipped to the hypercube.
+    spread : float, optional
+        Size of the perturbations for the 'perturb' method.
+    seed : int, optional
+        Seed for the random number generator.
+
+    Returns
+    =======
+    numpy array of floats with shape (k, len(model.parameters)), containing
+    one vector of parameter values per row (non-rate parameters keep their
+    nominal values).
+
+    """
+
+    random = np.random.RandomState(seed)
+    lb, ub = log_bounds()
+    ndim = len(lb)
+    if method == 'lhs':
+        x = optimize.latin_hypercube(random, k, lb, ub)
+    elif method == 'perturb':
+        xnominal = np.log10(nominal_values[rate_mask])
+        x = xnominal + random.uniform(-spread, spread, (k, ndim))
+        x = np.clip(x, lb, ub)
+    else:
+        raise ValueError("Unknown method '%s'; must be 'lhs' or 'perturb'"
+                         % method)
+    start_values = np.tile(nominal_values, (k, 1))
+    start_values[:, rate_mask] = 10 ** x
+    return start_values
+
+
+def _init_worker():
+    """Give a worker process its own solver, sharing the compiled network."""
+    global solver
+    solver = Solver(solver.network, tspan, rtol=solver.rtol, atol=solver.atol,
+                    dense_output=True, stats=stats)
+
+
+def _run_chain(args):
+    """Run one seeded estimation chain and return (error, parameters)."""
+    start_values, seed, optimizer, checkpoint = args
+    if optimizer is None:
+        optimizer = default_optimizer(seed)
+    else:
+        optimizer = copy.copy(optimizer)
+        optimizer.seed = seed
+    params_estimated = estimate(start_values, optimizer,
+                                checkpoint=checkpoint)
+    lb, ub = log_bounds()
+    error = objective_func(np.log10(params_estimated[rate_mask]), rate_mask,
+                           lb, ub)
+    return error, params_estimated
+
+
+def estimate_multistart(k, method='lhs', seed=0, processes=None,
+                        optimizer=None, checkpoint_dir=None):
+
+    """Run k independent estimation chains in parallel.
+
+    Each chain starts from one of the points returned by starting_points and
+    runs estimate() with its own random seed, in a pool of worker processes
+    that each hold a separate solver.
+
+    Parameters
+    ==========
+    k : int
+        Number of chains.
+    method : 'lhs' or 'perturb', optional
+        Method used to generate the starting points (see starting_points).
+    seed : int, optional
+        Seed for the starting points; chain i is seeded with seed + i + 1, so
+        the whole run is reproducible.
+    processes : int, optional
+        Number of worker processes. Defaults to the number of CPUs.
+    optimizer : earm.optimize.Optimizer, optional
+        Optimization strategy for every chain (its seed is replaced by the
+        seed of the chain). Defaults to simulated annealing.
+    checkpoint_dir : string, optional
+        Directory for the checkpoint files of the chains (chain-<i>.ckpt).
+        Running again with the same arguments resumes the chains from them.
+
+    Returns
+    =======
+    list of (error, params_estimated) tuples, one per chain, sorted from the
+    best (lowest error) fit to the worst.
+
+    """
+
+    starts = starting_points(k, method=method, seed=seed)
+    tasks = []
+    for i, start in enumerate(starts):
+        checkpoint = None
+        if checkpoint_dir is not None:
+            checkpoint = os.path.join(checkpoint_dir, 'chain-%d.ckpt' % i)
+        tasks.append((start, seed + i + 1, optimizer, checkpoint))
+    pool = multiprocessing.Pool(processes, initializer=_init_worker)
+    try:
+        results = pool.map(_run_chain, tasks)
+    finally:
+        pool.close()
+        pool.join()
+    return sorted(results, key=lambda r: r[0])
+
+
 def display(params_estimated):
 
     # Construct matrix of experimental data and variance columns of interest
-    exp_obs_norm = exp_data[data_names].view(float).reshape(len(exp_data), -1).T
-    var_norm = exp_data[var_names].view(float).reshape(len(exp_data), -1).T
+    exp_obs_norm = exp_data[data_names]
+    var_norm = exp_data[var_names]
     std_norm = var_norm ** 0.5
 
     # Simulate model with new parameters and construct a matrix of the
-    # trajectories of the observables of interest, normalized to 0-1.
+    # trajectories of the observables of interest, normalized to 0-1, from
+    # the interpolant of the solver at a fine resolution.
     solver.run(params_estimated)
+    tplot = np.linspace(tspan[0], tspan[-1], 1000)
     obs_names_disp = obs_names + ['aSmac']
-    sim_obs = solver.yobs[obs_names_disp].view(float).reshape(len(solver.yobs), -1)
+    obs_indices = [solver.network.observable_names.index(name)
+                   for name in obs_names_disp]
+    sim_obs = solver.network.observables(solver.dense(tplot))[:, obs_indices]
     totals = obs_totals + [momp_obs_total]
     sim_obs_norm = (sim_obs / totals).T
 
@@ -204,8 +553,8 @@ def display(params_estimated):
         plt.plot(exp_data['Time'], exp, color=c, marker='.', linestyle=':')
         plt.errorbar(exp_data['Time'], exp, yerr=exp_err, ecolor=c,
                      elinewidth=0.5, capsize=0, fmt=None)
-        plt.plot(solver.tspan, sim, color=c)
-    plt.plot(solver.tspan, sim_obs_norm[2], color='g')
+        plt.plot(tplot, sim, color=c)
+    plt.plot(tplot, sim_obs_norm[2], color='g')
     plt.vlines(momp_data[0], -0.05, 1.05, color='g', linestyle=':')
     plt.show()
 
@@ -214,12 +563,29 @@ if __name__ == '__main__':
 
     print 'Estimating rates for Lopez embedded model (M1a)'
 
-    np.random.seed(1)
-    params_estimated = estimate()
+    # Checkpoints of the optimizer state, from which an interrupted run
+    # resumes when the script is started again
+    checkpoint_dir = os.path.join(earm_path, 'EARM_2_0_M1a_checkpoints')
+    if not os.path.isdir(checkpoint_dir):
+        os.mkdir(checkpoint_dir)
+    if len(sys.argv) > 1:
+        # Multi-start mode: estimate_m1a.py K runs K chains in parallel
+        fits = estimate_multistart(int(sys.argv[1]),
+                                   checkpoint_dir=checkpoint_dir)
+        for i, (error, _) in enumerate(fits):
+            print 'chain %d: error %g' % (i, error)
+        params_estimated = fits[0][1]
+    else:
+        params_estimated = estimate(optimizer=default_optimizer(seed=1),
+                                    checkpoint=os.path.join(checkpoint_dir,
+                                                            'fit.ckpt'),
+                                    log_interval=60)
 
     # Write parameter values to a file
     fit_filename = os.path.join(earm_path, 'EARM_2_0_M1a_fitted_params.txt')
     print 'Saving parameter values to file:', fit_filename
     pysb.util.write_params(model, params_estimated, fit_filename)
+    # The fit is complete, so the next run starts anew
+    shutil.rmtree(checkpoint_dir)
 
     display(params_estimated)